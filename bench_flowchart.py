@@ -0,0 +1,346 @@
+"""Micro-benchmarks for the flowchart generators.
+
+Usage: python bench_flowchart.py [file.c | file.py ...]
+
+Without arguments a synthetic C corpus is generated so runs are comparable.
+"""
+import io
+import re
+import sys
+import time
+import tokenize
+
+import flowchart_core as core
+import flowchart_generator as fg
+from flowchart_compression import ENCODINGS, compress
+
+
+# -------------------- CORPUS --------------------
+SYNTHETIC_C_FUNCTION = '''/* helper {n} */
+int helper_{n}(int a, int b);
+int helper_{n}(int a, int b)
+{{
+    int total = 0;
+    char *buf = malloc(64);
+    // accumulate
+    for (int i = 0; i < a; i++)
+    {{
+        if (i % 2 == 0)
+        {{
+            total += i;
+        }}
+        else
+            total -= b;
+    }}
+    switch (total)
+    {{
+        case 0:
+            break;
+        default:
+            total++;
+    }}
+    while (total > 100) total /= 2;
+    printf("%d\\n", total);
+    free(buf);
+    return total;
+}}
+'''
+
+def synthetic_c_source(functions=2000):
+    return "#include <stdio.h>\n#include <stdlib.h>\n" + "".join(
+        SYNTHETIC_C_FUNCTION.format(n=n) for n in range(functions)
+    )
+
+def synthetic_conditional_c_source(functions=2000, configurations=4):
+    """The synthetic corpus with each function body under one of several #ifdef branches."""
+    parts = ["#include <stdio.h>\n#include <stdlib.h>\n"]
+    for n in range(functions):
+        parts.append(f"#if defined(CONFIG_{n % configurations})\n")
+        parts.append(SYNTHETIC_C_FUNCTION.format(n=n))
+        parts.append("#else\nint helper_{n}(int a, int b) {{ return 0; }}\n#endif\n".format(n=n))
+    return "".join(parts)
+
+def load_sources(paths):
+    if not paths:
+        return [("synthetic.c", synthetic_c_source())]
+    sources = []
+    for path in paths:
+        with open(path, 'r') as file:
+            sources.append((path, file.read()))
+    return sources
+
+
+# -------------------- TIMING --------------------
+def best_of(func, repeat=5):
+    """Returns the fastest wall time of `repeat` calls to func()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(label, count, unit, seconds):
+    print(f"  {label:<28} {count / seconds:>14,.0f} {unit}/s  ({seconds * 1000:.1f} ms)")
+
+def report_cache_stats(cache_stats):
+    for cache, stats in cache_stats.items():
+        print(f"  {cache} cache: {stats['hit_rate']:.1%} hit rate ({stats['hits']:,} hits, {stats['misses']:,} misses, {stats['size']:,} entries)")
+
+
+# -------------------- C LINE CLASSIFICATION --------------------
+def legacy_classify_c_lines(lines):
+    """The pre-classifier chain of uncompiled re.match calls, kept for comparison."""
+    kinds = []
+    for line in lines:
+        if line.startswith("#include"):
+            kinds.append(core.C_INCLUDE)
+        elif re.match(r"\w+\s+\w+\s*\(.*\)\s*;", line) and not re.match(r".*=\s*malloc.*", line):
+            kinds.append(core.C_PROTOTYPE)
+        elif re.match(r"(\w+\s+\**\w+\s*=.*|\w+\s+\**\w+)", line) and not re.match(r"^(if|for|while|else|else\s+if|switch)\b", line):
+            kinds.append(core.C_DECLARATION)
+        elif re.match(r"^switch\b", line):
+            kinds.append(core.C_SWITCH)
+        elif re.match(r"^case\b", line) or re.match(r"^default\b", line):
+            kinds.append(core.C_CASE)
+        elif re.match(r"^(if|for|while|else if|else)\b", line):
+            kinds.append(core.C_CONTROL)
+        elif line == "{":
+            kinds.append(core.C_OPEN_BRACE)
+        elif line == "}":
+            kinds.append(core.C_CLOSE_BRACE)
+        else:
+            kinds.append(core.C_STATEMENT)
+    return kinds
+
+def classify_c_lines(lines):
+    classify = core.classify_c_line
+    return [classify(line) for line in lines]
+
+def bench_c_classifier(name, code):
+    # Comments never reach the classifier: the lexer hands them over as whole units
+    lines = [line.strip() for line in code.splitlines() if line.strip() and not line.strip().startswith(("/*", "//"))]
+    legacy = legacy_classify_c_lines(lines)
+    current = classify_c_lines(lines)
+    mismatches = sum(1 for old, new in zip(legacy, current) if old != new)
+
+    print(f"C line classification: {name} ({len(lines):,} lines)")
+    report("legacy re.match chain", len(lines), "lines", best_of(lambda: legacy_classify_c_lines(lines)))
+    report("classify_c_line", len(lines), "lines", best_of(lambda: classify_c_lines(lines)))
+    report("full C generator", len(lines), "lines", best_of(lambda: fg.generate_flowchart_from_c_code(code), repeat=3))
+    if mismatches:
+        print(f"  WARNING: {mismatches} lines classified differently")
+
+
+# -------------------- BOX RENDERING --------------------
+def legacy_html_box(flowchart, stmt, depth, current_width, color):
+    """html_box before the render caches: formats every border and span from scratch."""
+    stmt = fg.escape_html(stmt)
+    indent = "&nbsp;" * (depth * 4)
+    box_width = len(stmt) + 6
+    if current_width + box_width > fg.MAX_LINE_WIDTH:
+        flowchart.append("<br>")
+        current_width = 0
+    border = f"{indent}<span style='background-color:{fg.BOX_BACKGROUND_COLOR}; color:{color};'>+{'-' * box_width}+</span><br>"
+    content = f"{indent}<span style='background-color:{fg.BOX_BACKGROUND_COLOR}; color:{color};'>|  {stmt.ljust(box_width - 6)}  |</span><br>"
+    flowchart.extend([border, content, border])
+    return current_width + box_width
+
+def render_boxes(box, boxes):
+    flowchart = []
+    current_width = 0
+    for stmt, depth in boxes:
+        current_width = box(flowchart, stmt, depth, current_width, fg.HTML_NESTING_COLORS.get(depth))
+    return flowchart
+
+def bench_box_rendering(name, code):
+    boxes = []
+    for line in code.splitlines():
+        stripped = line.strip()
+        if stripped:
+            boxes.append((stripped, min((len(line) - len(line.lstrip())) // 4, 9)))
+
+    print(f"Box rendering: {name} ({len(boxes):,} boxes)")
+    report("uncached html_box", len(boxes), "boxes", best_of(lambda: render_boxes(legacy_html_box, boxes)))
+    fg.html_border.cache_clear()
+    fg.render_html_box.cache_clear()
+    report("cached html_box", len(boxes), "boxes", best_of(lambda: render_boxes(fg.html_box, boxes)))
+    report_cache_stats(fg.html_box_cache_stats())
+
+def bench_html_output(name, code):
+    inline = fg.generate_flowchart_from_c_code(code)
+    classed = fg.generate_flowchart_from_c_code(code, css=True).encode('utf-8')
+
+    print(f"HTML output: {name}")
+    print(f"  {'inline styles':<28} {len(inline.encode('utf-8')):>14,} bytes")
+    print(f"  {'CSS classes':<28} {len(classed):>14,} bytes")
+    for encoding in ENCODINGS:
+        print(f"  {'CSS classes, ' + encoding:<28} {len(compress([classed], encoding)):>14,} bytes")
+    for encoding in ENCODINGS:
+        report(f"{encoding} compression", len(classed), "bytes", best_of(lambda: compress([classed], encoding), repeat=3))
+    report("inline-style generator", len(code), "chars", best_of(lambda: fg.generate_flowchart_from_c_code(code), repeat=3))
+    report("CSS-class generator", len(code), "chars", best_of(lambda: fg.generate_flowchart_from_c_code(code, css=True), repeat=3))
+
+
+# -------------------- PARSE AND RENDER --------------------
+def bench_parse_and_render(name, code):
+    flowchart = core.parse('c', code)
+
+    print(f"Parse once, render many: {name} ({len(flowchart):,} nodes)")
+    print(f"  {'IR node arrays':<28} {flowchart.nbytes():>14,} bytes  ({flowchart.nbytes() / max(len(flowchart), 1):.0f} bytes/node)")
+    report("iter_c_units lexer", len(flowchart), "nodes", best_of(lambda: sum(1 for _ in core.iter_c_units(code)), repeat=3))
+    report("parse_c_code", len(flowchart), "nodes", best_of(lambda: core.parse('c', code), repeat=3))
+    report("HTML renderer", len(flowchart), "nodes", best_of(lambda: fg.render_html(flowchart), repeat=3))
+    report("CSS renderer", len(flowchart), "nodes", best_of(lambda: fg.render_html(flowchart, css=True), repeat=3))
+    core.render_text_box.cache_clear()
+    report("ANSI renderer", len(flowchart), "nodes", best_of(lambda: core.render_ansi(flowchart), repeat=3))
+    report("plain renderer", len(flowchart), "nodes", best_of(lambda: core.render_plain(flowchart), repeat=3))
+    report_cache_stats(core.text_box_cache_stats())
+
+
+# -------------------- PREPROCESSOR --------------------
+def bench_preprocessor(name, code, defines):
+    raw = core.parse('c', code)
+    preprocessed = core.parse('c', code, defines=defines)
+
+    print(f"Preprocessing: {name} with {' '.join(f'-D{key}' for key in defines) or 'no defines'}")
+    print(f"  {'nodes drawn':<28} {len(raw):>14,} raw  {len(preprocessed):,} preprocessed")
+    report("parse_c_code", len(raw), "nodes", best_of(lambda: core.parse('c', code), repeat=3))
+    report("parse_c_code with defines", len(preprocessed), "nodes", best_of(lambda: core.parse('c', code, defines=defines), repeat=3))
+
+
+# -------------------- PYTHON PARSER --------------------
+def iter_lines(source):
+    """Yields (start, end, line number, text, indent) for every non-blank line of a str source.
+
+    text is the stripped line, start and end its span in source and indent
+    the number of leading spaces. Only the legacy parser still reads lines.
+    """
+    find = source.find
+    size = len(source)
+    offset = 0
+    line_number = 0
+    while offset < size:
+        end = find("\n", offset)
+        end = size if end < 0 else end + 1
+        raw_line = source[offset:end]
+        line_number += 1
+        text = raw_line.strip()
+        if text:
+            start = offset + len(raw_line) - len(raw_line.lstrip())
+            yield start, start + len(text), line_number, text, len(raw_line) - len(raw_line.lstrip(' '))
+        offset = end
+
+LEGACY_PYTHON_CONTROL_RE = re.compile(r"(if|elif|else|for|while|try|except|finally)\b")
+
+def legacy_parse_python(source):
+    """The indentation heuristic parse_python replaced, building the same IR."""
+    flowchart = core.Flowchart('python', source)
+    add = flowchart.add
+    indent_stack = [0]
+    depth = 0
+    inside_multiline_comment = False
+    last_was_control = False
+    first_line = True
+    for start, end, line_number, stripped, indent in iter_lines(source):
+        if first_line:
+            indent = 0
+            first_line = False
+            if stripped.startswith("#!"):
+                continue
+        if inside_multiline_comment:
+            add(core.COMMENT, depth, start, end, line_number)
+            if '"""' in stripped or "'''" in stripped:
+                inside_multiline_comment = False
+            continue
+        if stripped.startswith(("'''", '"""')):
+            inside_multiline_comment = not inside_multiline_comment
+            add(core.COMMENT, depth, start, end, line_number)
+            continue
+        if stripped.startswith("#"):
+            if indent < indent_stack[-1] or last_was_control:
+                while indent < indent_stack[-1]:
+                    indent_stack.pop()
+                    depth -= 1
+                last_was_control = False
+            add(core.COMMENT, depth, start, end, line_number)
+            continue
+        while indent < indent_stack[-1]:
+            indent_stack.pop()
+            depth -= 1
+        if indent > indent_stack[-1]:
+            indent_stack.append(indent)
+            depth += 1
+        last_was_control = LEGACY_PYTHON_CONTROL_RE.match(stripped) is not None
+        add(core.CONTROL if last_was_control else core.STATEMENT, depth, start, end, line_number)
+    return flowchart
+
+def tokenize_structure(code):
+    """(first line, depth) of every logical line according to the stdlib tokenizer."""
+    structure = []
+    depth = 0
+    line = None
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        if token.type == tokenize.INDENT:
+            depth += 1
+        elif token.type == tokenize.DEDENT:
+            depth -= 1
+        elif token.type == tokenize.NEWLINE:
+            line = None
+        elif line is None and token.type not in (tokenize.NL, tokenize.COMMENT, tokenize.ENDMARKER):
+            line = token.start[0]
+            structure.append((line, depth))
+    return structure
+
+def bench_python_parser(name, code):
+    flowchart = core.parse('python', code)
+    code_nodes = [(flowchart.lines[i], flowchart.depths[i]) for i in range(len(flowchart))
+                  if not (flowchart.kinds[i] == core.COMMENT and flowchart.text(i).startswith("#"))]
+    mismatches = sum(1 for old, new in zip(tokenize_structure(code), code_nodes) if old != new)
+
+    print(f"Python parsing: {name} ({len(flowchart):,} nodes)")
+    report("legacy indentation heuristic", len(flowchart), "nodes", best_of(lambda: legacy_parse_python(code), repeat=3))
+    report("parse_python", len(flowchart), "nodes", best_of(lambda: core.parse('python', code), repeat=3))
+    report("stdlib tokenize", len(flowchart), "nodes", best_of(lambda: tokenize_structure(code), repeat=3))
+    report("HTML renderer", len(flowchart), "nodes", best_of(lambda: fg.render_html(flowchart, css=True), repeat=3))
+    if mismatches:
+        print(f"  WARNING: {mismatches} logical lines differ from the tokenizer")
+
+
+# -------------------- INCREMENTAL REPARSE --------------------
+REPARSE_EDITS = {'c': "    edited = 1;\n", 'python': "    edited = 1\n"}
+
+def bench_reparse(name, code, language):
+    """One line inserted mid-file: a full parse against reparse() of the previous parse."""
+    previous = core.parse(language, code)
+    middle = code.rfind("\n", 0, len(code) // 2) + 1
+    edited = code[:middle] + REPARSE_EDITS[language] + code[middle:]
+    edit = (middle, middle, middle + len(REPARSE_EDITS[language]))
+
+    print(f"Incremental reparse: {name} ({len(previous):,} nodes, one line inserted mid-file)")
+    report("full parse", len(edited), "chars", best_of(lambda: core.parse(language, edited), repeat=3))
+    report("reparse with the edit", len(edited), "chars", best_of(lambda: core.reparse(previous, edited, edit), repeat=3))
+    report("reparse, edit found by diff", len(edited), "chars", best_of(lambda: core.reparse(previous, edited), repeat=3))
+    full, incremental = core.parse(language, edited), core.reparse(previous, edited, edit)
+    if any(getattr(full, column) != getattr(incremental, column) for column in ('kinds', 'depths', 'starts', 'lengths', 'lines')):
+        print("  WARNING: the reparse differs from a full parse")
+
+
+def main():
+    for name, code in load_sources(sys.argv[1:]):
+        if name.endswith(".py"):
+            bench_python_parser(name, code)
+            bench_reparse(name, code, 'python')
+            continue
+        bench_c_classifier(name, code)
+        bench_box_rendering(name, code)
+        bench_html_output(name, code)
+        bench_parse_and_render(name, code)
+        bench_reparse(name, code, 'c')
+        if "#if" in code:
+            bench_preprocessor(name, code, {})
+    if not sys.argv[1:]:
+        bench_preprocessor("synthetic-conditional.c", synthetic_conditional_c_source(), {"CONFIG_0": "1"})
+
+if __name__ == "__main__":
+    main()
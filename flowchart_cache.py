@@ -0,0 +1,202 @@
+"""Content-addressed cache for rendered flowcharts.
+
+Results are keyed by a SHA-256 over everything that changes the output, kept
+in a bounded in-memory LRU and optionally mirrored to a directory on disk so
+they survive restarts.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Memory tier budget and the largest single result worth keeping in it
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+
+RESULT_KEY_RE = re.compile(r"[0-9a-f]{64}")
+
+def is_result_key(key):
+    """True for strings shaped like a result_key(); anything else must never reach the disk tier."""
+    return RESULT_KEY_RE.fullmatch(key) is not None
+
+def result_key(content_sha256, language, max_line_width, renderer_version) -> str:
+    """Combines the upload's SHA-256 (hex) with every setting that affects the rendered result."""
+    material = f"{content_sha256}\0{language}\0{max_line_width}\0{renderer_version}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def pack_pages(pages):
+    """Packs a paged result into one cache entry: a JSON line of page end offsets, then the pages."""
+    pages = [page.encode('utf-8') if isinstance(page, str) else page for page in pages]
+    ends = []
+    total = 0
+    for page in pages:
+        total += len(page)
+        ends.append(total)
+    return json.dumps(ends).encode('ascii') + b"\n" + b"".join(pages)
+
+def unpack_page(packed, index):
+    """Returns (page `index`, page count) of a pack_pages() entry; (None, 0) past the last page or for other entries."""
+    header_end = packed.find(b"\n")
+    if header_end < 0:
+        return None, 0
+    try:
+        ends = json.loads(packed[:header_end])
+    except ValueError:
+        return None, 0
+    if not isinstance(ends, list) or not 0 <= index < len(ends):
+        return None, 0
+    start = header_end + 1 + (ends[index - 1] if index else 0)
+    return packed[start:header_end + 1 + ends[index]], len(ends)
+
+class ResultCache:
+    """Thread-safe LRU of rendered results (bytes) with an optional on-disk tier.
+
+    suffix names the files of the disk tier, so one directory can hold
+    several caches (rendered pages, kept uploads).
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, directory=None, max_entry_bytes=CACHE_MAX_ENTRY_BYTES, suffix=".html"):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.directory = directory
+        self.suffix = suffix
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        value = self.get_from_memory(key)
+        if value is not None or not is_result_key(key):
+            return value
+
+        value = self.read_from_disk(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Promote disk hits so the next lookup is served from memory
+        self.remember(key, value)
+        return value
+
+    def get_from_memory(self, key):
+        """The memory tier's value of `key`, counted as a hit; None if it is not there."""
+        if not is_result_key(key):
+            return None
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def can_keep(self, size):
+        """True when an entry of `size` bytes would be kept by the memory or the disk tier."""
+        return size <= self.max_entry_bytes or bool(self.directory)
+
+    def put(self, key, value):
+        self.remember(key, value)
+        self.write_to_disk(key, value)
+
+    def put_file(self, key, path):
+        """Like put() with the contents of the file at `path`, which are copied to the disk tier
+        without being read into memory; only a cache without one keeps them in memory."""
+        if self.directory:
+            self.write_to_disk(key, source_path=path)
+        elif os.path.getsize(path) <= self.max_entry_bytes:
+            with open(path, 'rb') as file:
+                self.remember(key, file.read())
+
+    @contextmanager
+    def open(self, key):
+        """Yields the value of `key` without reading a disk-tier entry into memory:
+        bytes from the memory tier, a read-only mapping of the file, or None."""
+        value = self.get_from_memory(key)
+        if value is not None:
+            yield value
+            return
+        try:
+            if not self.directory or not is_result_key(key):
+                raise FileNotFoundError(key)
+            file = open(self.path_for(key), 'rb')
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            yield None
+            return
+        with file:
+            with self.lock:
+                self.hits += 1
+            if os.fstat(file.fileno()).st_size == 0:
+                yield b""  # empty files cannot be mapped
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def remember(self, key, value):
+        if len(value) > self.max_entry_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def read_from_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self.path_for(key), 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def write_to_disk(self, key, value=None, source_path=None):
+        """Stores `value`, or a copy of the file at `source_path`, in the disk tier."""
+        if not self.directory:
+            return
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial result
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                if source_path is None:
+                    file.write(value)
+                else:
+                    with open(source_path, 'rb') as source:
+                        shutil.copyfileobj(source, file)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,69 @@
+"""Content-Encoding negotiation and compression for the server's responses.
+
+Flowchart HTML is very repetitive (the same borders, classes and padding on
+every box), so it compresses by an order of magnitude or more. gzip is always
+available; Brotli is offered too when the `brotli` package is installed.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller responses go out as they are; compressing them saves less than the headers cost
+COMPRESS_MIN_BYTES = 1024
+
+# Levels for compressing on the fly, and for content compressed once and reused (the landing page)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+# In order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(accept_encoding):
+    """The best of ENCODINGS allowed by an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, parameters = item.partition(';')
+        coding = coding.strip().lower()
+        weight = 1.0
+        parameter = parameters.strip().lower()
+        if parameter.startswith('q='):
+            try:
+                weight = float(parameter[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    wildcard = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+class Compressor:
+    """Incremental compressor for one response, for bodies that are streamed as they are rendered."""
+
+    def __init__(self, encoding, static=False):
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+            self.compress = self.compressor.process
+            self.flush = self.compressor.finish
+        else:
+            # wbits=31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(STATIC_GZIP_LEVEL if static else GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self.compressor.compress
+            self.flush = self.compressor.flush
+
+def compress(parts, encoding, static=False):
+    """Compresses the concatenation of `parts` (bytes) without joining them first."""
+    compressor = Compressor(encoding, static)
+    output = [compressor.compress(part) for part in parts]
+    output.append(compressor.flush())
+    return b"".join(output)
@@ -0,0 +1,1429 @@
+"""Shared parsers and intermediate representation for every flowchart front-end.
+
+Source code is parsed once into a Flowchart: nodes in source order, each with
+a kind, a nesting depth, the span of its text in the source and the line it
+starts on. Renderers walk layout(flowchart) and only turn boxes into
+output, so switching formats never means parsing again. The ANSI and plain
+text renderers live here; the HTML renderers are in flowchart_generator.py.
+"""
+import json
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+# The lexers use possessive quantifiers (`*+`, `++`), which the re module supports from 3.11 on
+if sys.version_info < (3, 11):
+    raise ImportError("flowchart_core requires Python 3.11 or newer")
+
+MAX_LINE_WIDTH = 100
+
+NESTING_COLORS = {
+    0: '\033[94m',  # Blue
+    1: '\033[92m',  # Green
+    2: '\033[93m',  # Yellow
+    3: '\033[91m',  # Red
+    4: '\033[95m',  # Magenta (Pink)
+    5: '\033[96m',  # Cyan
+    6: '\033[33m',  # Orange
+    7: '\033[36m',  # Teal
+    8: '\033[37m',  # Gray
+    9: '\033[41m',  # Background Red
+    10: '\033[42m', # Background Green
+    11: '\033[43m', # Background Yellow
+    12: '\033[44m', # Background Blue
+    'default': '\033[97m',  # White for default
+}
+COMMENT_COLOR = NESTING_COLORS[8]
+
+RESET = '\033[0m'
+
+# Bounded LRU size for the rendered box caches (the text one here, the HTML ones in flowchart_generator)
+BOX_CACHE_SIZE = 4096
+
+# Number of lines (or HTML fragments) buffered before the streaming renderers yield a chunk
+STREAM_CHUNK_SIZE = 256
+
+LANGUAGE_EXTENSIONS = {".c": 'c', ".py": 'python'}
+
+def detect_language(path):
+    """Returns 'c' or 'python' from the file extension, or None if unsupported."""
+    for extension, language in LANGUAGE_EXTENSIONS.items():
+        if path.endswith(extension):
+            return language
+    return None
+
+
+# -------------------- INTERMEDIATE REPRESENTATION --------------------
+# Node kinds
+COMMENT = 0
+DIRECTIVE = 1    # preprocessor lines
+PROTOTYPE = 2
+DECLARATION = 3
+CONTROL = 4      # if / for / while / else / switch, and Python's block keywords
+CASE = 5
+STATEMENT = 6
+DEFINITION = 7   # Python def / class
+
+# Deepest nesting the IR records; anything deeper is drawn at this depth
+MAX_DEPTH = 255
+
+# Source characters (bytes for a bytes-like source) between two calls of a parser's progress callback
+PROGRESS_INTERVAL = 256 * 1024
+
+# One function definition in Flowchart.functions: its source span [start, end),
+# its nodes [first, last) starting with the header, and the deepest node depth
+Function = namedtuple("Function", "name start end first last depth line")
+
+class Flowchart:
+    """Parsed nodes of one source file, in source order.
+
+    Nodes are stored as parallel arrays (struct of arrays) rather than one
+    object per node: kind and depth take a byte each, and the text is an
+    offset and length into `source`, which is never copied. A million-line
+    file costs about 14 bytes per node on top of the source itself.
+    """
+
+    def __init__(self, language, source):
+        # `source` is a str, or bytes / an mmap whose offsets count bytes
+        self.language = language
+        self.source = source
+        self.kinds = array('B')
+        self.depths = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        self.functions = []   # Function entries, filled by parsers that index definitions
+        # Offsets (and their lines) right after the C parser closed a block at
+        # file scope with nothing else open: it could restart there; see reparse()
+        self.resync_offsets = array('I')
+        self.resync_lines = array('I')
+
+    def add(self, kind, depth, start, end, line):
+        self.kinds.append(kind)
+        self.depths.append(depth if depth < MAX_DEPTH else MAX_DEPTH)
+        self.starts.append(start)
+        self.lengths.append(end - start)
+        self.lines.append(line)
+
+    def text(self, index):
+        """Node `index`'s source text; spans over several lines are stripped line by line."""
+        start = self.starts[index]
+        text = self.source[start:start + self.lengths[index]]
+        if not isinstance(text, str):
+            text = text.decode('utf-8', errors='replace')
+        if "\n" in text:
+            text = "\n".join(part.strip() for part in text.split("\n") if part.strip())
+        return text
+
+    def nbytes(self):
+        """Memory held by the node arrays, excluding the source."""
+        return sum(len(getattr(self, column)) * getattr(self, column).itemsize for column in NODE_COLUMNS)
+
+    def __len__(self):
+        return len(self.kinds)
+
+# The node arrays pack_flowchart() stores, in order
+NODE_COLUMNS = ('kinds', 'depths', 'starts', 'lengths', 'lines')
+
+def pack_flowchart(flowchart):
+    """Packs a parse into bytes to be kept next to its source: a JSON line with the
+    node count and function index, then the raw node arrays. See unpack_flowchart()."""
+    header = json.dumps({"nodes": len(flowchart), "functions": flowchart.functions}).encode('utf-8')
+    return b"".join([header, b"\n"] + [getattr(flowchart, column).tobytes() for column in NODE_COLUMNS])
+
+def unpack_flowchart(packed, language, source):
+    """The Flowchart packed by pack_flowchart(), over the same `source` it was parsed from."""
+    header_end = packed.find(b"\n")
+    header = json.loads(packed[:header_end])
+    flowchart = Flowchart(language, source)
+    offset = header_end + 1
+    for column in NODE_COLUMNS:
+        nodes = getattr(flowchart, column)
+        size = header["nodes"] * nodes.itemsize
+        nodes.frombytes(packed[offset:offset + size])
+        offset += size
+    flowchart.functions = [Function(*function) for function in header["functions"]]
+    return flowchart
+
+def read_source(code):
+    """Returns str and bytes-like sources (see open_source) as they are and joins any other iterable of lines."""
+    if isinstance(code, (str, bytes, bytearray, mmap.mmap)):
+        return code
+    return "\n".join(line.rstrip("\r\n") for line in code)
+
+@contextmanager
+def open_source(path):
+    """Memory-maps the file at `path` read-only for parsing.
+
+    Nothing is read up front: the parsers walk the mapping line by line and
+    decode one line at a time, and node text is decoded again only when it is
+    rendered, so every use of the flowchart must happen inside the with block.
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""  # empty files cannot be mapped
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def parse(language, code, previous=None, edit=None, **options):
+    """Parses code (a string, a bytes-like source or an iterable of lines) with the parser for `language`.
+
+    options go to that parser, e.g. defines= and file_macros= for C, or
+    progress= (both parsers) to be told how far the parse has got.
+    previous, the Flowchart of an earlier version of the same code, makes
+    the parse incremental (see reparse()); preprocessed C is always parsed
+    in full.
+    """
+    source = read_source(code)
+    if previous is not None and previous.language == language and options.get('defines') is None:
+        return reparse(previous, source, edit)
+    return PARSERS[language](source, **options)
+
+
+def _compile_text_and_bytes(pattern, flags=0):
+    """Compiles an ASCII pattern for str sources and for bytes-like (mapped) sources.
+
+    A class running up to \\U0010ffff, the last character, runs up to \\xff for bytes.
+    """
+    return re.compile(pattern, flags), re.compile(pattern.replace(r"\U0010ffff", r"\xff").encode('ascii'), flags)
+
+
+# -------------------- C LINE CLASSIFIER --------------------
+# Kinds assigned to each unit from iter_c_units
+C_COMMENT = 0        # a whole comment unit; the lexer marks these, so the classifier never sees one
+C_INCLUDE = 1
+C_PROTOTYPE = 2
+C_DECLARATION = 3
+C_SWITCH = 4
+C_CASE = 5           # "case" and "default" labels
+C_CONTROL = 6        # if / for / while / do / else / else if
+C_OPEN_BRACE = 7
+C_CLOSE_BRACE = 8
+C_STATEMENT = 9
+
+# Precompiled once; every pattern is anchored at the start of the line via match()
+C_PROTOTYPE_RE = re.compile(r"\w+\s+\w+\s*\(.*\)\s*;")
+C_MALLOC_RE = re.compile(r"=\s*malloc")
+C_DECLARATION_RE = re.compile(r"\w+\s+\**\w+")  # "type name", "type *name = ..."
+C_KEYWORD_RE = re.compile(r"(if|for|while|else|do|switch|case|default)\b")
+
+C_KEYWORD_KINDS = {
+    'if': C_CONTROL, 'for': C_CONTROL, 'while': C_CONTROL, 'else': C_CONTROL, 'do': C_CONTROL,
+    'switch': C_SWITCH, 'case': C_CASE, 'default': C_CASE,
+}
+
+def _classify_hash(line):
+    return C_INCLUDE if line.startswith("#include") else C_STATEMENT
+
+def _classify_open_brace(line):
+    return C_OPEN_BRACE if line == "{" else C_STATEMENT
+
+def _classify_close_brace(line):
+    return C_CLOSE_BRACE if line == "}" else C_STATEMENT
+
+def _classify_word(line):
+    # Cheap substring checks gate the regexes: a prototype needs "(" and ";"
+    if "(" in line and ";" in line and C_PROTOTYPE_RE.match(line):
+        if "malloc" not in line or not C_MALLOC_RE.search(line):
+            return C_PROTOTYPE
+    keyword = C_KEYWORD_RE.match(line)
+    kind = C_KEYWORD_KINDS[keyword.group(1)] if keyword else C_STATEMENT
+    # Control keywords never count as declarations, but "case 1:" historically does
+    if (kind == C_STATEMENT or kind == C_CASE) and C_DECLARATION_RE.match(line):
+        return C_DECLARATION
+    return kind
+
+# Dispatch on the first character; lines starting with any other non-word
+# character cannot match a prototype, declaration or keyword.
+C_PREFIX_DISPATCH = {
+    '#': _classify_hash,
+    '{': _classify_open_brace,
+    '}': _classify_close_brace,
+}
+
+def classify_c_line(line):
+    """Returns the C_* kind of a stripped, non-empty unit that is not a comment."""
+    head = line[0]
+    handler = C_PREFIX_DISPATCH.get(head)
+    if handler is not None:
+        return handler(line)
+    if head.isalnum() or head == "_":
+        return _classify_word(line)
+    return C_STATEMENT
+
+
+# -------------------- C LEXER --------------------
+_C_COMMENT = r"/\*.*?(?:\*/|\Z)|//(?:\\\n|[^\n])*+"
+_C_DIRECTIVE = r"\#(?:\\\n|[^\n])*+"
+_C_STRING = r""""(?:[^"\\\n]|\\.)*+"?|'(?:[^'\\\n]|\\.)*+'?"""
+_C_PLAIN = r"""[^;{}()/"'#:]"""
+
+# Skips to the next unit and matches it whole when it can: braces, comments,
+# preprocessor lines, "else", "do", and statements without strings, comments
+# or nested parentheses. Otherwise it tells where the unit ends: after a
+# control header's parenthesised condition, or at a case label's colon.
+C_UNIT_START_RE, C_UNIT_START_BYTES_RE = _compile_text_and_bytes("|".join((
+    r"\s*+(?:(?P<header>)(?:else\s+if|if|for|while|switch)\s*(?=\()",
+    r"(?P<keyword>else|do)\b",
+    r"(?P<label>case|default)\b",
+    r"(?P<open>\{)",
+    r"(?P<close>\})",
+    r"(?P<empty>;)",
+    rf"(?P<comment>{_C_COMMENT})",
+    rf"(?P<directive>{_C_DIRECTIVE})",
+    rf"(?P<simple>{_C_PLAIN}++(?:\({_C_PLAIN}*+\){_C_PLAIN}*+)*+;))?",
+)), re.DOTALL)
+
+# Inside any other unit: one search per token of interest, with identifiers,
+# numbers and operators in between skipped by the regex engine. The leading
+# lookahead lets it reject those characters with a single set test.
+C_TOKEN_RE, C_TOKEN_BYTES_RE = _compile_text_and_bytes(r"""(?=[/"'#;{}():])(?:%s)""" % "|".join((
+    rf"(?P<comment>{_C_COMMENT})",
+    rf"(?P<string>{_C_STRING})",
+    rf"(?P<directive>{_C_DIRECTIVE})",
+    r"(?P<semicolon>;)",
+    r"(?P<open>\{)",
+    r"(?P<close>\})",
+    r"(?P<paren>\()",
+    r"(?P<unparen>\))",
+    r"(?P<colon>:)",
+)), re.DOTALL)
+C_SPACE_RE, C_SPACE_BYTES_RE = _compile_text_and_bytes(r"\s*+")
+
+def iter_c_units(source, preprocessor=None, offset=0, line=1):
+    """Yields (kind, start, end, line number, text) for every unit of C source in one pass.
+
+    A unit is what the builder puts in one box: a comment, a preprocessor
+    line, a brace, a statement up to its ";", a control header up to its
+    closing parenthesis, "else", "do" or a case label. Several units may
+    share a line and one unit may span lines; strings and comments inside a
+    unit never end it. kind is the classify_c_line() kind and text the unit
+    with runs of whitespace collapsed.
+
+    With a CPreprocessor, directives are fed to it and conditionals are not
+    yielded; an inactive branch is skipped straight to its next directive
+    line without being lexed. offset and line start the scan part way
+    through the source, at a unit boundary.
+    """
+    if isinstance(source, str):
+        unit_head = C_UNIT_START_RE.match
+        token = C_TOKEN_RE.search
+        skip_space = C_SPACE_RE.match
+        next_directive = C_DIRECTIVE_LINE_RE.search
+        newline, semicolon, initializer = "\n", ";", ("=", ",")
+        count_newlines = source.count
+        decode = None
+    else:
+        unit_head = C_UNIT_START_BYTES_RE.match
+        token = C_TOKEN_BYTES_RE.search
+        skip_space = C_SPACE_BYTES_RE.match
+        next_directive = C_DIRECTIVE_LINE_BYTES_RE.search
+        newline, semicolon, initializer = b"\n", b";", (b"=", b",")
+        count_newlines = lambda sub, start, end: source[start:end].count(sub)
+        decode = lambda text: text.decode('utf-8', errors='replace')
+    size = len(source)
+    line_number = line
+    counted = offset
+
+    def unit(start, end, kind=None):
+        nonlocal line_number, counted
+        line_number += count_newlines(newline, counted, start)
+        counted = start
+        text = source[start:end]
+        if decode is not None:
+            text = decode(text)
+        if "\n" in text:
+            text = " ".join(text.split())
+        return (classify_c_line(text) if kind is None else kind), start, end, line_number, text
+
+    def trimmed_end(start, end):
+        return start + len(source[start:end].rstrip())
+
+    position = offset
+    while True:
+        if preprocessor is not None and not preprocessor.active:
+            directive = next_directive(source, position)
+            position = size if directive is None else directive.end() - 1
+        head = unit_head(source, position)
+        mode = head.lastgroup
+        if mode is None:
+            position = head.end()
+            if position >= size:
+                return
+        else:
+            position = head.start(mode)
+            if mode != 'header' and mode != 'label':
+                end = head.end()
+                if mode == 'simple' or mode == 'keyword':
+                    yield unit(position, end)
+                elif mode == 'open':
+                    yield unit(position, end, C_OPEN_BRACE)
+                elif mode == 'close':
+                    yield unit(position, end, C_CLOSE_BRACE)
+                elif mode == 'comment':
+                    yield unit(position, trimmed_end(position, end), C_COMMENT)
+                elif mode == 'directive':
+                    directive = unit(position, trimmed_end(position, end))
+                    if preprocessor is None or not preprocessor.directive(directive[4]):
+                        yield directive
+                position = end  # a lone ";" is an empty statement
+                continue
+
+        # Walk the unit token by token until it ends
+        unit_start = position
+        parens = braces = 0
+        while True:
+            match = token(source, position)
+            if match is None:
+                yield unit(unit_start, trimmed_end(unit_start, size))
+                return
+            group = match.lastgroup
+            position = match.end()
+            if group == 'comment' or group == 'string':
+                continue
+            if group == 'paren':
+                parens += 1
+            elif group == 'unparen':
+                if parens:
+                    parens -= 1
+                if not parens and mode == 'header':
+                    # `while (x);` closing a do-while, or a header with an empty body
+                    after = skip_space(source, position).end()
+                    if source[after:after + 1] == semicolon:
+                        position = after + 1
+                    yield unit(unit_start, position)
+                    break
+            elif group == 'semicolon':
+                if not parens and not braces:
+                    yield unit(unit_start, position)
+                    break
+            elif group == 'colon':
+                if mode == 'label' and not parens and not braces:
+                    yield unit(unit_start, position)
+                    break
+            elif group == 'open':
+                if braces or parens or source[unit_start:match.start()].rstrip().endswith(initializer):
+                    braces += 1  # initializer list or compound literal
+                else:
+                    # A block opening on the same line: `int main(void) {`, `struct s {`
+                    yield unit(unit_start, trimmed_end(unit_start, match.start()))
+                    yield unit(match.start(), position, C_OPEN_BRACE)
+                    break
+            elif group == 'close':
+                if braces:
+                    braces -= 1
+                else:
+                    # A statement missing its ";" right before a closing brace
+                    yield unit(unit_start, trimmed_end(unit_start, match.start()))
+                    yield unit(match.start(), position, C_CLOSE_BRACE)
+                    break
+            else:  # a directive interrupting a statement ends it
+                yield unit(unit_start, trimmed_end(unit_start, match.start()))
+                directive = unit(match.start(), trimmed_end(match.start(), position))
+                if preprocessor is None or not preprocessor.directive(directive[4]):
+                    yield directive
+                break
+
+
+# -------------------- C PREPROCESSOR --------------------
+C_DIRECTIVE_NAME_RE = re.compile(r"#\s*(\w*)")
+C_DIRECTIVE_COMMENT_RE = re.compile(r"/\*.*?(?:\*/|$)|//.*|\\(?=\s|$)")
+C_MACRO_DEFINITION_RE = re.compile(r"([A-Za-z_]\w*)(\([^)]*\))?\s*(.*)")
+# Where the next directive could start; everything before it in a dead branch is skipped unread
+C_DIRECTIVE_LINE_RE, C_DIRECTIVE_LINE_BYTES_RE = _compile_text_and_bytes(r"^[ \t]*+\#", re.MULTILINE)
+
+C_EXPRESSION_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<number>0[xX][0-9a-fA-F]+|\d+)[uUlL]*
+   |(?P<char>'(?:\\.|[^'\\])+')
+   |(?P<name>[A-Za-z_]\w*)
+   |(?P<op>&&|\|\||<<|>>|<=|>=|==|!=|[-+*/%<>&^|!~?:(),])
+)""", re.VERBOSE)
+C_CHAR_ESCAPES = {'n': 10, 't': 9, 'r': 13, '0': 0, 'a': 7, 'b': 8, 'f': 12, 'v': 11}
+
+C_BINARY_OPERATORS = {
+    '*': (10, lambda a, b: a * b),
+    '/': (10, lambda a, b: int(a / b)),   # C truncates toward zero
+    '%': (10, lambda a, b: a - b * int(a / b)),
+    '+': (9, lambda a, b: a + b),
+    '-': (9, lambda a, b: a - b),
+    '<<': (8, lambda a, b: a << b),
+    '>>': (8, lambda a, b: a >> b),
+    '<': (7, lambda a, b: int(a < b)),
+    '<=': (7, lambda a, b: int(a <= b)),
+    '>': (7, lambda a, b: int(a > b)),
+    '>=': (7, lambda a, b: int(a >= b)),
+    '==': (6, lambda a, b: int(a == b)),
+    '!=': (6, lambda a, b: int(a != b)),
+    '&': (5, lambda a, b: a & b),
+    '^': (4, lambda a, b: a ^ b),
+    '|': (3, lambda a, b: a | b),
+    '&&': (2, lambda a, b: int(bool(a and b))),
+    '||': (1, lambda a, b: int(bool(a or b))),
+}
+C_UNARY_OPERATORS = {
+    '!': lambda a: int(not a),
+    '~': lambda a: ~a,
+    '-': lambda a: -a,
+    '+': lambda a: a,
+}
+
+def parse_defines(definitions):
+    """Turns command-line style "NAME" / "NAME=VALUE" strings into a macro dict ("NAME" means 1)."""
+    defines = {}
+    for definition in definitions or ():
+        name, _, value = definition.partition("=")
+        defines[name.strip()] = value.strip() if _ else "1"
+    return defines
+
+def _condition_tokens(expression, macros, expanding):
+    """Tokenizes a #if expression, resolving `defined` and expanding object-like macros."""
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = C_EXPRESSION_TOKEN_RE.match(expression, position)
+        if match is None:
+            raise ValueError(f"unexpected {expression[position:]!r}")
+        position = match.end()
+        if match.group('number'):
+            number = match.group('number')
+            tokens.append(int(number, 16 if number[1:2] in ("x", "X") else 8 if number[0] == "0" else 10))
+        elif match.group('char'):
+            body = match.group('char')[1:-1]
+            tokens.append(ord(body) if len(body) == 1 else C_CHAR_ESCAPES.get(body[1], ord(body[-1])))
+        elif match.group('name') == "defined":
+            name = C_EXPRESSION_TOKEN_RE.match(expression, position)
+            parenthesized = name is not None and name.group('op') == "("
+            if parenthesized:
+                name = C_EXPRESSION_TOKEN_RE.match(expression, name.end())
+            if name is None or not name.group('name'):
+                raise ValueError("defined without a macro name")
+            position = name.end()
+            if parenthesized:
+                close = C_EXPRESSION_TOKEN_RE.match(expression, position)
+                if close is None or close.group('op') != ")":
+                    raise ValueError("unclosed defined(")
+                position = close.end()
+            tokens.append(int(name.group('name') in macros))
+        elif match.group('name'):
+            name = match.group('name')
+            value = macros.get(name)
+            if value is None or name in expanding or isinstance(value, tuple):
+                tokens.append(0)  # undefined names and function-like macros evaluate to 0
+                position = _skip_arguments(expression, position)
+            else:
+                tokens.extend(_condition_tokens(value, macros, expanding | {name}) or [0])
+        else:
+            tokens.append(match.group('op'))
+    return tokens
+
+def _skip_arguments(expression, position):
+    """Skips a parenthesised argument list at `position`, if there is one."""
+    match = C_EXPRESSION_TOKEN_RE.match(expression, position)
+    if match is None or match.group('op') != "(":
+        return position
+    depth = 0
+    for index in range(match.end() - 1, len(expression)):
+        if expression[index] == "(":
+            depth += 1
+        elif expression[index] == ")":
+            depth -= 1
+            if not depth:
+                return index + 1
+    raise ValueError("unclosed argument list")
+
+def evaluate_c_condition(expression, macros):
+    """Evaluates a #if / #elif expression with C integer rules; never calls eval().
+
+    Undefined identifiers and function-like macros count as 0. Raises
+    ValueError for expressions it cannot evaluate.
+    """
+    tokens = _condition_tokens(expression, macros, frozenset())
+    position = 0
+
+    def operand():
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError("missing operand")
+        token = tokens[position]
+        position += 1
+        if isinstance(token, int):
+            return token
+        if token == "(":
+            value = conditional()
+            if position >= len(tokens) or tokens[position] != ")":
+                raise ValueError("unbalanced parentheses")
+            position += 1
+            return value
+        if token in C_UNARY_OPERATORS:
+            return C_UNARY_OPERATORS[token](operand())
+        raise ValueError(f"unexpected {token!r}")
+
+    def binary(minimum):
+        nonlocal position
+        left = operand()
+        while position < len(tokens) and tokens[position] in C_BINARY_OPERATORS:
+            precedence, apply = C_BINARY_OPERATORS[tokens[position]]
+            if precedence < minimum:
+                break
+            position += 1
+            right = binary(precedence + 1)
+            try:
+                left = apply(left, right)
+            except ZeroDivisionError:
+                raise ValueError("division by zero") from None
+        return left
+
+    def conditional():
+        nonlocal position
+        condition = binary(1)
+        if position < len(tokens) and tokens[position] == "?":
+            position += 1
+            if_true = conditional()
+            if position >= len(tokens) or tokens[position] != ":":
+                raise ValueError("? without :")
+            position += 1
+            if_false = conditional()
+            return if_true if condition else if_false
+        return condition
+
+    value = conditional()
+    if position != len(tokens):
+        raise ValueError(f"unexpected {tokens[position]!r}")
+    return value
+
+class CPreprocessor:
+    """Conditional-compilation state for one C source.
+
+    Tracks #if/#ifdef/#ifndef/#elif/#else/#endif against a macro table that
+    starts from `defines` (name -> replacement text). With file_macros the
+    source's own #define and #undef lines in active code update the table;
+    without it only `defines` decide which branches are live. A condition
+    that cannot be evaluated is treated as false.
+    """
+
+    def __init__(self, defines=None, file_macros=True):
+        self.macros = dict(defines or {})
+        self.file_macros = file_macros
+        self.conditions = []   # per open #if: [enclosing branch active, a branch was taken]
+        self.active = True
+
+    def branch_taken(self, name, argument):
+        if name == 'else':
+            return True
+        if name.endswith('def'):  # ifdef / ifndef / elifdef / elifndef
+            return bool(argument) and (argument.split()[0] in self.macros) != name.endswith('ndef')
+        try:
+            return bool(evaluate_c_condition(argument, self.macros))
+        except (ValueError, RecursionError):
+            return False
+
+    def directive(self, text):
+        """Applies one directive line; returns True unless it is drawn (conditionals and dead code are not)."""
+        match = C_DIRECTIVE_NAME_RE.match(text)
+        name = match.group(1) if match else ""
+        argument = C_DIRECTIVE_COMMENT_RE.sub(" ", text[match.end():]).strip() if match else ""
+
+        if name in ('if', 'ifdef', 'ifndef'):
+            taken = self.active and self.branch_taken(name, argument)
+            self.conditions.append([self.active, taken])
+            self.active = taken
+            return True
+        if name in ('elif', 'elifdef', 'elifndef', 'else', 'endif'):
+            if not self.conditions:
+                return True  # unbalanced; nothing to close
+            enclosing, taken = self.conditions[-1]
+            if name == 'endif':
+                self.conditions.pop()
+                self.active = enclosing
+            elif enclosing and not taken and self.branch_taken(name, argument):
+                self.conditions[-1][1] = True
+                self.active = True
+            else:
+                self.active = False
+            return True
+
+        if self.active and self.file_macros:
+            if name == 'define':
+                definition = C_MACRO_DEFINITION_RE.match(argument)
+                if definition:
+                    macro, parameters, body = definition.groups()
+                    # Function-like macros only count for `defined`
+                    self.macros[macro] = (parameters, body) if parameters else body
+            elif name == 'undef' and argument:
+                self.macros.pop(argument.split()[0], None)
+        return not self.active
+
+
+# -------------------- C PARSER --------------------
+C_FUNCTION_NAME_RE = re.compile(r"(\w+)\s*\(")
+
+def _report_unit_progress(units, progress):
+    """Passes C units through, calling progress(line number) every PROGRESS_INTERVAL of source."""
+    report_at = PROGRESS_INTERVAL
+    for unit in units:
+        if unit[1] >= report_at:
+            progress(unit[3])
+            report_at = unit[1] + PROGRESS_INTERVAL
+        yield unit
+
+def _units_before(units, stop):
+    """Passes C units through until one starts at or after `stop`."""
+    for unit in units:
+        if unit[1] >= stop:
+            return
+        yield unit
+
+def parse_c_code(source, defines=None, file_macros=True, progress=None, offset=0, line=1, stop=None):
+    """Parses C source into a Flowchart.
+
+    Comments, includes and prototypes sit at depth 0; the first declaration
+    is taken as the function declaration (depth 0) and the rest as variable
+    declarations (depth 1). Everything else is function logic, starting at
+    depth 1 and nested by braces, switches and brace-less control bodies.
+
+    With `defines` (a dict, possibly empty) the source is preprocessed for
+    that configuration: only the live branch of each #if chain is drawn and
+    the conditionals themselves are left out. file_macros lets the source's
+    own #define / #undef lines take part in the conditions.
+
+    progress, if given, is called with the current line number about every
+    PROGRESS_INTERVAL characters (bytes for a bytes-like source).
+
+    offset, line and stop parse just one region for reparse(): from
+    `offset` (a resync point, on line `line`) to the first unit starting at
+    or after `stop`.
+    """
+    preprocessor = None if defines is None else CPreprocessor(defines, file_macros)
+    units = iter_c_units(source, preprocessor, offset, line)
+    if stop is not None:
+        units = _units_before(units, stop)
+    if progress is not None:
+        units = _report_unit_progress(units, progress)
+    flowchart = Flowchart('c', source)
+    add = flowchart.add
+    add_resync_offset = flowchart.resync_offsets.append
+    add_resync_line = flowchart.resync_lines.append
+    declaration_depth = 0
+
+    # Function index state: braces at file scope, the last unit that could
+    # head a definition, and the definition being parsed
+    scope = 0
+    header = None
+    function = None
+
+    # Function logic state
+    depth = 1
+    open_braces = 0
+    increment_next = False
+    after_control = False
+
+    for kind, start, end, line_number, text in units:
+        if kind == C_OPEN_BRACE:
+            if not scope:
+                function, header = header, None
+            scope += 1
+        elif kind == C_CLOSE_BRACE:
+            if scope:
+                scope -= 1
+                if not scope and function is not None:
+                    first, name, function_start, function_line = function
+                    flowchart.functions.append(Function(name, function_start, end, first, len(flowchart),
+                                                        max(flowchart.depths[first:]), function_line))
+                    function = None
+        elif not scope and kind != C_COMMENT:
+            # `int main(void)` followed by "{" at file scope starts a definition
+            name = C_FUNCTION_NAME_RE.search(text) if text.endswith(")") and kind != C_CONTROL else None
+            header = (len(flowchart), name.group(1), start, line_number) if name else None
+
+        if kind == C_COMMENT:
+            add(COMMENT, 0, start, end, line_number)
+            continue
+        if kind == C_INCLUDE:
+            add(DIRECTIVE, 0, start, end, line_number)
+            continue
+        if kind == C_PROTOTYPE:
+            add(PROTOTYPE, 0, start, end, line_number)
+            continue
+        if kind == C_DECLARATION:
+            add(DECLARATION, declaration_depth, start, end, line_number)
+            declaration_depth = 1
+            continue
+
+        # A control statement's body depends on the logic line that follows it
+        if after_control:
+            after_control = False
+            if kind == C_OPEN_BRACE:
+                open_braces += 1
+                depth += 1
+            else:
+                increment_next = True
+
+        if kind == C_SWITCH:
+            add(CONTROL, depth, start, end, line_number)
+            open_braces += 1
+            depth += 1
+        elif kind == C_CASE:
+            add(CASE, depth + 1, start, end, line_number)
+        elif kind == C_CONTROL:
+            add(CONTROL, depth, start, end, line_number)
+            # `while (x);` ending a do-while has no body to indent
+            after_control = not text.endswith(";")
+        elif increment_next:
+            add(STATEMENT, depth + 1, start, end, line_number)
+            increment_next = False
+        elif kind == C_OPEN_BRACE:
+            pass
+        elif kind == C_CLOSE_BRACE:
+            if open_braces:
+                open_braces -= 1
+                depth -= 1
+            elif not scope and header is None:
+                # Back at file scope in the parser's initial state
+                add_resync_offset(end)
+                add_resync_line(line_number)
+        else:
+            add(STATEMENT, depth, start, end, line_number)
+
+    return flowchart
+
+
+def function_flowchart(flowchart, function):
+    """One indexed function as a Flowchart of its own, drawn with its header as the function declaration.
+
+    The node arrays are sliced, never re-parsed, and the source is shared.
+    """
+    part = Flowchart(flowchart.language, flowchart.source)
+    for column in NODE_COLUMNS:
+        setattr(part, column, getattr(flowchart, column)[function.first:function.last])
+    if part.kinds and part.kinds[0] == DECLARATION:
+        part.depths[0] = 0
+    return part
+
+def find_functions(flowchart, names):
+    """The indexed functions called any of `names`, in source order; raises KeyError naming a missing one."""
+    wanted = set(names)
+    found = [function for function in flowchart.functions if function.name in wanted]
+    missing = wanted.difference(function.name for function in found)
+    if missing:
+        raise KeyError(", ".join(sorted(missing)))
+    return found
+
+
+# -------------------- PYTHON PARSER --------------------
+def _anything_but(excluded):
+    """A class of every character but the ASCII ones in `excluded`, written as
+    ranges: re tests those about three times faster than the negated class."""
+    ranges = []
+    start = 0
+    for code in sorted(map(ord, excluded)):
+        if start < code:
+            ranges.append(f"\\x{start:02x}-\\x{code - 1:02x}")
+        start = code + 1
+    ranges.append(f"\\x{start:02x}-\\U0010ffff")
+    return "[" + "".join(ranges) + "]"
+
+# Runs of code that is neither string, comment, bracket nor backslash; only
+# inside brackets do they take newlines along
+_PLAIN = _anything_but("'\"#()[]{}\\\n") + "*+"
+_PLAIN_IN_BRACKETS = _anything_but("'\"#()[]{}\\") + "*+"
+# String literals: closed on the same line, or triple-quoted and free to span lines
+_SINGLE_QUOTED = _anything_but("'\\\n") + "*+"
+_DOUBLE_QUOTED = _anything_but('"\\\n') + "*+"
+_LINE_STRING = (rf"""(?!''')'{_SINGLE_QUOTED}(?:\\[^\n]{_SINGLE_QUOTED})*+'"""
+                rf"""|(?!\"\"\")"{_DOUBLE_QUOTED}(?:\\[^\n]{_DOUBLE_QUOTED})*+\"""")
+_SINGLE_QUOTED_LINES = _anything_but("'\\") + "*+"
+_DOUBLE_QUOTED_LINES = _anything_but('"\\') + "*+"
+_LONG_STRING = (rf"""'''{_SINGLE_QUOTED_LINES}(?:(?:\\[\s\S]|'(?!'')){_SINGLE_QUOTED_LINES})*+'''"""
+                rf"""|\"\"\"{_DOUBLE_QUOTED_LINES}(?:(?:\\[\s\S]|"(?!"")){_DOUBLE_QUOTED_LINES})*+\"\"\"""")
+_STRING_OR_CONTINUATION = rf"{_LONG_STRING}|{_LINE_STRING}|\\\r?\n"
+# Where a run of plain code stops at something else than a comment or the end of the line
+_SPECIAL = r"""(?=['"\\(\[{])"""
+
+def _bracketed(inner):
+    return rf"\({inner}\)|\[{inner}\]|\{{{inner}\}}"
+
+# Inside brackets newlines and comments do not end the logical line
+_IN_BRACKETS = rf"{_PLAIN_IN_BRACKETS}(?:(?:{_STRING_OR_CONTINUATION}|#[^\n]*+){_PLAIN_IN_BRACKETS})*+"
+for _ in range(2):
+    _IN_BRACKETS = (rf"{_PLAIN_IN_BRACKETS}(?:(?:{_STRING_OR_CONTINUATION}|#[^\n]*+|{_bracketed(_IN_BRACKETS)})"
+                    rf"{_PLAIN_IN_BRACKETS})*+")
+
+_BLOCK_KEYWORD = r"(?:async\s+)?(?:(?P<definition>def|class)|if|elif|else|for|while|try|except|finally|with)\b"
+
+# Nearly every logical line is one match, with the blank lines before it in
+# `lead` and any block keyword it starts with in `keyword`: brackets closed
+# (nested up to three deep), strings closed and backslash continuations
+# followed. The scanner below takes over where `stuck` matches.
+PYTHON_LOGICAL_LINE_RE, PYTHON_LOGICAL_LINE_BYTES_RE = _compile_text_and_bytes(
+    rf"(?P<lead>[ \t\f\n]*+)(?:(?=[acdefitw])(?=(?P<keyword>{_BLOCK_KEYWORD}))|)"
+    rf"(?P<code>{_PLAIN}(?:{_SPECIAL}(?:{_STRING_OR_CONTINUATION}|{_bracketed(_IN_BRACKETS)}){_PLAIN})*+)"
+    rf"(?P<comment>#[^\n]*+)?(?:\n|\Z|(?P<stuck>))")
+
+# Everything else is walked token by token: any string literal (including
+# triple-quoted ones spanning lines), comments, brackets, backslash
+# continuations and newlines. Names, numbers and operators are skipped.
+PYTHON_TOKEN_RE, PYTHON_TOKEN_BYTES_RE = _compile_text_and_bytes(r"""(?=['"#()\[\]{}\\\n])(?:%s)""" % "|".join((
+    r"(?P<string>'''[^'\\]*+(?:(?:\\.|'(?!''))[^'\\]*+)*+'''"
+    r'|"""[^"\\]*+(?:(?:\\.|"(?!""))[^"\\]*+)*+"""'
+    r"|'[^'\\\n]*+(?:\\.[^'\\\n]*+)*+'"
+    r'|"[^"\\\n]*+(?:\\.[^"\\\n]*+)*+")',
+    r"(?P<comment>#[^\n]*)",
+    r"(?P<open>[(\[{])",
+    r"(?P<close>[)\]}])",
+    r"(?P<continuation>\\\r?\n)",
+    r"(?P<newline>\n)",
+)), re.DOTALL)
+
+PYTHON_BLOCK_RE, PYTHON_BLOCK_BYTES_RE = _compile_text_and_bytes(_BLOCK_KEYWORD)
+# "match" and "case" are soft keywords: `match = 1` and `match(x)` are plain statements
+PYTHON_SOFT_KEYWORD_RE, PYTHON_SOFT_KEYWORD_BYTES_RE = _compile_text_and_bytes(
+    r"(?:match|case)\b(?!\s*(?:[=.,:)\]}]|$))")
+# A line that is only a string literal, such as a one-line docstring
+PYTHON_STRING_LINE_RE, PYTHON_STRING_LINE_BYTES_RE = _compile_text_and_bytes(
+    rf"[rRbBuUfF]{{0,2}}(?:{_LONG_STRING}|{_LINE_STRING})")
+
+def indent_column(prefix):
+    """Column after the whitespace `prefix`, with tabs advancing to the next multiple of 8 like tokenize."""
+    if "\t" not in prefix and "\f" not in prefix:
+        return len(prefix)
+    column = 0
+    for char in prefix:
+        if char == "\t":
+            column = (column // 8 + 1) * 8
+        elif char == "\f":
+            column = 0
+        else:
+            column += 1
+    return column
+
+def is_string_prefix(prefix):
+    return len(prefix) <= 2 and (not prefix or prefix.isalpha())
+
+def parse_python(source, progress=None, offset=0, line=1, stop=None):
+    """Parses Python source into a Flowchart following tokenize's structure.
+
+    Every logical line is one node, so bracketed and backslash continuations
+    and multi-line strings stay in the box of their statement, and depth
+    follows INDENT/DEDENT with tabs counted like the tokenizer does. Block
+    headers (if/elif/else, for/while, try/except/finally, with, match/case)
+    are CONTROL nodes, def and class are DEFINITION nodes, and comments and
+    bare string statements such as docstrings are COMMENT nodes. A comment
+    on its own line sits at the depth of the code at its column. A leading
+    shebang is skipped. progress, offset, line and stop are as for
+    parse_c_code(); the region ends at the first logical line starting at
+    or after `stop`.
+    """
+    flowchart = Flowchart('python', source)
+    if isinstance(source, str):
+        logical_lines = PYTHON_LOGICAL_LINE_RE.finditer
+        scanner = PYTHON_TOKEN_RE.finditer
+        block = PYTHON_BLOCK_RE.match
+        soft_keyword = PYTHON_SOFT_KEYWORD_RE.match
+        string_line = PYTHON_STRING_LINE_RE.fullmatch
+        newline, colon, shebang = "\n", ":", "#!"
+        decode = str
+    else:
+        logical_lines = PYTHON_LOGICAL_LINE_BYTES_RE.finditer
+        scanner = PYTHON_TOKEN_BYTES_RE.finditer
+        block = PYTHON_BLOCK_BYTES_RE.match
+        soft_keyword = PYTHON_SOFT_KEYWORD_BYTES_RE.match
+        string_line = PYTHON_STRING_LINE_BYTES_RE.fullmatch
+        newline, colon, shebang = b"\n", b":", b"#!"
+        decode = lambda whitespace: whitespace.decode('latin-1')
+    size = len(source)
+    # Last characters of code, as code[-1] gives them (ints for bytes)
+    last_colon = colon[-1]
+    last_quotes = frozenset("'\"" if isinstance(source, str) else b"'\"")
+
+    # Nodes go straight onto the arrays; depths are clamped to MAX_DEPTH like
+    # Flowchart.add does, as the input need not be code that compiles
+    append_kind = flowchart.kinds.append
+    append_depth = flowchart.depths.append
+    append_start = flowchart.starts.append
+    append_length = flowchart.lengths.append
+    append_line = flowchart.lines.append
+
+    indents = [0]          # columns of the open blocks, like tokenize's indent stack
+    columns = {}           # indentation seen so far -> its column
+    depth = 0              # len(indents) - 1
+    opened_block = False   # the last logical line ended with ":"
+
+    position = offset
+    line_number = line
+    end_of_scan = size if stop is None else min(size, stop)
+    # With a progress callback the scan stops at every PROGRESS_INTERVAL to
+    # report, so the per-line loop carries no extra test
+    limit = end_of_scan if progress is None else min(end_of_scan, offset + PROGRESS_INTERVAL)
+    while True:
+        while position < limit:
+            for match in logical_lines(source, position):
+                lead, keyword, definition, code, comment, stuck = match.groups()
+                code_start = match.start(4)
+                indent = lead
+                if newline in lead:
+                    line_number += lead.count(newline)
+                    indent = lead[lead.rfind(newline) + 1:]
+                if code_start >= limit and code_start - len(indent) >= limit:
+                    position = code_start - len(indent)
+                    break
+                try:
+                    column = columns[indent]
+                except KeyError:
+                    column = columns[indent] = indent_column(decode(indent))
+                first_line = line_number
+
+                if stuck is None:
+                    if newline in code:
+                        line_number += code.count(newline)
+                    line_number += 1
+                    code = code.rstrip()
+                    if not code:
+                        if comment is not None and not (code_start == 0 and comment.startswith(shebang)):
+                            comment_depth = bisect_right(indents, column) - 1
+                            if opened_block and column > indents[-1]:
+                                comment_depth += 1  # leads a block whose first statement has not been seen yet
+                            append_kind(COMMENT)
+                            append_depth(min(comment_depth, MAX_DEPTH))
+                            append_start(code_start)
+                            append_length(len(comment.rstrip()))
+                            append_line(first_line)
+                        continue
+                    end = code_start + len(code) if comment is None else match.start(5) + len(comment.rstrip())
+                    last = code[-1]
+                    only_string = last in last_quotes and string_line(code) is not None
+                else:
+                    # A logical line the pattern cannot vouch for, such as one with an
+                    # unclosed string or brackets nested too deep: scan tokens until
+                    # a newline outside brackets.
+                    brackets = 0
+                    comment_start = string_start = string_end = -1
+                    logical_end = size
+                    for token in scanner(source, code_start):
+                        group = token.lastgroup
+                        if group == 'newline':
+                            line_number += 1
+                            if not brackets:
+                                logical_end = token.start()
+                                break
+                            comment_start = -1  # a comment inside brackets is not trailing
+                        elif group == 'string':
+                            string_start, string_end = token.span()
+                            line_number += token.group().count(newline)
+                        elif group == 'comment':
+                            comment_start = token.start()
+                        elif group == 'continuation':
+                            comment_start = -1
+                            line_number += 1
+                        elif group == 'open':
+                            brackets += 1
+                        elif brackets:
+                            brackets -= 1
+                    else:
+                        line_number += 1
+
+                    code = source[code_start:logical_end if comment_start < 0 else comment_start].rstrip()
+                    end = code_start + len(source[code_start:logical_end].rstrip())
+                    only_string = string_end == code_start + len(code) and is_string_prefix(source[code_start:string_start])
+                    position = logical_end + 1
+                    keyword = block(source, code_start)
+                    definition = keyword is not None and keyword.group('definition')
+                    last = code[-1]
+
+                if column != indents[-1]:
+                    while column < indents[-1]:
+                        indents.pop()
+                    if column > indents[-1]:
+                        indents.append(column)
+                    depth = len(indents) - 1
+                if only_string:
+                    kind = COMMENT  # docstring or another bare string
+                elif keyword is not None:
+                    kind = DEFINITION if definition else CONTROL
+                elif colon in code and soft_keyword(source, code_start):
+                    kind = CONTROL
+                else:
+                    kind = STATEMENT
+                append_kind(kind)
+                append_depth(depth if depth < MAX_DEPTH else MAX_DEPTH)
+                append_start(code_start)
+                append_length(end - code_start)
+                append_line(first_line)
+                opened_block = last == last_colon
+                if stuck is not None:
+                    break  # the scanner went past the pattern's matches
+            else:
+                position = size  # the match at the end of the source was the last one
+
+        if position >= end_of_scan:
+            return flowchart
+        progress(line_number)
+        limit = min(end_of_scan, position + PROGRESS_INTERVAL)
+
+
+PARSERS = {'c': parse_c_code, 'python': parse_python}
+
+
+# -------------------- INCREMENTAL REPARSE --------------------
+# Sources are compared this many characters (or bytes) at a time when looking for the edit
+DIFF_BLOCK = 64 * 1024
+
+def _common_prefix(a, b, limit):
+    length = 0
+    while length < limit:
+        step = min(DIFF_BLOCK, limit - length)
+        if a[length:length + step] == b[length:length + step]:
+            length += step
+            continue
+        # The first difference is in this block: bisect it
+        high = length + step
+        while high - length > 1:
+            middle = (length + high) // 2
+            if a[length:middle] == b[length:middle]:
+                length = middle
+            else:
+                high = middle
+        break
+    return length
+
+def _common_suffix(a, b, limit):
+    length = 0
+    a_end, b_end = len(a), len(b)
+    while length < limit:
+        step = min(DIFF_BLOCK, limit - length)
+        if a[a_end - length - step:a_end - length] == b[b_end - length - step:b_end - length]:
+            length += step
+            continue
+        high = length + step
+        while high - length > 1:
+            middle = (length + high) // 2
+            if a[a_end - middle:a_end - length] == b[b_end - middle:b_end - length]:
+                length = middle
+            else:
+                high = middle
+        break
+    return length
+
+def diff_sources(old, new):
+    """The edit turning `old` into `new` (sources of one type) as (start, old_end, new_end) offsets.
+
+    The changed span lies between the longest common prefix and suffix, which
+    are compared a block at a time, so the cost is that of a memory compare.
+    """
+    limit = min(len(old), len(new))
+    start = _common_prefix(old, new, limit)
+    suffix = _common_suffix(old, new, limit - start)
+    return start, len(old) - suffix, len(new) - suffix
+
+def _python_resync(flowchart, index, step):
+    """From node `index` on (step 1) or back (step -1), the first code node at depth 0; None if there is none.
+
+    Such a line is at column 0 and resets the indentation stack, so the
+    Python parser's state there does not depend on anything before it.
+    """
+    kinds, depths = flowchart.kinds, flowchart.depths
+    while 0 <= index < len(kinds):
+        if not depths[index] and kinds[index] != COMMENT:
+            return flowchart.starts[index], flowchart.lines[index]
+        index += step
+    return None
+
+def _resync_before(flowchart, offset):
+    """The last (offset, line) where parsing can restart regardless of the text from `offset` on; the start of the file if none.
+
+    A Python statement must start before `offset`: text inserted at its
+    start would be parsed where the statement was, with the state before it.
+    """
+    if flowchart.language == 'python':
+        point = _python_resync(flowchart, bisect_left(flowchart.starts, offset) - 1, -1)
+    else:
+        index = bisect_right(flowchart.resync_offsets, offset) - 1
+        point = (flowchart.resync_offsets[index], flowchart.resync_lines[index]) if index >= 0 else None
+    return point or (0, 1)
+
+def _resync_after(flowchart, offset):
+    """The first (offset, line) after `offset` where parsing can restart; None if there is none."""
+    if flowchart.language == 'python':
+        return _python_resync(flowchart, bisect_right(flowchart.starts, offset), 1)
+    index = bisect_right(flowchart.resync_offsets, offset)
+    if index < len(flowchart.resync_offsets):
+        return flowchart.resync_offsets[index], flowchart.resync_lines[index]
+    return None
+
+def _shifted(column, delta):
+    return column if not delta else array(column.typecode, map(delta.__add__, column))
+
+def reparse(previous, source, edit=None):
+    """Parses `source`, a new version of previous.source, reparsing only around the edit.
+
+    edit is (start, old_end, new_end): where the changed text starts, and
+    where it ends in the old and in the new source, as editors report it.
+    Without it diff_sources() compares the two sources, so previous.source
+    must still be readable (not a closed mapping).
+
+    Parsing restarts at the last resync point before the edit: a Python
+    statement at column 0, or the end of a top-level C block. It stops at
+    the first resync point after the edit where the new parse is back in
+    step with the old one, trying further points when it is not (an edit
+    that opens a string or a comment). The old nodes before and after that
+    region are reused; those after it are only moved by the edit's length.
+    The result is the same as a full parse of `source`.
+    """
+    language = previous.language
+    if edit is None:
+        edit = diff_sources(previous.source, source)
+    start, old_end, new_end = edit
+    delta = new_end - old_end
+    parser = PARSERS[language]
+    if language == 'python':
+        newline, triple_quotes = ("\n", ('"""', "'''")) if isinstance(source, str) else (b"\n", (b'"""', b"'''"))
+        around = source[max(0, start - 2):new_end + 2]
+        if any(quotes in around for quotes in triple_quotes):
+            # New triple quotes may close a string left open anywhere before the edit
+            return parser(source)
+    else:
+        newline = "\n" if isinstance(source, str) else b"\n"
+
+    begin, begin_line = _resync_before(previous, start)
+    target = old_end
+    while True:
+        point = _resync_after(previous, target)
+        if point is None:
+            part = parser(source, offset=begin, line=begin_line)
+            resume = len(previous)
+            break
+        resume_offset, resume_line = point
+        stop = resume_offset + delta
+        part = parser(source, offset=begin, line=begin_line, stop=stop)
+        if language == 'python':
+            # The line at `stop` must not have been taken into a statement before it
+            in_step = not part.kinds or part.starts[-1] + part.lengths[-1] <= stop
+        else:
+            in_step = bool(part.resync_offsets) and part.resync_offsets[-1] == stop
+        if in_step:
+            resume = bisect_left(previous.starts, resume_offset)
+            break
+        target = resume_offset + (resume_offset - begin)  # look twice as far next time
+
+    # The old nodes before `begin`, the new ones, then the old ones from `resume` on
+    first = bisect_left(previous.starts, begin)
+    line_delta = 0 if point is None else begin_line + source[begin:stop].count(newline) - resume_line
+    flowchart = Flowchart(language, source)
+    for column in ('kinds', 'depths', 'starts', 'lengths', 'lines'):
+        old = getattr(previous, column)
+        tail = old[resume:]
+        if column == 'starts':
+            tail = _shifted(tail, delta)
+        elif column == 'lines':
+            tail = _shifted(tail, line_delta)
+        setattr(flowchart, column, old[:first] + getattr(part, column) + tail)
+
+    if language == 'c':
+        kept = bisect_right(previous.resync_offsets, begin)
+        new_points = len(part.resync_offsets) - (point is not None)  # the last one is `stop`
+        reused = len(previous.resync_offsets) if point is None else bisect_left(previous.resync_offsets, resume_offset)
+        flowchart.resync_offsets = (previous.resync_offsets[:kept] + part.resync_offsets[:new_points]
+                                    + _shifted(previous.resync_offsets[reused:], delta))
+        flowchart.resync_lines = (previous.resync_lines[:kept] + part.resync_lines[:new_points]
+                                  + _shifted(previous.resync_lines[reused:], line_delta))
+        node_delta = first + len(part) - resume
+        flowchart.functions = [function for function in previous.functions if function.end <= begin]
+        flowchart.functions.extend(function._replace(first=function.first + first, last=function.last + first)
+                                   for function in part.functions)
+        if point is not None:
+            flowchart.functions.extend(
+                function._replace(start=function.start + delta, end=function.end + delta, first=function.first + node_delta,
+                                  last=function.last + node_delta, line=function.line + line_delta)
+                for function in previous.functions if function.start >= resume_offset)
+        _fix_declaration_depths(flowchart, first, first + len(part))
+    return flowchart
+
+def _fix_declaration_depths(flowchart, first, resume):
+    """Restores parse_c_code()'s rule that only the file's first declaration sits at depth 0.
+
+    The reparsed nodes [first, resume) were parsed as if at the start of
+    the file, and the reused ones after them counted on the old nodes
+    before them, so only the first declaration of either group can be off.
+    """
+    kinds, depths = flowchart.kinds, flowchart.depths
+    seen = kinds[:first].tobytes().find(DECLARATION) >= 0
+    for low, high in ((first, resume), (resume, len(kinds))):
+        found = kinds[low:high].tobytes().find(DECLARATION)
+        if found < 0:
+            continue
+        index = low + found
+        depth = 1 if seen else 0
+        if depths[index] != depth:
+            depths[index] = depth
+            # The depth of the function this declaration heads may change with it
+            for number, function in enumerate(flowchart.functions):
+                if function.first <= index < function.last:
+                    flowchart.functions[number] = function._replace(depth=max(depths[function.first:function.last]))
+        seen = True
+
+
+# -------------------- LAYOUT --------------------
+# Items yielded by layout()
+LAYOUT_BOX = 0      # (LAYOUT_BOX, node index)
+LAYOUT_HEADING = 1  # (LAYOUT_HEADING, title)
+LAYOUT_BREAK = 2    # (LAYOUT_BREAK, None)
+
+def layout(flowchart):
+    """Yields the boxes, section headings and breaks every renderer draws, in order."""
+    if flowchart.language == 'c':
+        return _layout_c(flowchart.kinds)
+    return ((LAYOUT_BOX, index) for index in range(len(flowchart)))
+
+def _layout_c(kinds):
+    # C charts are grouped into sections ahead of the function logic; each
+    # section rescans the kind array instead of building index lists
+    for title, kind in (("Comments:", COMMENT), ("Preprocessor Directives:", DIRECTIVE)):
+        if kind in kinds:
+            yield LAYOUT_HEADING, title
+            for index in _indexes_of(kinds, kind):
+                yield LAYOUT_BOX, index
+            yield LAYOUT_BREAK, None
+
+    if DECLARATION in kinds:
+        declarations = _indexes_of(kinds, DECLARATION)
+        yield LAYOUT_HEADING, "Function Declaration:"
+        yield LAYOUT_BOX, next(declarations)
+        yield LAYOUT_BREAK, None
+        yield LAYOUT_HEADING, "Variable Declarations:"
+        for index in declarations:
+            yield LAYOUT_BOX, index
+        yield LAYOUT_BREAK, None
+
+    if PROTOTYPE in kinds:
+        yield LAYOUT_HEADING, "Function Declarations:"
+        for index in _indexes_of(kinds, PROTOTYPE):
+            yield LAYOUT_BOX, index
+        yield LAYOUT_BREAK, None
+
+    yield LAYOUT_HEADING, "Function Logic Starts:"
+    for index, kind in enumerate(kinds):
+        if kind >= CONTROL:
+            yield LAYOUT_BOX, index
+
+def _indexes_of(kinds, kind):
+    return (index for index, node_kind in enumerate(kinds) if node_kind == kind)
+
+
+# -------------------- TEXT RENDERERS --------------------
+def get_arrow_color_for_depth(depth):
+    return NESTING_COLORS.get(depth % len(NESTING_COLORS), RESET)
+
+@lru_cache(maxsize=BOX_CACHE_SIZE)
+def render_text_box(stmt, depth, color, reset):
+    """Renders the lines of one box, returning (text, box_width); repeated statements hit the cache."""
+    indent = " " * (depth * 4)
+    lines = stmt.split("\n")
+    box_width = max(len(line) for line in lines) + 6
+    border = f"{indent}{color}+{'-' * box_width}+{reset}"
+    content = [f"{indent}{color}|  {line.ljust(box_width - 4)}  |{reset}" for line in lines]
+    return "\n".join([border, *content, border]), box_width
+
+def drain_lines(flowchart):
+    """Joins the buffered lines into one newline-terminated chunk and empties the buffer."""
+    if not flowchart:
+        return ""
+    chunk = "\n".join(flowchart) + "\n"
+    flowchart.clear()
+    return chunk
+
+def iter_render_text(flowchart, color=True):
+    """Yields the chart as newline-terminated chunks of text, with ANSI colors unless color is False."""
+    text = flowchart.text
+    kinds = flowchart.kinds
+    depths = flowchart.depths
+    reset = RESET if color else ""
+    output = []
+    current_width = 0
+
+    for item, value in layout(flowchart):
+        if item == LAYOUT_BOX:
+            depth = depths[value]
+            if not color:
+                box_color = ""
+            elif kinds[value] == COMMENT:
+                box_color = COMMENT_COLOR
+            else:
+                box_color = get_arrow_color_for_depth(depth)
+            box, box_width = render_text_box(text(value), depth, box_color, reset)
+            if current_width + box_width > MAX_LINE_WIDTH:
+                output.append("")
+                current_width = 0
+            output.append(box)
+            current_width += box_width
+            if len(output) >= STREAM_CHUNK_SIZE:
+                yield drain_lines(output)
+        elif item == LAYOUT_HEADING:
+            output.append(value)
+        else:
+            output.append("")
+
+    yield drain_lines(output)
+
+def iter_render_spans(flowchart):
+    """Yields the chart as lists of (text, color) spans, for front-ends that color text themselves.
+
+    Each span is whole lines ending in a newline: a box with the ANSI color
+    iter_render_ansi() would give it, or a heading or blank line with color
+    None. The texts joined are render_plain()'s output plus a newline, so
+    no escape codes have to be stripped back out.
+    """
+    text = flowchart.text
+    kinds = flowchart.kinds
+    depths = flowchart.depths
+    spans = []
+    current_width = 0
+
+    for item, value in layout(flowchart):
+        if item == LAYOUT_BOX:
+            depth = depths[value]
+            box_color = COMMENT_COLOR if kinds[value] == COMMENT else get_arrow_color_for_depth(depth)
+            box, box_width = render_text_box(text(value), depth, "", "")
+            if current_width + box_width > MAX_LINE_WIDTH:
+                spans.append(("\n", None))
+                current_width = 0
+            spans.append((box + "\n", box_color))
+            current_width += box_width
+            if len(spans) >= STREAM_CHUNK_SIZE:
+                yield spans
+                spans = []
+        elif item == LAYOUT_HEADING:
+            spans.append((value + "\n", None))
+        else:
+            spans.append(("\n", None))
+
+    yield spans
+
+def iter_render_ansi(flowchart):
+    return iter_render_text(flowchart, color=True)
+
+def iter_render_plain(flowchart):
+    return iter_render_text(flowchart, color=False)
+
+def render_ansi(flowchart) -> str:
+    return "".join(iter_render_ansi(flowchart))[:-1]
+
+def render_plain(flowchart) -> str:
+    return "".join(iter_render_plain(flowchart))[:-1]
+
+def text_box_cache_stats():
+    """Returns hits, misses, size and hit rate of the text box cache."""
+    info = render_text_box.cache_info()
+    lookups = info.hits + info.misses
+    return {"text": {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }}
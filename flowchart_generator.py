@@ -1,7 +1,12 @@
-import re
 import html  # Import the html module to escape HTML entities
+from functools import lru_cache
 
-MAX_LINE_WIDTH = 100
+from flowchart_core import (
+    BOX_CACHE_SIZE, COMMENT, LAYOUT_BOX, LAYOUT_HEADING, MAX_LINE_WIDTH, STREAM_CHUNK_SIZE, layout, parse,
+)
+
+# Bump whenever the rendered HTML changes; it is part of the server's result-cache key
+RENDERER_VERSION = 6
 
 # Define colors for different nesting levels (for text and box borders)
 HTML_NESTING_COLORS = {
@@ -13,199 +18,175 @@ HTML_NESTING_COLORS = {
 # Dark background for the flowchart boxes (matching website dark theme)
 BOX_BACKGROUND_COLOR = "#1e1e1e"  # Dark gray for the boxes
 
+# Boxes per page when a chart is split into pages that are fetched as the viewer scrolls
+PAGE_SIZE = 1000
+
+FLOWCHART_OPEN = "<pre style='font-family: monospace'>"
+CSS_FLOWCHART_OPEN = "<pre class='fc'>"
+FLOWCHART_CLOSE = "</pre>"
+
+# Short class names for the CSS renderer; comments share #A9A9A9 with depth 9 and render as "cm"
+CSS_COLOR_CLASSES = {color: f"d{depth}" for depth, color in HTML_NESTING_COLORS.items() if isinstance(depth, int)}
+CSS_COLOR_CLASSES[HTML_NESTING_COLORS['default']] = "dd"
+CSS_COLOR_CLASSES[HTML_NESTING_COLORS['comment']] = "cm"
+
+# Deepest indentation with its own padding class; deeper boxes fall back to an inline style
+CSS_MAX_INDENT_CLASS = 24
+
+def build_flowchart_stylesheet():
+    """Builds the stylesheet the CSS renderer's class names refer to."""
+    rules = [
+        ".fc{font-family:monospace}",
+        # Boxes are spans: block elements are not allowed inside <pre>
+        f".fc span{{display:block;background-color:{BOX_BACKGROUND_COLOR}}}",
+    ]
+    for key, color in HTML_NESTING_COLORS.items():
+        name = f"d{key}" if isinstance(key, int) else {"default": "dd", "comment": "cm"}[key]
+        rules.append(f".{name}{{color:{color}}}")
+    for depth in range(1, CSS_MAX_INDENT_CLASS + 1):
+        rules.append(f".i{depth}{{padding-left:{depth * 4}ch}}")
+    return "\n".join(rules)
+
+FLOWCHART_CSS = build_flowchart_stylesheet()
+
 def escape_html(text):
     """Escapes HTML special characters in the input text."""
     return html.escape(text)
 
-def html_box(flowchart, stmt, depth, current_width, color):
+@lru_cache(maxsize=BOX_CACHE_SIZE)
+def html_border(box_width, color, depth):
+    """Renders one `+----+` border line; shared by every box of the same size, color and depth."""
+    indent = "&nbsp;" * (depth * 4)
+    return f"{indent}<span style='background-color:{BOX_BACKGROUND_COLOR}; color:{color};'>+{'-' * box_width}+</span><br>"
+
+@lru_cache(maxsize=BOX_CACHE_SIZE)
+def render_html_box(stmt, depth, color):
+    """Renders a complete three-line box, returning (html, box_width)."""
     stmt = escape_html(stmt)  # Escape any HTML special characters
     indent = "&nbsp;" * (depth * 4)
     box_width = len(stmt) + 6
 
-    # Color for the text and border based on nesting depth
-    text_color = color  # Text color based on nesting depth
-    
+    border = html_border(box_width, color, depth)
+    content = f"{indent}<span style='background-color:{BOX_BACKGROUND_COLOR}; color:{color};'>|  {stmt.ljust(box_width - 6)}  |</span><br>"
+    return border + content + border, box_width
+
+def html_box(flowchart, stmt, depth, current_width, color):
+    # Repeated statements (`}`, `break;`, `i++;`) are served from the box cache
+    box, box_width = render_html_box(stmt, depth, color)
+
     if current_width + box_width > MAX_LINE_WIDTH:
         flowchart.append("<br>")
         current_width = 0
 
-    border = f"{indent}<span style='background-color:{BOX_BACKGROUND_COLOR}; color:{text_color};'>+{'-' * box_width}+</span><br>"
-    content = f"{indent}<span style='background-color:{BOX_BACKGROUND_COLOR}; color:{text_color};'>|  {stmt.ljust(box_width - 6)}  |</span><br>"
-
-    flowchart.extend([border, content, border])
+    flowchart.append(box)
     return current_width + box_width
 
-# -------------------- C CODE PARSER --------------------
-def generate_flowchart_from_c_code(code: str) -> str:
-    lines = code.strip().splitlines()
-    flowchart = []
-    nesting_depth = 0
-    inside_comment = False
-    comment_block = []
-    brace_stack = []
-    current_width = 0
-
-    comments = []
-    includes = []
-    functions = []
-    declarations = []
-    code_lines = []
-    increment_next = False
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        if line.startswith("/*"):
-            inside_comment = True
-            comment_block.append(line)
-        elif inside_comment:
-            comment_block.append(line)
-            if line.endswith("*/"):
-                comments.append("\n".join(comment_block))
-                inside_comment = False
-                comment_block = []
-        elif line.startswith("//"):
-            comments.append(line)
-        elif line.startswith("#include"):
-            includes.append(line)
-        elif re.match(r"\w+\s+\w+\s*\(.*\)\s*;", line) and not re.match(r".*=\s*malloc.*", line):
-            functions.append(line)
-        elif re.match(r"(\w+\s+\**\w+\s*=.*|\w+\s+\**\w+)", line) and not re.match(r"^(if|for|while|else|else\s+if|switch)\b", line):
-            declarations.append(line)
-        else:
-            code_lines.append(line)
+@lru_cache(maxsize=BOX_CACHE_SIZE)
+def render_css_box(stmt, depth, color):
+    """Renders a box as one classed block <span>, returning (html, box_width); see FLOWCHART_CSS."""
+    # Measured before escaping: "&lt;" takes one column on screen, not four
+    box_width = len(stmt) + 6
+    border = f"+{'-' * box_width}+"
 
-    # Header comments
-    if comments:
-        flowchart.append("<b>Comments:</b><br>")
-        for comment in comments:
-            current_width = html_box(flowchart, comment, nesting_depth, current_width, HTML_NESTING_COLORS['comment'])
-        flowchart.append("<br>")
+    classes = CSS_COLOR_CLASSES.get(color, "dd")
+    if 0 < depth <= CSS_MAX_INDENT_CLASS:
+        attrs = f"class='{classes} i{depth}'"
+    elif depth > CSS_MAX_INDENT_CLASS:
+        attrs = f"class='{classes}' style='padding-left:{depth * 4}ch'"
+    else:
+        attrs = f"class='{classes}'"
+    return f"<span {attrs}>{border}\n|  {escape_html(stmt.ljust(box_width - 4))}  |\n{border}</span>", box_width
 
-    # Preprocessor
-    if includes:
-        flowchart.append("<b>Preprocessor Directives:</b><br>")
-        for include in includes:
-            current_width = html_box(flowchart, include, nesting_depth, current_width, HTML_NESTING_COLORS.get(nesting_depth))
-        flowchart.append("<br>")
+def css_box(flowchart, stmt, depth, current_width, color):
+    # Same layout as html_box, but colors and indentation come from the stylesheet
+    box, box_width = render_css_box(stmt, depth, color)
 
-    # Declarations
-    if declarations:
-        flowchart.append("<b>Function Declaration:</b><br>")
-        current_width = html_box(flowchart, declarations[0], 0, current_width, HTML_NESTING_COLORS.get(0))
-        flowchart.append("<br><b>Variable Declarations:</b><br>")
-        for declaration in declarations[1:]:
-            current_width = html_box(flowchart, declaration, 1, current_width, HTML_NESTING_COLORS.get(1))
+    if current_width + box_width > MAX_LINE_WIDTH:
         flowchart.append("<br>")
+        current_width = 0
 
-    # Functions
-    if functions:
-        flowchart.append("<b>Function Declarations:</b><br>")
-        for func in functions:
-            current_width = html_box(flowchart, func, 0, current_width, HTML_NESTING_COLORS.get(0))
-        flowchart.append("<br>")
+    flowchart.append(box)
+    return current_width + box_width
 
-    # Function logic
-    flowchart.append("<b>Function Logic Starts:</b><br>")
-    nesting_depth = 1
-    i = 0
-    while i < len(code_lines):
-        line = code_lines[i].strip()
-
-        if re.match(r"^switch\b", line):
-            current_width = html_box(flowchart, line, nesting_depth, current_width, HTML_NESTING_COLORS.get(nesting_depth))
-            brace_stack.append("{")
-            nesting_depth += 1
-            i += 1
-            continue
-
-        elif re.match(r"^case\b", line) or re.match(r"^default\b", line):
-            current_width = html_box(flowchart, line, nesting_depth + 1, current_width, HTML_NESTING_COLORS.get(nesting_depth + 1))
-            i += 1
-            continue
-
-        elif re.match(r"^(if|for|while|else if|else)\b", line):
-            current_width = html_box(flowchart, line, nesting_depth, current_width, HTML_NESTING_COLORS.get(nesting_depth))
-            next_line = code_lines[i + 1].strip() if i + 1 < len(code_lines) else ""
-            if next_line == "{":
-                brace_stack.append("{")
-                nesting_depth += 1
-                i += 1
-                continue
-            if not next_line.startswith("{"):
-                increment_next = True
-            i += 1
-            continue
-
-        if increment_next:
-            current_width = html_box(flowchart, code_lines[i].strip(), nesting_depth + 1, current_width, HTML_NESTING_COLORS.get(nesting_depth + 1))
-            increment_next = False
-            i += 1
-            continue
-
-        if line == "{":
-            i += 1
-            continue
-        elif line == "}":
-            if brace_stack:
-                brace_stack.pop()
-                nesting_depth -= 1
-            i += 1
-            continue
-
-        # Regular statement
-        current_width = html_box(flowchart, line, nesting_depth, current_width, HTML_NESTING_COLORS.get(nesting_depth))
-        i += 1
-
-    return "<pre style='font-family: monospace'>" + "".join(flowchart) + "</pre>"
-
-# -------------------- PYTHON CODE PARSER --------------------
-def get_indent_level(line: str) -> int:
-    return len(line) - len(line.lstrip(' '))
-
-def generate_flowchart_from_python(code: str) -> str:
-    lines = code.strip().splitlines()
-    flowchart = []
-    indent_stack = [0]
-    depth = 0
+def html_box_cache_stats():
+    """Returns hits, misses, size and hit rate of the border and box caches."""
+    stats = {}
+    for name, cached in (("border", html_border), ("box", render_html_box), ("css_box", render_css_box)):
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+        }
+    return stats
+
+def drain_fragments(flowchart):
+    """Joins the buffered fragments into one chunk and empties the buffer."""
+    chunk = "".join(flowchart)
+    flowchart.clear()
+    return chunk
+
+def html_color(kind, depth):
+    if kind == COMMENT:
+        return HTML_NESTING_COLORS['comment']
+    return HTML_NESTING_COLORS.get(depth, HTML_NESTING_COLORS['default'])
+
+# -------------------- HTML RENDERER --------------------
+def iter_render_html(flowchart, css: bool = False, chunk_size=STREAM_CHUNK_SIZE, enclose=True):
+    """Yields a parsed Flowchart as HTML chunks instead of building one big string.
+
+    With css=True boxes use the short class names from FLOWCHART_CSS instead of
+    inline styles. A chunk is yielded every chunk_size boxes; enclose=False
+    leaves out the surrounding <pre> so the chunks can be inserted into one.
+    """
+    box = css_box if css else html_box
+    text = flowchart.text
+    kinds = flowchart.kinds
+    depths = flowchart.depths
+    output = [(CSS_FLOWCHART_OPEN if css else FLOWCHART_OPEN) if enclose else ""]
     current_width = 0
-    inside_multiline_comment = False
-    last_was_control = False
-
-    for raw_line in lines:
-        line = raw_line.rstrip()
-        if not line.strip():
-            continue
-
-        stripped = line.strip()
-        indent = get_indent_level(raw_line)
-
-        if inside_multiline_comment:
-            current_width = html_box(flowchart, stripped, depth, current_width, HTML_NESTING_COLORS['comment'])
-            if '"""' in stripped or "'''" in stripped:
-                inside_multiline_comment = False
-            continue
-
-        if stripped.startswith(("'''", '"""')):
-            inside_multiline_comment = not inside_multiline_comment
-            current_width = html_box(flowchart, stripped, depth, current_width, HTML_NESTING_COLORS['comment'])
-            continue
-
-        if stripped.startswith("#"):
-            current_width = html_box(flowchart, stripped, depth, current_width, HTML_NESTING_COLORS['comment'])
-            continue
-
-        while indent < indent_stack[-1]:
-            indent_stack.pop()
-            depth -= 1
-
-        if indent > indent_stack[-1]:
-            indent_stack.append(indent)
-            depth += 1
-
-        color = HTML_NESTING_COLORS.get(depth, HTML_NESTING_COLORS['default'])
-        current_width = html_box(flowchart, stripped, depth, current_width, color)
-
-    return "<pre style='font-family: monospace'>" + "".join(flowchart) + "</pre>"
 
+    for item, value in layout(flowchart):
+        if item == LAYOUT_BOX:
+            # Node fields are read straight from the flowchart's arrays
+            depth = depths[value]
+            current_width = box(output, text(value), depth, current_width, html_color(kinds[value], depth))
+            if len(output) >= chunk_size:
+                yield drain_fragments(output)
+        elif item == LAYOUT_HEADING:
+            output.append(f"<b>{value}</b><br>")
+        else:
+            output.append("<br>")
+
+    if enclose:
+        output.append(FLOWCHART_CLOSE)
+    last = drain_fragments(output)
+    if last or enclose:
+        yield last
+
+def render_html(flowchart, css: bool = False) -> str:
+    return "".join(iter_render_html(flowchart, css))
+
+def iter_html_pages(flowchart, page_size=PAGE_SIZE):
+    """Yields the CSS-classed chart in pages of about page_size boxes, to be appended to one <pre class='fc'>."""
+    return iter_render_html(flowchart, css=True, chunk_size=page_size, enclose=False)
+
+# -------------------- C AND PYTHON FRONT-ENDS --------------------
+# previous (the Flowchart of an earlier version of the code, from
+# flowchart_core.parse) and edit make the parse incremental: only the region
+# around the edit is parsed again. See flowchart_core.reparse().
+def iter_flowchart_from_c_code(code, css: bool = False, previous=None, edit=None):
+    """Parses C code (a string, a bytes-like source or an iterable of lines) and yields its flowchart as HTML chunks."""
+    return iter_render_html(parse('c', code, previous=previous, edit=edit), css)
+
+def generate_flowchart_from_c_code(code, css: bool = False, previous=None, edit=None) -> str:
+    return "".join(iter_flowchart_from_c_code(code, css, previous, edit))
+
+def iter_flowchart_from_python(code, css: bool = False, previous=None, edit=None):
+    """Parses Python code (a string, a bytes-like source or an iterable of lines) and yields its flowchart as HTML chunks."""
+    return iter_render_html(parse('python', code, previous=previous, edit=edit), css)
+
+def generate_flowchart_from_python(code, css: bool = False, previous=None, edit=None) -> str:
+    return "".join(iter_flowchart_from_python(code, css, previous, edit))
@@ -1,296 +1,409 @@
 import sys
-import re
 import os
+import argparse
+import glob
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# Limit the maximum width before wrapping to a new "column"
-MAX_LINE_WIDTH = 100  # Adjust this to your preferred limit
-
-# Define colors for different nesting depths (extend this list as needed)
-NESTING_COLORS = {
-    0: '\033[94m',  # Blue
-    1: '\033[92m',  # Green
-    2: '\033[93m',  # Yellow
-    3: '\033[91m',  # Red
-    4: '\033[95m',  # Magenta (Pink)
-    5: '\033[96m',  # Cyan
-    6: '\033[33m',  # Orange
-    7: '\033[36m',  # Teal
-    8: '\033[37m',  # Gray
-    9: '\033[41m',  # Background Red
-    10: '\033[42m', # Background Green
-    11: '\033[43m', # Background Yellow
-    12: '\033[44m', # Background Blue
-    'default': '\033[97m',  # White for default
-}
-
-RESET = '\033[0m'
-
-def get_arrow_color_for_depth(depth):
-    max_depth = len(NESTING_COLORS)
-    return NESTING_COLORS.get(depth % max_depth, '\033[0m')
+import flowchart_core
+import flowchart_generator
+import flowchart_watch
+from flowchart_core import MAX_LINE_WIDTH
 
+# previous (the Flowchart of an earlier version of the code) and edit make
+# the parse incremental; see flowchart_core.reparse()
 
 # Python-specific flowchart generator functions
-def get_indent_level(line: str) -> int:
-    return len(line) - len(line.lstrip(' '))
-
-def print_box(flowchart, stmt, depth, current_width, color):
-    indent = " " * (depth * 4)
-    box_width = len(stmt) + 6
-
-    if current_width + box_width > MAX_LINE_WIDTH:
-        flowchart.append("")
-        current_width = 0
-
-    flowchart.append(f"{indent}{color}+{'-' * box_width}+{RESET}")
-    flowchart.append(f"{indent}{color}|  {stmt.ljust(box_width - 4)}  |{RESET}")
-    flowchart.append(f"{indent}{color}+{'-' * box_width}+{RESET}")
-
-    return current_width + box_width
-
-def is_control_statement(line):
-    return re.match(r'^\s*(if|elif|else|for|while|try|except|finally)\b', line)
-
-def generate_flowchart_from_python(code: str) -> str:
-    lines = code.strip().splitlines()
-    flowchart = []
-    indent_stack = [0]
-    depth = 0
-    current_width = 0
-    inside_multiline_comment = False
-    last_indent = 0
-    last_was_control = False
-
-    for i, raw_line in enumerate(lines):
-        line = raw_line.rstrip()
-        if not line.strip():
-            continue
-
-        if line.startswith("#!") and len(flowchart) == 0:
-            continue  # Skip shebang
-
-        stripped = line.strip()
-        indent = get_indent_level(line)
-
-        # Multiline comment block handling
-        if inside_multiline_comment:
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            if '"""' in stripped or "'''" in stripped:
-                inside_multiline_comment = False
-            continue
-
-        if stripped.startswith(("'''", '\"\"\"')): 
-            inside_multiline_comment = not inside_multiline_comment
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            continue
-
-        # Decrement depth if comment follows control block or dedentation
-        if stripped.startswith("#"):
-            if indent < indent_stack[-1] or last_was_control:
-                while indent < indent_stack[-1]:
-                    indent_stack.pop()
-                    depth -= 1
-                last_was_control = False
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            last_indent = indent
-            continue
-
-        # Indentation-based depth adjustment
-        while indent < indent_stack[-1]:
-            indent_stack.pop()
-            depth -= 1
+def iter_flowchart_from_python(code, previous=None, edit=None):
+    """Yields the Python flowchart as newline-terminated chunks of ANSI text."""
+    return flowchart_core.iter_render_ansi(flowchart_core.parse('python', code, previous=previous, edit=edit))
 
-        if indent > indent_stack[-1]:
-            indent_stack.append(indent)
-            depth += 1
-
-        color = get_arrow_color_for_depth(depth)
-        current_width = print_box(flowchart, stripped, depth, current_width, color)
-
-        last_was_control = is_control_statement(stripped)
-        last_indent = indent
-
-    return "\n".join(flowchart)
+def generate_flowchart_from_python(code: str, previous=None, edit=None) -> str:
+    return "".join(iter_flowchart_from_python(code, previous, edit))[:-1]
 
 
 # C-specific flowchart generator functions
-def process_code_line(flowchart, stmt, nesting_depth, current_width, color, include_line_number=True):
-    shift = " " * (nesting_depth * 10)
-    stmt_length = len(stmt) + 12  # Account for padding inside the box
-
-    if current_width + stmt_length > MAX_LINE_WIDTH:
-        flowchart.append("")
-        current_width = 0
-
-    flowchart.append(f"{shift}{color}+{'-' * stmt_length}+{RESET}")
-    flowchart.append(f"{shift}{color}|  {stmt.ljust(len(stmt) + 8)}   |{RESET}")  # 1 space removed here
-    flowchart.append(f"{shift}{color}+{'-' * stmt_length}+{RESET}")
-
-    current_width += stmt_length
-    return current_width
-
-def process_multiple_statements_on_same_line(flowchart, line, nesting_depth, current_width, color):
-    statements = line.split(";")
-    for stmt in statements:
-        stmt = stmt.strip()
-        if stmt:
-            current_width = process_code_line(flowchart, stmt, nesting_depth, current_width, color)
-    return current_width
-
-def generate_flowchart_from_c_code(code: str) -> str:
-    lines = code.strip().split('\n')
-    flowchart = []
-    nesting_depth = 0
-    inside_comment = False
-    comment_block = []
-    brace_stack = []
-    current_width = 0
-
-    comments = []
-    includes = []
-    functions = []
-    declarations = []
-    code_lines = []
-
-    line_number = 1
-    increment_next = False
-
-    for line in lines:
-        line = line.strip()
-
-        if not line:
-            line_number += 1
-            continue
-
-        if line.startswith("/*"):
-            inside_comment = True
-            comment_block.append(line)
-        elif inside_comment:
-            comment_block.append(line)
-            if line.endswith("*/"):
-                comments.append("\n".join(comment_block))
-                inside_comment = False
-                comment_block = []
-        elif line.startswith("#include"):
-            includes.append(line)
-        elif re.match(r"\w+\s+\w+\s*\(.*\)\s*;", line) and not re.match(r".*=\s*malloc.*", line):
-            functions.append(line)
-        elif re.match(r"(\w+\s+\**\w+\s*=.*|\w+\s+\**\w+)", line):
-            declarations.append(line)
+def iter_flowchart_from_c_code(code, previous=None, edit=None):
+    """Yields the C flowchart as newline-terminated chunks of ANSI text."""
+    return flowchart_core.iter_render_ansi(flowchart_core.parse('c', code, previous=previous, edit=edit))
+
+def generate_flowchart_from_c_code(code: str, previous=None, edit=None) -> str:
+    return "".join(iter_flowchart_from_c_code(code, previous, edit))[:-1]
+
+
+# -------------------- Batch mode --------------------
+SOURCE_EXTENSIONS = (".c", ".py")
+
+OUTPUT_EXTENSIONS = {'ansi': ".txt", 'plain': ".txt", 'html': ".html"}
+
+# Bump whenever the ANSI or plain output changes so batch runs regenerate every file
+GENERATOR_VERSION = 4
+# Written into the output directory; maps each output to the input it was rendered from
+MANIFEST_NAME = ".flowchart-manifest.json"
+
+HTML_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>{title}</title>
+<style>
+body {{ background-color: #121212; }}
+{stylesheet}
+</style>
+</head>
+<body>
+"""
+HTML_PAGE_TAIL = "</body>\n</html>\n"
+
+def parse_file(file_path, code, defines=None, file_macros=True, previous=None):
+    """Parses code in the language of file_path; None if the language is unsupported.
+
+    defines (a dict) preprocesses C sources for that configuration; see parse_c_code.
+    previous, the file's last parse, is reused around the edit (see flowchart_core.reparse).
+    """
+    language = flowchart_core.detect_language(file_path)
+    if language is None:
+        return None
+    options = {'defines': defines, 'file_macros': file_macros} if language == 'c' and defines is not None else {}
+    return flowchart_core.parse(language, code, previous=previous, **options)
+
+def iter_render(flowchart, output_format='ansi'):
+    if output_format == 'html':
+        return flowchart_generator.iter_render_html(flowchart, css=True)
+    return flowchart_core.iter_render_text(flowchart, color=output_format == 'ansi')
+
+def iter_flowchart(file_path, code, output_format='ansi', defines=None, file_macros=True):
+    """Parses the file once and renders it in output_format; None if the language is unsupported."""
+    flowchart = parse_file(file_path, code, defines, file_macros)
+    return None if flowchart is None else iter_render(flowchart, output_format)
+
+def iter_functions(flowchart, names, output_format='ansi'):
+    """Renders only the named functions of a parsed C file, one chart each, in source order."""
+    for function in flowchart_core.find_functions(flowchart, names):
+        yield from iter_render(flowchart_core.function_flowchart(flowchart, function), output_format)
+
+def collect_sources(patterns):
+    """Expands files, directories and glob patterns into (source path, output-relative path) pairs."""
+    sources = []
+    seen = set()
+
+    def add(path, relative):
+        path = os.path.normpath(path)
+        if path.endswith(SOURCE_EXTENSIONS) and os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            sources.append((path, relative))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = os.path.normpath(pattern)
+            for dir_path, dir_names, file_names in os.walk(root):
+                dir_names.sort()
+                for name in sorted(file_names):
+                    path = os.path.join(dir_path, name)
+                    add(path, os.path.join(os.path.basename(os.path.abspath(root)), os.path.relpath(path, root)))
         else:
-            code_lines.append(line)
-
-    # Colorized comments section (Gray), no '|' in comments
-    if comments:
-        flowchart.append("Comments:")
-        for comment in comments:
-            current_width = process_code_line(flowchart, comment, nesting_depth, current_width, NESTING_COLORS[8], include_line_number=False)
-            line_number += 1
-        flowchart.append("")
-
-    # Colorized preprocessor directives (Blue)
-    if includes:
-        flowchart.append("Preprocessor Directives:")
-        for include in includes:
-            current_width = process_code_line(flowchart, include, nesting_depth, current_width, NESTING_COLORS[0], include_line_number=False)
-            line_number += 1
-        flowchart.append("")
-
-    # Variable Declarations Section
-    if declarations:
-        flowchart.append("Function Declaration:")
-
-        # First declaration: pink, depth 0
-        current_width = process_code_line(flowchart, declarations[0], 0, current_width, NESTING_COLORS[4], include_line_number=False)
-        flowchart.append("")  # Newline after first declaration
-        flowchart.append("Variable Declarations:")
-
-        # Remaining declarations: gray, depth 1
-        for declaration in declarations[1:]:
-            current_width = process_code_line(flowchart, declaration, 1, current_width, NESTING_COLORS[8], include_line_number=False)
-            line_number += 1
-        flowchart.append("")
-
-    # Function declarations (Blue)
-    if functions:
-        flowchart.append("Function Declarations:")
-        for func in functions:
-            current_width = process_code_line(flowchart, func, 0, current_width, NESTING_COLORS[0])
-            line_number += 1
-        flowchart.append("")
-
-    flowchart.append("Function Logic Starts:")
-
-    nesting_depth = 1  # Start logic at depth 1
-
-    i = 0
-    while i < len(code_lines):
-        line = code_lines[i].strip()
-
-        if re.match(r"^(if|for|while|else if|else)\b", line):
-            current_width = process_code_line(flowchart, line, nesting_depth, current_width, NESTING_COLORS.get(nesting_depth, '\033[0m'))
-            next_line = code_lines[i + 1].strip() if i + 1 < len(code_lines) else ""
-            if next_line == "{":
-                brace_stack.append("{")
-                nesting_depth += 1
-                i += 1
+            matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+            for path in matches:
+                if os.path.isfile(path):
+                    relative = os.path.relpath(path)
+                    add(path, relative if not relative.startswith(os.pardir) else os.path.basename(path))
+    return disambiguate_outputs(sources)
+
+def disambiguate_outputs(sources):
+    """Keeps more parent directories of inputs whose output paths would collide until every one is distinct.
+
+    Two x.c files from outside the working directory, or two directories
+    both named src, would otherwise overwrite each other's output.
+    """
+    while True:
+        counts = {}
+        for _, relative in sources:
+            counts[relative] = counts.get(relative, 0) + 1
+        if all(count == 1 for count in counts.values()):
+            return sources
+        for index, (path, relative) in enumerate(sources):
+            if counts[relative] > 1:
+                # Every output-relative path is a suffix of the absolute path, so keep one more component
+                parts = os.path.abspath(path).strip(os.sep).split(os.sep)
+                depth = relative.count(os.sep) + 2
+                sources[index] = (path, os.path.join(*parts[-depth:]))
+
+def output_version(output_format, defines=None, file_macros=True):
+    """Identifies everything besides the source that changes an output file."""
+    version = f"{output_format}-{GENERATOR_VERSION}-{flowchart_generator.RENDERER_VERSION}-{MAX_LINE_WIDTH}"
+    if defines is not None:
+        version += "-" + json.dumps([sorted(defines.items()), file_macros])
+    return version
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        return manifest.get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, entries):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    # Replace atomically so an interrupted run never leaves a truncated manifest
+    with open(path + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump({"files": entries}, file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def render_file(task):
+    """Renders one source file to its output file; runs in a worker process during batch runs.
+
+    When known_sha256 matches the file's content the output is left alone.
+    Returns a dict with the source stat, hash, byte counts and error (or None).
+    """
+    source_path, output_path, output_format, known_sha256, defines, file_macros = task
+    result = {"source": source_path, "input_bytes": 0, "output_bytes": 0, "rendered": False, "error": None}
+    try:
+        stat = os.stat(source_path)
+        # Hash and parse straight from the mapping; the file is never copied into memory
+        with flowchart_core.open_source(source_path) as source:
+            result.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=hashlib.sha256(source).hexdigest(), input_bytes=len(source))
+            if result["sha256"] == known_sha256:
+                return result  # touched but not modified
+
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with open(output_path, 'w', encoding='utf-8') as output:
+                if output_format == 'html':
+                    output.write(HTML_PAGE_HEAD.format(title=os.path.basename(source_path), stylesheet=flowchart_generator.FLOWCHART_CSS))
+                # Stream chunks straight to the file instead of joining the whole chart
+                output.writelines(iter_flowchart(source_path, source, output_format, defines, file_macros))
+                if output_format == 'html':
+                    output.write(HTML_PAGE_TAIL)
+                result["output_bytes"] = output.tell()
+        result["rendered"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def run_batch(patterns, output_dir, output_format='ansi', jobs=None, force=False, defines=None, file_macros=True):
+    """Renders every matching file into output_dir, fanning the files out across a process pool.
+
+    A manifest in output_dir records each input's mtime, size, content hash and
+    generator version; inputs that match their entry are skipped unless force is set.
+    defines and file_macros preprocess C sources (see parse_c_code).
+    """
+    sources = collect_sources(patterns)
+    if not sources:
+        print("No .c or .py files found.")
+        return 1
+
+    extension = OUTPUT_EXTENSIONS[output_format]
+    version = output_version(output_format, defines, file_macros)
+    manifest = load_manifest(output_dir)
+    jobs = jobs or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    tasks = []
+    task_keys = []
+    unchanged = 0
+    for path, relative in sources:
+        key = relative + extension
+        output_path = os.path.join(output_dir, key)
+        entry = None if force else manifest.get(key)
+        known_sha256 = None
+        if entry and entry.get("version") == version and os.path.exists(output_path):
+            # Same mtime and size: trust the manifest without reading the file
+            stat = os.stat(path)
+            if stat.st_mtime_ns == entry.get("mtime_ns") and stat.st_size == entry.get("size"):
+                unchanged += 1
                 continue
-            if not next_line.startswith("{"):
-                increment_next = True
-            i += 1
-            continue
-
-        if increment_next:
-            current_width = process_code_line(flowchart, code_lines[i].strip(), nesting_depth + 1, current_width, NESTING_COLORS.get(nesting_depth + 1, '\033[0m'))
-            increment_next = False
-            i += 1
+            # Otherwise the worker hashes the content and skips rendering if it is unchanged
+            known_sha256 = entry.get("sha256")
+        tasks.append((path, output_path, output_format, known_sha256, defines, file_macros))
+        task_keys.append(key)
+
+    if jobs == 1 or len(tasks) < 2:
+        results = [render_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Small files dominate real trees; batching them cuts per-task IPC overhead
+            results = list(pool.map(render_file, tasks, chunksize=max(1, min(64, len(tasks) // (jobs * 4)))))
+
+    failures = []
+    for key, result in zip(task_keys, results):
+        if result["error"]:
+            failures.append(result)
+            manifest.pop(key, None)
             continue
+        manifest[key] = {
+            "source": result["source"],
+            "mtime_ns": result["mtime_ns"],
+            "size": result["size"],
+            "sha256": result["sha256"],
+            "version": version,
+        }
+    save_manifest(output_dir, manifest)
+    elapsed = time.perf_counter() - start
+
+    for result in failures:
+        print(f"Error: {result['source']}: {result['error']}", file=sys.stderr)
+
+    rendered = sum(1 for result in results if result["rendered"])
+    unchanged += len(results) - rendered - len(failures)
+    input_bytes = sum(result["input_bytes"] for result in results)
+    output_bytes = sum(result["output_bytes"] for result in results)
+    print(f"Rendered {rendered} and skipped {unchanged} unchanged of {len(sources)} files into '{output_dir}' "
+          f"in {elapsed:.2f}s ({len(sources) / elapsed if elapsed else 0:.1f} files/s, {jobs} workers)")
+    print(f"Read {input_bytes:,} bytes, wrote {output_bytes:,} bytes")
+    return 1 if failures else 0
+
+# -------------------- Single file and watch mode --------------------
+def show_flowchart(flowchart, file_path, args):
+    """Prints a parsed file's flowchart (or its --list-functions / --function view) to stdout; returns the exit status."""
+    if flowchart is None:
+        print("Unsupported file type. Please provide a Python (.py) or C (.c) file.")
+        return 1
+    if (args.list_functions or args.function) and flowchart.language != 'c':
+        print("Functions can only be listed and selected in C files.")
+        return 1
+
+    if args.list_functions:
+        for function in flowchart.functions:
+            print(f"{function.line:>7}  {function.name}  ({function.last - function.first} nodes, depth {function.depth})")
+        return 0
+    try:
+        chunks = iter_functions(flowchart, args.function, args.format) if args.function else iter_render(flowchart, args.format)
+        # Write each chunk as soon as it is rendered instead of joining the whole chart
+        sys.stdout.writelines(chunks)
+    except KeyError as e:
+        print(f"No function named {e.args[0]} in '{file_path}'.")
+        return 1
+    return 0
+
+def print_flowchart(file_path, args, defines=None, file_macros=True):
+    """Parses one file and prints it with show_flowchart(); returns the exit status."""
+    try:
+        # Memory-mapped: lines are decoded as they are parsed and rendered
+        with flowchart_core.open_source(file_path) as source:
+            return show_flowchart(parse_file(file_path, source, defines, file_macros), file_path, args)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return 1
 
-        if line == "{":
-            i += 1
-            continue
-        elif line == "}":
-            if brace_stack:
-                brace_stack.pop()
-                nesting_depth -= 1
-            i += 1
-            continue
-
-        current_width = process_multiple_statements_on_same_line(flowchart, line, nesting_depth, current_width, NESTING_COLORS.get(nesting_depth, '\033[0m'))
-        i += 1
-
-    return "\n".join(flowchart)
-
+def read_file(path):
+    """The file's content as bytes, or None if it cannot be read (for instance mid-save)."""
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except OSError:
+        return None
+
+def watch_file(file_path, args, defines=None, file_macros=True):
+    """Prints the flowchart again each time the file is saved, until interrupted.
+
+    Saves that leave the content as it was (a touch, an editor writing the
+    same buffer) are noticed by the content hash and redraw nothing. The
+    file is read into memory rather than mapped, so each parse can be kept
+    and reused around the next edit instead of parsing the file again.
+    """
+    watcher = flowchart_watch.FileWatcher([file_path])
+    previous = None
+    shown_sha256 = None
+    clear = sys.stdout.isatty()
+    try:
+        while True:
+            source = read_file(file_path)
+            sha256 = None if source is None else hashlib.sha256(source).hexdigest()
+            if sha256 != shown_sha256:
+                start = time.perf_counter()
+                if clear:
+                    sys.stdout.write("\033[H\033[2J")
+                if source is None:
+                    print(f"Error: The file '{file_path}' could not be read.")
+                else:
+                    try:
+                        flowchart = parse_file(file_path, source, defines, file_macros, previous)
+                        show_flowchart(flowchart, file_path, args)
+                        previous = flowchart
+                    except Exception as e:
+                        print(f"An unexpected error occurred: {e}")
+                sys.stdout.flush()
+                shown_sha256 = sha256
+                print(f"{time.strftime('%H:%M:%S')} rendered '{file_path}' in {(time.perf_counter() - start) * 1000:.0f} ms; "
+                      "watching for changes (Ctrl+C to stop)", file=sys.stderr)
+            watcher.wait()
+    except KeyboardInterrupt:
+        pass
+
+def watch_batch(patterns, output_dir, output_format='ansi', jobs=None, force=False, defines=None, file_macros=True):
+    """Runs run_batch() again whenever a source is saved, added or removed, until interrupted.
+
+    Every source file is watched, along with the directories holding them so
+    that new files are picked up. Each rerun goes through the manifest, so
+    only the files that changed are rendered again.
+    """
+    watcher = flowchart_watch.FileWatcher([])
+    try:
+        while True:
+            run_batch(patterns, output_dir, output_format, jobs, force, defines, file_macros)
+            force = False  # --force applies to the first run only
+            sources = [path for path, _ in collect_sources(patterns)]
+            directories = {os.path.dirname(path) or os.curdir for path in sources}
+            directories.update(os.path.normpath(pattern) for pattern in patterns if os.path.isdir(pattern))
+            watcher.watch(sources + sorted(directories))
+            print(f"Watching {len(sources)} files for changes (Ctrl+C to stop)", file=sys.stderr)
+            watcher.wait()
+    except KeyboardInterrupt:
+        pass
 
 # Unified entry point
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python flowchart_generator.py <file path>")
-        sys.exit(1)
-
-    file_path = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Generate flowcharts from Python (.py) and C (.c) files.",
+        epilog="With a single file and no --output-dir the flowchart is printed to stdout.",
+    )
+    parser.add_argument("paths", nargs="+", help="source files, directories or glob patterns (quote globs, e.g. 'src/**/*.c')")
+    parser.add_argument("-o", "--output-dir", help="write one output file per input into this directory")
+    parser.add_argument("-f", "--format", choices=sorted(OUTPUT_EXTENSIONS), default='ansi',
+                        help="output format for batch runs (default: ansi)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes for batch runs (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render every file even if the manifest says it is unchanged")
+    parser.add_argument("-D", "--define", action="append", metavar="NAME[=VALUE]",
+                        help="define a macro and draw only the live #if branches of C files (repeatable)")
+    parser.add_argument("--preprocess", action="store_true", help="draw only the live #if branches of C files, even without -D")
+    parser.add_argument("--no-file-macros", action="store_true",
+                        help="decide #if branches from -D alone, ignoring the files' own #define and #undef")
+    parser.add_argument("--list-functions", action="store_true", help="list the functions defined in a single C file")
+    parser.add_argument("--function", action="append", metavar="NAME",
+                        help="render only this function of a single C file (repeatable)")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="keep running and regenerate whenever a source file is saved (Ctrl+C to stop)")
+    args = parser.parse_args()
+    defines = flowchart_core.parse_defines(args.define) if args.define or args.preprocess else None
+    file_macros = not args.no_file_macros
+
+    single_file = len(args.paths) == 1 and not os.path.isdir(args.paths[0]) and not glob.has_magic(args.paths[0])
+    if (args.list_functions or args.function) and not (single_file and args.output_dir is None):
+        parser.error("--list-functions and --function work on a single file printed to stdout")
+    if args.watch and args.list_functions:
+        parser.error("--watch cannot be combined with --list-functions")
+    if not (single_file and args.output_dir is None):
+        batch = (args.paths, args.output_dir or "flowcharts", args.format, args.jobs, args.force, defines, file_macros)
+        if args.watch:
+            watch_batch(*batch)
+            return
+        sys.exit(run_batch(*batch))
+
+    file_path = args.paths[0]
 
     if not os.path.isfile(file_path):
         print(f"Error: The file '{file_path}' was not found.")
         sys.exit(1)
 
-    try:
-        with open(file_path, 'r') as file:
-            code = file.read()
-
-            if file_path.endswith(".py"):
-                flowchart = generate_flowchart_from_python(code)
-            elif file_path.endswith(".c"):
-                flowchart = generate_flowchart_from_c_code(code)
-            else:
-                print("Unsupported file type. Please provide a Python (.py) or C (.c) file.")
-                sys.exit(1)
-
-            print(flowchart)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        sys.exit(1)
+    if args.watch:
+        watch_file(file_path, args, defines, file_macros)
+        return
+    status = print_flowchart(file_path, args, defines, file_macros)
+    if status:
+        sys.exit(status)
 
 if __name__ == "__main__":
     main()
-
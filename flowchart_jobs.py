@@ -0,0 +1,162 @@
+"""Background generation jobs for the server's asynchronous upload mode.
+
+A job renders one upload in the generation pool (or on a job thread when the
+server has no pool) while the client polls its status. Each running job owns
+a slot in a shared-memory array that the worker writes its progress into, so
+progress crosses the process boundary without a manager process or pipes.
+"""
+import multiprocessing
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs that can run at once (one progress slot each), and how long a finished job is kept
+MAX_RUNNING_JOBS = 64
+JOB_RETENTION = 10 * 60
+# Result-page bytes kept by finished jobs; past it the oldest results are dropped
+# and served from the result cache instead
+JOB_RESULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Fields of one progress slot, and the phases a worker reports
+PHASE, LINES, TOTAL_LINES, PAGES = range(4)
+PROGRESS_FIELDS = 4
+QUEUED, PARSING, RENDERING = range(3)
+PHASE_NAMES = ("queued", "parsing", "rendering")
+
+# The shared progress array as seen by this process; set by attach_progress()
+_progress = None
+
+def attach_progress(progress):
+    """Gives this process the shared progress array; call it in every pool worker."""
+    global _progress
+    _progress = progress
+
+def report(slot, field, value):
+    """Worker side: records one progress field of the job in `slot` (a no-op for jobs without one)."""
+    if slot is not None and _progress is not None:
+        _progress[slot * PROGRESS_FIELDS + field] = value
+
+class Job:
+    """One asynchronous generation; status is a PHASE_NAMES entry while it runs, then "done" or "failed"."""
+
+    def __init__(self, job_id, key, slot):
+        self.id = job_id
+        self.key = key
+        self.slot = slot
+        self.status = "queued"
+        self.result = None   # the result-page body once done, until dropped for the byte budget
+        self.error = None
+        self.finished_at = None
+
+class JobStore:
+    """Thread-safe registry of asynchronous jobs and owner of the shared progress array."""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, retention=JOB_RETENTION, max_result_bytes=JOB_RESULT_MAX_BYTES):
+        # Created before the generation pool so its workers inherit it
+        self.progress = multiprocessing.Array('q', max_running * PROGRESS_FIELDS, lock=False)
+        self.free_slots = list(range(max_running))
+        self.retention = retention
+        self.max_result_bytes = max_result_bytes
+        self.result_bytes = 0
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.threads = None
+
+    def submit(self, key, executor, function, *args, upload=None, finish=None):
+        """Runs function(*args, slot) on `executor` (a job thread when None) as a new job.
+
+        finish(result) turns the function's result into the result-page body;
+        upload is closed once the job ends. Returns None when every slot is busy.
+        """
+        with self.lock:
+            self.expire()
+            if not self.free_slots:
+                return None
+            job = Job(secrets.token_hex(16), key, self.free_slots.pop())
+            self.jobs[job.id] = job
+        base = job.slot * PROGRESS_FIELDS
+        self.progress[base:base + PROGRESS_FIELDS] = [QUEUED] + [0] * (PROGRESS_FIELDS - 1)
+
+        if executor is None:
+            if self.threads is None:
+                attach_progress(self.progress)
+                self.threads = ThreadPoolExecutor(thread_name_prefix="flowchart-job")
+            executor = self.threads
+        future = executor.submit(function, *args, job.slot)
+        future.add_done_callback(lambda future: self.finish(job, future, upload, finish))
+        return job
+
+    def complete(self, key, result):
+        """Registers a job that is done already, for results that were cached."""
+        job = Job(secrets.token_hex(16), key, None)
+        job.status = "done"
+        job.finished_at = time.monotonic()
+        with self.lock:
+            self.expire()
+            self.jobs[job.id] = job
+            self.keep_result(job, result)
+        return job
+
+    def finish(self, job, future, upload, finish):
+        result = None
+        try:
+            result = future.result()
+            if finish is not None:
+                result = finish(result)
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+        finally:
+            if upload is not None:
+                upload.close()
+            with self.lock:
+                job.finished_at = time.monotonic()
+                if job.error is None:
+                    self.keep_result(job, result)
+                # Set last, so a job seen as done always has its result
+                job.status = "done" if job.error is None else "failed"
+                self.free_slots.append(job.slot)
+                job.slot = None
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job):
+        """The job's state as a JSON-ready dict, with the worker's progress while it runs."""
+        state = {"id": job.id, "status": job.status}
+        slot = job.slot
+        if slot is not None:
+            phase, lines, total_lines, pages = self.progress[slot * PROGRESS_FIELDS:(slot + 1) * PROGRESS_FIELDS]
+            state.update(status=PHASE_NAMES[phase], lines=lines, total_lines=total_lines, pages=pages)
+        elif job.status == "done":
+            state["result"] = f"/jobs/{job.id}/result"
+        elif job.error is not None:
+            state["error"] = job.error
+        return state
+
+    def keep_result(self, job, result):
+        """Gives a finished job its result, dropping the oldest other results past max_result_bytes;
+        called with the lock held. The newest result is always kept, however large."""
+        job.result = result
+        self.result_bytes += len(result)
+        if self.result_bytes <= self.max_result_bytes:
+            return
+        for old in sorted(self.jobs.values(), key=lambda old: old.finished_at or 0):
+            if self.result_bytes <= self.max_result_bytes:
+                break
+            if old is not job and old.result is not None:
+                self.result_bytes -= len(old.result)
+                old.result = None
+
+    def expire(self):
+        """Forgets jobs finished more than `retention` seconds ago; called with the lock held."""
+        cutoff = time.monotonic() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at is not None and job.finished_at < cutoff]:
+            job = self.jobs.pop(job_id)
+            if job.result is not None:
+                self.result_bytes -= len(job.result)
+
+    def shutdown(self):
+        if self.threads is not None:
+            self.threads.shutdown(wait=False, cancel_futures=True)
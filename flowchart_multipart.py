@@ -0,0 +1,207 @@
+"""Streaming multipart/form-data parser for the upload endpoint.
+
+Replaces cgi.FieldStorage, which is deprecated and gone in Python 3.13. The
+body is read in fixed-size blocks and the uploaded file is spooled straight
+to a temporary file while it is hashed, so an upload is never held in memory
+whole. Requests larger than the configured limit are refused before any of
+the body is read.
+"""
+import hashlib
+import os
+import tempfile
+from email.parser import BytesHeaderParser
+from email.policy import HTTP
+
+# Largest request body accepted by default
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+READ_BLOCK_SIZE = 64 * 1024
+# Part headers and non-file fields are small; anything bigger is malformed
+MAX_PART_HEADER_BYTES = 16 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+
+class UploadError(Exception):
+    """A request the parser refuses; carries the HTTP status to answer with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class UploadedFile:
+    """An uploaded file spooled to disk, with its SHA-256 computed on the way in."""
+
+    def __init__(self, filename, path, size, sha256):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def detach(self):
+        """Hands the spooled file to a new UploadedFile; closing this one no longer deletes it."""
+        detached = UploadedFile(self.filename, self.path, self.size, self.sha256)
+        self.path = None
+        return detached
+
+    def close(self):
+        if self.path is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BodyReader:
+    """Reads exactly Content-Length bytes from the socket, one block at a time."""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read_block(self):
+        if self.remaining <= 0:
+            return b""
+        block = self.rfile.read(min(READ_BLOCK_SIZE, self.remaining))
+        if not block:
+            raise UploadError(400, "Request body ended early.")
+        self.remaining -= len(block)
+        return block
+
+def request_content_length(headers, max_bytes):
+    length = headers.get('Content-Length')
+    if length is None:
+        raise UploadError(411, "Content-Length required.")
+    try:
+        length = int(length)
+    except ValueError:
+        raise UploadError(400, "Invalid Content-Length.")
+    if length < 0:
+        raise UploadError(400, "Invalid Content-Length.")
+    if length > max_bytes:
+        raise UploadError(413, f"Upload too large (limit {max_bytes // (1024 * 1024)} MB).")
+    return length
+
+def parse_multipart_upload(rfile, headers, field="file", max_bytes=MAX_UPLOAD_BYTES):
+    """Parses a multipart/form-data body and returns the UploadedFile sent as `field`.
+
+    Other fields are read and discarded. Raises UploadError for oversized,
+    malformed or file-less requests.
+    """
+    if headers.get_content_type() != 'multipart/form-data':
+        raise UploadError(400, "Expected a multipart/form-data upload.")
+    boundary = headers.get_param('boundary')
+    if not boundary:
+        raise UploadError(400, "Missing multipart boundary.")
+    length = request_content_length(headers, max_bytes)
+
+    reader = BodyReader(rfile, length)
+    delimiter = b"--" + boundary.encode('latin-1')
+    upload = None
+    try:
+        buffer = skip_preamble(reader, delimiter)
+        while True:
+            # After a delimiter: "--" closes the body, CRLF starts another part
+            buffer = fill(reader, buffer, 2)
+            if buffer.startswith(b"--"):
+                break
+            if not buffer.startswith(b"\r\n"):
+                raise UploadError(400, "Malformed multipart body.")
+            part_headers, buffer = read_part_headers(reader, buffer[2:])
+
+            name = part_headers.get_param('name', header='content-disposition')
+            filename = part_headers.get_filename()
+            if name == field and filename is not None and upload is None:
+                upload, buffer = spool_part(reader, buffer, delimiter, filename)
+            else:
+                buffer = discard_part(reader, buffer, delimiter)
+    except BaseException:
+        if upload is not None:
+            upload.close()
+        raise
+
+    if upload is None:
+        raise UploadError(400, "No file uploaded.")
+    return upload
+
+def fill(reader, buffer, size):
+    """Reads until buffer holds at least `size` bytes or the body is exhausted."""
+    while len(buffer) < size:
+        block = reader.read_block()
+        if not block:
+            break
+        buffer += block
+    return buffer
+
+def skip_preamble(reader, delimiter):
+    buffer = b""
+    while True:
+        index = buffer.find(delimiter)
+        if index >= 0:
+            return buffer[index + len(delimiter):]
+        block = reader.read_block()
+        if not block:
+            raise UploadError(400, "Malformed multipart body.")
+        # Only a possible partial delimiter needs to be carried over
+        buffer = buffer[-len(delimiter):] + block
+
+def read_part_headers(reader, buffer):
+    while True:
+        end = buffer.find(b"\r\n\r\n")
+        if end >= 0:
+            header_bytes, buffer = buffer[:end + 2], buffer[end + 4:]
+            return BytesHeaderParser(policy=HTTP).parsebytes(header_bytes), buffer
+        if len(buffer) > MAX_PART_HEADER_BYTES:
+            raise UploadError(400, "Multipart headers too large.")
+        block = reader.read_block()
+        if not block:
+            raise UploadError(400, "Malformed multipart body.")
+        buffer += block
+
+def stream_part(reader, buffer, delimiter, write):
+    """Passes the part body to write() block by block; returns what follows its closing delimiter."""
+    marker = b"\r\n" + delimiter
+    while True:
+        index = buffer.find(marker)
+        if index >= 0:
+            write(buffer[:index])
+            return buffer[index + len(marker):]
+        # Hold back enough bytes to catch a delimiter split across two blocks
+        keep = len(marker) - 1
+        if len(buffer) > keep:
+            write(buffer[:-keep])
+            buffer = buffer[-keep:]
+        block = reader.read_block()
+        if not block:
+            raise UploadError(400, "Malformed multipart body.")
+        buffer += block
+
+def spool_part(reader, buffer, delimiter, filename):
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(prefix="flowchart-upload-")
+    upload = UploadedFile(os.path.basename(filename), path, 0, None)
+    try:
+        with open(fd, 'wb') as file:
+            def write(data):
+                digest.update(data)
+                file.write(data)
+                upload.size += len(data)
+            buffer = stream_part(reader, buffer, delimiter, write)
+    except BaseException:
+        upload.close()
+        raise
+    upload.sha256 = digest.hexdigest()
+    return upload, buffer
+
+def discard_part(reader, buffer, delimiter):
+    size = 0
+    def write(data):
+        nonlocal size
+        size += len(data)
+        if size > MAX_FIELD_BYTES:
+            raise UploadError(400, "Form field too large.")
+    return stream_part(reader, buffer, delimiter, write)
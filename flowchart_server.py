@@ -1,146 +1,88 @@
+import argparse
+import hashlib
+import html
 import http.server
-import socketserver
-import cgi
-from flowchart_generator import generate_flowchart_from_c_code, generate_flowchart_from_python
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flowchart_cache import CACHE_MAX_BYTES, ResultCache, is_result_key, pack_pages, result_key, unpack_page
+from flowchart_compression import BROTLI_QUALITY, COMPRESS_MIN_BYTES, ENCODINGS, GZIP_LEVEL, Compressor, choose_encoding, compress
+from flowchart_core import detect_language, function_flowchart, open_source, pack_flowchart, parse, unpack_flowchart
+from flowchart_jobs import LINES, PAGES, PARSING, PHASE, RENDERING, TOTAL_LINES, JobStore, attach_progress, report
+from flowchart_multipart import MAX_UPLOAD_BYTES, UploadError, parse_multipart_upload
+from flowchart_generator import (
+    CSS_FLOWCHART_OPEN, FLOWCHART_CLOSE, FLOWCHART_CSS, MAX_LINE_WIDTH, PAGE_SIZE, RENDERER_VERSION,
+    generate_flowchart_from_c_code, generate_flowchart_from_python,
+    iter_flowchart_from_c_code, iter_flowchart_from_python, iter_html_pages, iter_render_html, render_html,
+)
 
 PORT = 8082
 
-class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-
-            html = '''
-            <!DOCTYPE html>
-            <html lang="en">
-            <head>
-                <meta charset="UTF-8">
-                <title>Code Reading/Diagram Understand Helper</title>
-                <style>
-                    body {
-                        font-family: Arial, sans-serif;
-                        background: #121212;
-                        color: #fff;
-                        margin: 0;
-                        padding: 0;
-                        height: 100vh;
-                        display: flex;
-                        flex-direction: column;
-                        justify-content: center;
-                        align-items: center;
-                    }
-                    h1 {
-                        color: #FFD700;
-                        font-size: 2.5rem;
-                        margin-bottom: 40px;
-                    }
-                    form {
-                        background: rgba(255, 255, 255, 0.05);
-                        padding: 40px;
-                        border-radius: 12px;
-                        text-align: center;
-                        max-width: 400px;
-                        width: 100%;
-                    }
-                    input[type="file"] {
-                        background: #333;
-                        color: #fff;
-                        border: none;
-                        border-radius: 5px;
-                        padding: 12px;
-                        width: 100%;
-                        margin: 10px 0;
-                    }
-                    button {
-                        background: #FFD700;
-                        color: #333;
-                        font-size: 16px;
-                        padding: 12px 25px;
-                        border: none;
-                        border-radius: 5px;
-                        cursor: pointer;
-                        margin-top: 20px;
-                    }
-                    button:hover {
-                        background: #FF9900;
-                    }
-                    footer {
-                        position: fixed;
-                        bottom: 10px;
-                        width: 100%;
-                        text-align: center;
-                        color: #bbb;
-                    }
-                    footer a {
-                        color: #FFD700;
-                        text-decoration: none;
-                    }
-                </style>
-            </head>
-            <body>
-                <h1>Code Reading/Diagram Understand Helper</h1>
-                <form enctype="multipart/form-data" method="post" action="/upload">
-                    <label for="file">Upload your .c or .py file</label><br>
-                    <input type="file" name="file" accept=".c,.py" required><br>
-                    <button type="submit">Generate Flowchart</button>
-                </form>
-                <footer>
-                    <p>&copy; 2025 Flowchart Converter</p>
-                </footer>
-            </body>
-            </html>
-            '''
-            self.wfile.write(html.encode('utf-8'))
+# Requests handled at once, and requests allowed to wait for a free worker
+MAX_WORKERS = 8
+MAX_QUEUED_REQUESTS = 32
 
-        else:
-            self.send_error(404, 'Page Not Found')
+# Seconds a generation may take, queueing included, before it is cancelled
+GENERATION_TIMEOUT = 30
+# The same for asynchronous jobs (POST /upload?async=1), which nobody waits on
+JOB_TIMEOUT = 10 * 60
 
-    def do_POST(self):
-        if self.path == '/upload':
-            try:
-                form = cgi.FieldStorage(
-                    fp=self.rfile,
-                    headers=self.headers,
-                    environ={'REQUEST_METHOD': 'POST'}
-                )
-
-                if "file" in form:
-                    file_item = form["file"]
-                    uploaded_code = file_item.file.read().decode("utf-8")
-
-                    if file_item.filename.endswith('.c'):
-                        flowchart_html = generate_flowchart_from_c_code(uploaded_code)
-                    elif file_item.filename.endswith('.py'):
-                        flowchart_html = generate_flowchart_from_python(uploaded_code)
-                    else:
-                        self.send_error(400, "Unsupported file type. Only .c and .py are supported.")
-                        return
+# Block size for streaming a chart that a pool worker spooled to disk
+CHART_READ_SIZE = 64 * 1024
+
+FLOWCHART_GENERATORS = {
+    'c': iter_flowchart_from_c_code,
+    'python': iter_flowchart_from_python,
+}
+
+# C uploads at least this large get a list of their functions instead of one
+# giant chart; each function is rendered when it is expanded
+FUNCTION_LIST_MIN_BYTES = 256 * 1024
+
+FUNCTION_PATH_RE = re.compile(r"/function/([0-9a-f]{64})/(\d+)-(\d+)")
 
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
+# Uploads at least this large get a page with the start of the chart; the rest
+# is fetched page by page from /pages/<id>/<n> as the viewer scrolls
+PAGED_RESULT_MIN_BYTES = 64 * 1024
 
-                    html = f'''
-<!DOCTYPE html>
+PAGE_PATH_RE = re.compile(r"/pages/([0-9a-f]{64})/(\d+)")
+
+JOB_PATH_RE = re.compile(r"/jobs/([0-9a-f]{32})(/result)?")
+
+BUSY_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server busy, please retry.\n"
+)
+
+RESULT_PAGE_HEAD = '''<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
 <title>Flowchart Result</title>
 <style>
-    body {{
+    body {
         background-color: #121212;
         color: #f5f5f5;
         font-family: Arial, sans-serif;
         margin: 0;
         padding: 40px;
-    }}
-    h1 {{
+    }
+    h1 {
         text-align: center;
         color: #FFD700;
-    }}
-    .flowchart-container {{
+    }
+    .flowchart-container {
         background: #1e1e1e;
         padding: 20px;
         border-radius: 12px;
@@ -149,8 +91,8 @@ class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
         max-width: 1000px;
         transform-origin: top left;
         transition: transform 0.2s ease-in-out;
-    }}
-    a {{
+    }
+    a {
         display: block;
         width: fit-content;
         margin: 30px auto;
@@ -160,8 +102,8 @@ class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
         border-radius: 5px;
         text-decoration: none;
         font-weight: bold;
-    }}
-    .zoom-controls {{
+    }
+    .zoom-controls {
         position: fixed;
         bottom: 20px;
         left: 20px;
@@ -169,8 +111,8 @@ class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
         flex-direction: column;
         gap: 10px;
         z-index: 999;
-    }}
-    .zoom-button {{
+    }
+    .zoom-button {
         background: #FFD700;
         color: #000;
         font-weight: bold;
@@ -181,17 +123,28 @@ class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
         height: 40px;
         cursor: pointer;
         transition: background-color 0.3s ease;
-    }}
-    .zoom-button:hover {{
+    }
+    .zoom-button:hover {
         background-color: #FF9900;
-    }}
+    }
+    details.fn summary {
+        cursor: pointer;
+        padding: 4px 0;
+        font-family: monospace;
+        color: #FFD700;
+    }
+    details.fn summary span {
+        color: #bbb;
+    }
+''' + FLOWCHART_CSS + '''
 </style>
 </head>
 <body>
 <h1>Flowchart Result</h1>
 <div class="flowchart-container" id="flowchart-container">
-{flowchart_html}
-</div>
+'''
+
+RESULT_PAGE_TAIL = '''</div>
 <a href="/">Upload another file</a>
 
 <div class="zoom-controls">
@@ -202,22 +155,411 @@ class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
 <script>
 let zoomLevel = 1.0;
 const container = document.getElementById('flowchart-container');
-document.getElementById('zoom-in').onclick = () => {{
+document.getElementById('zoom-in').onclick = () => {
     zoomLevel += 0.1;
-    container.style.transform = `scale(${{zoomLevel}})`;
-}};
-document.getElementById('zoom-out').onclick = () => {{
+    container.style.transform = `scale(${zoomLevel})`;
+};
+document.getElementById('zoom-out').onclick = () => {
     zoomLevel = Math.max(0.5, zoomLevel - 0.1);
-    container.style.transform = `scale(${{zoomLevel}})`;
-}};
+    container.style.transform = `scale(${zoomLevel})`;
+};
 </script>
 </body>
 </html>
 '''
-                    self.wfile.write(html.encode('utf-8'))
 
-                else:
-                    self.send_error(400, "No file uploaded.")
+LANDING_PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Code Reading/Diagram Understand Helper</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            background: #121212;
+            color: #fff;
+            margin: 0;
+            padding: 0;
+            height: 100vh;
+            display: flex;
+            flex-direction: column;
+            justify-content: center;
+            align-items: center;
+        }
+        h1 {
+            color: #FFD700;
+            font-size: 2.5rem;
+            margin-bottom: 40px;
+        }
+        form {
+            background: rgba(255, 255, 255, 0.05);
+            padding: 40px;
+            border-radius: 12px;
+            text-align: center;
+            max-width: 400px;
+            width: 100%;
+        }
+        input[type="file"] {
+            background: #333;
+            color: #fff;
+            border: none;
+            border-radius: 5px;
+            padding: 12px;
+            width: 100%;
+            margin: 10px 0;
+        }
+        button {
+            background: #FFD700;
+            color: #333;
+            font-size: 16px;
+            padding: 12px 25px;
+            border: none;
+            border-radius: 5px;
+            cursor: pointer;
+            margin-top: 20px;
+        }
+        button:hover {
+            background: #FF9900;
+        }
+        footer {
+            position: fixed;
+            bottom: 10px;
+            width: 100%;
+            text-align: center;
+            color: #bbb;
+        }
+        footer a {
+            color: #FFD700;
+            text-decoration: none;
+        }
+    </style>
+</head>
+<body>
+    <h1>Code Reading/Diagram Understand Helper</h1>
+    <form enctype="multipart/form-data" method="post" action="/upload">
+        <label for="file">Upload your .c or .py file</label><br>
+        <input type="file" name="file" accept=".c,.py" required><br>
+        <button type="submit">Generate Flowchart</button>
+        <p id="status"></p>
+    </form>
+    <footer>
+        <p>&copy; 2025 Flowchart Converter</p>
+    </footer>
+    <script>
+    // Upload as a background job and show its progress; without JavaScript the form posts as usual
+    const form = document.querySelector('form');
+    const status = document.getElementById('status');
+    const json = response => response.ok ? response.json() : Promise.reject(response.statusText);
+    function poll(job) {
+        if (job.status === 'done') {
+            location.href = job.result;
+            return;
+        }
+        if (job.status === 'failed') return Promise.reject(job.error);
+        status.textContent = job.status === 'parsing'
+            ? `Parsing: ${job.lines.toLocaleString()} of ${job.total_lines.toLocaleString()} lines`
+            : job.status === 'rendering' ? `Rendering: ${job.pages} pages` : 'Waiting for a worker...';
+        return new Promise(resolve => setTimeout(resolve, 500))
+            .then(() => fetch('/jobs/' + job.id)).then(json).then(poll);
+    }
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        form.querySelector('button').disabled = true;
+        status.textContent = 'Uploading...';
+        fetch('/upload?async=1', {method: 'POST', body: new FormData(form)})
+            .then(json).then(poll)
+            .catch(error => {
+                status.textContent = 'Error: ' + error;
+                form.querySelector('button').disabled = false;
+            });
+    });
+    </script>
+</body>
+</html>
+'''
+
+class GenerationTimeout(Exception):
+    """Raised inside a pool worker when a job runs past its deadline."""
+
+def warm_worker(progress=None):
+    """Process-pool initializer: attaches the jobs' progress array, imports the generators and primes their regexes and caches."""
+    attach_progress(progress)
+    generate_flowchart_from_c_code("int main(void)\n{\n    return 0;\n}", css=True)
+    generate_flowchart_from_python("def main():\n    return 0", css=True)
+
+def generate_flowchart_job(language, path, deadline):
+    """Runs in a pool worker and renders the spooled upload at `path`, aborting once `deadline` (epoch seconds) passes.
+
+    The chart is written to a spool file chunk by chunk and its path returned;
+    the request thread streams it and deletes it, so neither process ever
+    holds the whole chart.
+    """
+    fd, chart_path = tempfile.mkstemp(prefix="flowchart-chart-", suffix=".html")
+    try:
+        with open(fd, 'wb') as chart, open_source(path) as source:
+            for count, chunk in enumerate(iter_render_html(parse_job_source(language, source, None, deadline), css=True)):
+                if time.time() > deadline:
+                    raise GenerationTimeout(f"generation exceeded its deadline after {count} chunks")
+                chart.write(chunk.encode('utf-8'))
+    except BaseException:
+        os.unlink(chart_path)
+        raise
+    return chart_path
+
+def discard_spooled_chart(future):
+    """Done-callback for a generate_flowchart_job nobody waits for any more: deletes its spool file."""
+    if not future.cancelled() and future.exception() is None:
+        try:
+            os.unlink(future.result())
+        except FileNotFoundError:
+            pass
+
+def line_count(source, block=1024 * 1024):
+    """Lines in a mapped upload, counted a block at a time (mmap has no count() before Python 3.13)."""
+    newlines = sum(source[offset:offset + block].count(b"\n") for offset in range(0, len(source), block))
+    return newlines + (source[-1:] not in (b"", b"\n"))
+
+def parse_job_source(language, source, slot, deadline=None):
+    """Parses a spooled upload, reporting lines parsed to the job in `slot` (if any).
+
+    The parser's progress callback also checks `deadline`, so a huge upload
+    raises GenerationTimeout while it is still being parsed.
+    """
+    def progress(line):
+        if deadline is not None and time.time() > deadline:
+            raise GenerationTimeout(f"parsing exceeded its deadline at line {line}")
+        report(slot, LINES, line)
+
+    if slot is None:
+        return parse(language, source, progress=progress)
+    report(slot, TOTAL_LINES, line_count(source))
+    report(slot, PHASE, PARSING)
+    flowchart = parse(language, source, progress=progress)
+    report(slot, LINES, line_count(source))
+    return flowchart
+
+def generate_pages_job(language, path, deadline, slot=None):
+    """Like generate_flowchart_job, but returns the chart split into pages for the paged result view.
+
+    As an asynchronous job (with a progress slot) it reports lines parsed, then pages rendered.
+    """
+    pages = []
+    with open_source(path) as source:
+        flowchart = parse_job_source(language, source, slot, deadline)
+        report(slot, PHASE, RENDERING)
+        for page in iter_html_pages(flowchart):
+            if time.time() > deadline:
+                raise GenerationTimeout(f"generation exceeded its deadline after {len(pages)} pages")
+            pages.append(page)
+            report(slot, PAGES, len(pages))
+    return pages or [""]
+
+def pages_key(key):
+    """The id the pages of the result `key` are stored under."""
+    return result_key(key, 'pages', PAGE_SIZE, RENDERER_VERSION)
+
+def store_pages(cache, key, pages):
+    """Keeps a paged chart in the cache and returns the result-page body: the paged view, or the
+    whole chart when the pages cannot be kept for later page requests."""
+    packed = pack_pages(pages)
+    if cache is None or not cache.can_keep(len(packed)):
+        return (CSS_FLOWCHART_OPEN + "".join(pages) + FLOWCHART_CLOSE).encode('utf-8')
+    pages_id = pages_key(key)
+    cache.put(pages_id, packed)
+    page = render_paged_result(pages_id, pages).encode('utf-8')
+    cache.put(key, page)
+    return page
+
+def render_paged_result(pages_id, pages):
+    """The result-page body for a paged chart: the first page inline, the others fetched while scrolling."""
+    chart = f"<pre class='fc' id='fc-pages' data-src='/pages/{pages_id}/' data-pages='{len(pages)}'>{pages[0]}</pre>\n"
+    return chart + PAGED_RESULT_SCRIPT if len(pages) > 1 else chart
+
+PAGED_RESULT_SCRIPT = '''<p id="fc-more">Loading...</p>
+<script>
+(() => {
+    const chart = document.getElementById('fc-pages');
+    const more = document.getElementById('fc-more');
+    const pages = Number(chart.dataset.pages);
+    let next = 1, loading = false;
+    // Fetch the next page while the end of the chart is still well below the viewport
+    const observer = new IntersectionObserver(entries => {
+        if (entries[0].isIntersecting) load();
+    }, {rootMargin: '2000px'});
+    function load() {
+        if (loading) return;
+        loading = true;
+        fetch(chart.dataset.src + next)
+            .then(response => response.ok ? response.json() : Promise.reject(response.statusText))
+            .then(page => {
+                chart.insertAdjacentHTML('beforeend', page.html);
+                loading = false;
+                if (++next >= pages) {
+                    observer.disconnect();
+                    more.remove();
+                } else {
+                    // Observing again reports the sentinel at once if it is still in view
+                    observer.unobserve(more);
+                    observer.observe(more);
+                }
+            })
+            .catch(error => { more.textContent = 'Could not load the rest of the flowchart: ' + error; });
+    }
+    observer.observe(more);
+})();
+</script>
+'''
+
+def function_index_job(path, deadline, slot=None):
+    """Runs in a pool worker: the packed parse of a C upload (see pack_flowchart), function index included.
+
+    The function list is drawn from it, and each function's chart is later
+    sliced out of it. Like generate_pages_job, it raises GenerationTimeout
+    once `deadline` (epoch seconds) passes.
+    """
+    with open_source(path) as source:
+        return pack_flowchart(parse_job_source('c', source, slot, deadline))
+
+def index_key(key):
+    """The id the parse behind the function list `key` is kept under, next to the upload."""
+    return result_key(key, 'c-index', MAX_LINE_WIDTH, RENDERER_VERSION)
+
+def store_function_list(cache, sources, key, index):
+    """Keeps the packed parse with the upload and caches the function list drawn from it."""
+    sources.put(index_key(key), index)
+    page = render_function_list(key, unpack_flowchart(index, 'c', b"").functions).encode('utf-8')
+    cache.put(key, page)
+    return page
+
+def render_function_list(key, functions):
+    """The result-page body for a function list; each <details> fetches its chart when first opened."""
+    parts = [f"<p>{len(functions):,} functions. Expand one to draw its flowchart.</p>\n"]
+    for function in functions:
+        parts.append(f"<details class='fn' data-src='/function/{key}/{function.start}-{function.end}'>"
+                     f"<summary>{html.escape(function.name)} <span>line {function.line}, "
+                     f"{function.last - function.first:,} boxes, depth {function.depth}</span></summary></details>\n")
+    parts.append(FUNCTION_LIST_SCRIPT)
+    return "".join(parts)
+
+FUNCTION_LIST_SCRIPT = '''<script>
+document.querySelectorAll('details.fn').forEach(details => {
+    details.addEventListener('toggle', () => {
+        if (!details.open || details.dataset.loaded) return;
+        details.dataset.loaded = '1';
+        const chart = document.createElement('div');
+        chart.textContent = 'Rendering...';
+        details.appendChild(chart);
+        fetch(details.dataset.src)
+            .then(response => response.ok ? response.text() : Promise.reject(response.statusText))
+            .then(text => { chart.innerHTML = text; })
+            .catch(error => { chart.textContent = 'Could not render this function: ' + error; delete details.dataset.loaded; });
+    });
+});
+</script>
+'''
+
+def start_generation_pool(processes, progress=None):
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=warm_worker, initargs=(progress,))
+    # Workers are forked lazily; submit one no-op per worker so none starts mid-request
+    for future in [pool.submit(os.getpid) for _ in range(processes)]:
+        future.result()
+    return pool
+
+RESULT_PAGE_HEAD_BYTES = RESULT_PAGE_HEAD.encode('utf-8')
+RESULT_PAGE_TAIL_BYTES = RESULT_PAGE_TAIL.encode('utf-8')
+# Compressed result pages include the head and tail, so their cache keys must change with them
+RESULT_PAGE_DIGEST = hashlib.sha256(RESULT_PAGE_HEAD_BYTES + RESULT_PAGE_TAIL_BYTES).hexdigest()
+
+# Results are content-addressed, so a key never changes meaning
+IMMUTABLE = 'private, max-age=31536000, immutable'
+
+# The landing page only changes with the server: it is compressed once, with the
+# tightest settings, and browsers revalidate it against its ETag once an hour
+LANDING_PAGE_BYTES = LANDING_PAGE.encode('utf-8')
+LANDING_PAGE_TAG = hashlib.sha256(LANDING_PAGE_BYTES).hexdigest()[:32]
+LANDING_PAGE_ENCODED = {encoding: compress([LANDING_PAGE_BYTES], encoding, static=True) for encoding in ENCODINGS}
+LANDING_PAGE_ENCODED[None] = LANDING_PAGE_BYTES
+LANDING_PAGE_CACHE_CONTROL = 'public, max-age=3600'
+
+def entity_tag(tag, encoding=None):
+    """The ETag of one representation; each Content-Encoding gets its own."""
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+def result_headers(key):
+    return [('Content-Location', f'/result/{key}'), ('Cache-Control', IMMUTABLE)]
+
+def encoded_key(key, encoding):
+    """Cache key of a compressed copy of the response cached as `key`."""
+    return result_key(key, encoding, GZIP_LEVEL if encoding == 'gzip' else BROTLI_QUALITY, RENDERER_VERSION)
+
+class FlowchartHandler(http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/result/'):
+            self.send_cached_result(self.path[len('/result/'):])
+        elif self.path.startswith('/function/'):
+            self.send_function_chart(self.path)
+        elif self.path.startswith('/pages/'):
+            self.send_page(self.path)
+        elif self.path.startswith('/jobs/'):
+            self.send_job(self.path)
+        elif self.path == '/':
+            self.send_landing_page()
+        else:
+            self.send_error(404, 'Page Not Found')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == '/upload':
+            asynchronous = parse_qs(url.query).get('async', [''])[0] in ('1', 'true') and self.server.jobs is not None
+            try:
+                # Oversized bodies are refused from Content-Length alone, before anything is read
+                upload = parse_multipart_upload(self.rfile, self.headers, max_bytes=self.server.max_upload_bytes)
+            except UploadError as e:
+                self.close_connection = True
+                self.send_error(e.status, e.message)
+                return
+
+            try:
+                with upload:
+                    language = detect_language(upload.filename)
+                    if language is None:
+                        self.send_error(400, "Unsupported file type. Only .c and .py are supported.")
+                        return
+
+                    # Identical uploads map to the same key, so repeats skip generation entirely
+                    # Conditional requests are answered by GET /result/<key> only: a 304 is no answer to a POST
+                    key = result_key(upload.sha256, language, MAX_LINE_WIDTH, RENDERER_VERSION)
+                    # Large C files are listed by function; the upload is kept to render them on demand
+                    sources = self.server.source_cache
+                    function_list = (language == 'c' and upload.size >= FUNCTION_LIST_MIN_BYTES
+                                     and sources is not None and sources.can_keep(upload.size))
+                    if function_list:
+                        sources.put_file(key, upload.path)
+
+                    cache = self.server.result_cache
+                    paged = not function_list and upload.size >= PAGED_RESULT_MIN_BYTES and cache is not None
+                    cached = cache.get(key) if cache is not None else None
+                    if cached is not None and paged and cache.get(pages_key(key)) is None:
+                        cached = None  # the pages behind a cached result page were evicted
+                    if asynchronous:
+                        self.start_job(key, language, upload, cached, function_list)
+                        return
+                    if cached is not None:
+                        self.send_result_page(key, cached)
+                        return
+                    if function_list:
+                        self.send_function_list(key, upload.path)
+                        return
+                    if paged:
+                        self.send_paged_flowchart(key, language, upload.path)
+                        return
+
+                    # The spooled upload is decoded line by line as the generator consumes it
+                    if self.server.generation_pool is None:
+                        with open_source(upload.path) as source:
+                            self.stream_flowchart(key, language, source)
+                    else:
+                        self.send_flowchart_from_pool(key, language, upload.path)
 
             except Exception as e:
                 self.send_response(500)
@@ -230,7 +572,418 @@ document.getElementById('zoom-out').onclick = () => {{
         else:
             self.send_error(404, 'Page Not Found')
 
-with socketserver.TCPServer(("", PORT), FlowchartHandler) as httpd:
-    print(f"Serving on port {PORT}")
-    httpd.serve_forever()
+    def stream_flowchart(self, key, language, source):
+        """Renders on this thread and streams the chunks to the socket as they are produced."""
+        # Class-based boxes keep the response a fraction of the inline-styled size
+        self.stream_chart(key, (chunk.encode('utf-8') for chunk in FLOWCHART_GENERATORS[language](source, css=True)))
+
+    def stream_chart(self, key, chunks):
+        """Sends the result page around the chart's chunks (bytes) as they come, keeping a copy for the cache."""
+        # Take the first chunk before committing to a 200 so parse errors still get a 500
+        first_chunk = next(chunks, b"")
+
+        # Result pages are always big enough to be worth compressing
+        encoding = self.response_encoding(COMPRESS_MIN_BYTES)
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', entity_tag(key, encoding))
+        for name, value in result_headers(key):
+            self.send_header(name, value)
+        self.end_headers()
+        if encoding is None:
+            write = self.wfile.write
+        else:
+            compressor = Compressor(encoding)
+            write = lambda data: self.wfile.write(compressor.compress(data))
+
+        # Keep a copy for the result cache unless the chart outgrows a cache entry
+        cache = self.server.result_cache
+        kept = [first_chunk] if cache is not None else None
+        kept_size = len(first_chunk)
+
+        # Stream the page: everything before the chart, the chart chunks, then the rest
+        write(RESULT_PAGE_HEAD_BYTES)
+        write(first_chunk)
+        try:
+            for chunk in chunks:
+                write(chunk)
+                if kept is not None:
+                    kept_size += len(chunk)
+                    if kept_size > cache.max_entry_bytes:
+                        kept = None
+                    else:
+                        kept.append(chunk)
+        except Exception as e:
+            # Headers are already sent, so the best we can do is log and cut the page short
+            print(f"Server error while streaming: {e}")
+            return
+        write(RESULT_PAGE_TAIL_BYTES)
+        if encoding is not None:
+            self.wfile.write(compressor.flush())
+
+        if kept is not None:
+            cache.put(key, b"".join(kept))
+
+    def send_flowchart_from_pool(self, key, language, path):
+        """Renders in a worker process so generations use every core instead of sharing the GIL."""
+        timeout = self.server.generation_timeout
+        future = self.server.generation_pool.submit(generate_flowchart_job, language, path, time.time() + timeout)
+        try:
+            chart_path = future.result(timeout=timeout)
+        except (FutureTimeoutError, GenerationTimeout):
+            # Drops the job if it is still queued; a running job stops itself at its deadline,
+            # and one that finishes after all leaves a spool file to delete
+            future.cancel()
+            future.add_done_callback(discard_spooled_chart)
+            self.send_error(503, "Flowchart generation timed out.")
+            return
+
+        # The worker spooled the chart to disk; stream it from there a block at a time
+        try:
+            with open(chart_path, 'rb') as chart:
+                self.stream_chart(key, iter(partial(chart.read, CHART_READ_SIZE), b""))
+        finally:
+            os.unlink(chart_path)
+
+    def run_job(self, job, *args):
+        """Runs job(*args) in the generation pool, or on this thread without one; None after a 503 on timeout."""
+        pool = self.server.generation_pool
+        try:
+            if pool is None:
+                return job(*args)
+            future = pool.submit(job, *args)
+            try:
+                return future.result(timeout=self.server.generation_timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise
+        except (FutureTimeoutError, GenerationTimeout):
+            self.send_error(503, "Flowchart generation timed out.")
+            return None
+
+    # ---------- Paged results ----------
+    def send_paged_flowchart(self, key, language, path):
+        """Renders the chart into pages, keeps them under their own id and sends a page holding only the first."""
+        pages = self.run_job(generate_pages_job, language, path, time.time() + self.server.generation_timeout)
+        if pages is None:
+            return
+        self.send_result_page(key, store_pages(self.server.result_cache, key, pages))
+
+    def send_page(self, path):
+        """Sends one page of a paged result as JSON: {"page", "pages", "html"}."""
+        match = PAGE_PATH_RE.fullmatch(path)
+        cache = self.server.result_cache
+        packed = cache.get(match.group(1)) if match and cache is not None else None
+        page, count = unpack_page(packed, int(match.group(2))) if packed is not None else (None, 0)
+        if page is None:
+            self.send_error(404, "Page not found or expired. Please upload the file again.")
+            return
+
+        page_tag = f"{match.group(1)}.{match.group(2)}"
+        if self.etag_matches(page_tag):
+            self.send_not_modified(page_tag, [('Cache-Control', IMMUTABLE)])
+            return
+        body = json.dumps({"page": int(match.group(2)), "pages": count, "html": page.decode('utf-8')}).encode('utf-8')
+        self.send_content([body], 'application/json', tag=page_tag, headers=[('Cache-Control', IMMUTABLE)])
+
+    # ---------- Function lists ----------
+    def send_function_list(self, key, path):
+        """Indexes the upload's functions (in a worker process when there is a pool) and sends the list."""
+        index = self.run_job(function_index_job, path, time.time() + self.server.generation_timeout)
+        if index is None:
+            return
+        self.send_result_page(key, store_function_list(self.server.result_cache, self.server.source_cache, key, index))
+
+    # ---------- Asynchronous jobs ----------
+    def start_job(self, key, language, upload, cached, function_list):
+        """Answers 202 with the new job's status at once; the upload is rendered in the background."""
+        jobs = self.server.jobs
+        cache = self.server.result_cache
+        sources = self.server.source_cache
+        if cached is not None:
+            job = jobs.complete(key, cached)
+        else:
+            # The job owns the spooled upload from here on and deletes it when it ends
+            kept = upload.detach()
+            if function_list:
+                job = jobs.submit(key, self.server.generation_pool, function_index_job,
+                                  kept.path, time.time() + self.server.job_timeout, upload=kept,
+                                  finish=lambda index: store_function_list(cache, sources, key, index))
+            else:
+                job = jobs.submit(key, self.server.generation_pool, generate_pages_job,
+                                  language, kept.path, time.time() + self.server.job_timeout, upload=kept,
+                                  finish=lambda pages: store_pages(cache, key, pages))
+            if job is None:
+                kept.close()
+                self.send_error(503, "Too many jobs running, please retry later.")
+                return
+        self.send_json(202, jobs.status(job), location=f'/jobs/{job.id}')
+
+    def send_job(self, path):
+        """/jobs/<id> reports a job's status and progress; /jobs/<id>/result sends its result once done."""
+        match = JOB_PATH_RE.fullmatch(path)
+        jobs = self.server.jobs
+        job = jobs.get(match.group(1)) if match and jobs is not None else None
+        if job is None:
+            self.send_error(404, "Job not found or expired.")
+            return
+        if not match.group(2) or job.status not in ("done", "failed"):
+            self.send_json(200 if not match.group(2) else 202, jobs.status(job))
+        elif job.status == "done":
+            # A result dropped for the jobs' byte budget may still be in the result cache
+            result = job.result
+            if result is None and self.server.result_cache is not None:
+                result = self.server.result_cache.get(job.key)
+            if result is None:
+                self.send_error(404, "Job result expired. Please upload the file again.")
+                return
+            self.send_result_page(job.key, result)
+        else:
+            self.send_error(500, f"Flowchart generation failed: {job.error}")
+
+    def send_json(self, status, value, location=None):
+        headers = [('Cache-Control', 'no-store')]
+        if location is not None:
+            headers.append(('Location', location))
+        self.send_content([json.dumps(value).encode('utf-8')], 'application/json', status, headers=headers)
+
+    def send_function_chart(self, path):
+        """Renders one function of a kept upload; the span comes from its function list."""
+        match = FUNCTION_PATH_RE.fullmatch(path)
+        if match is None or self.server.source_cache is None:
+            self.send_error(404, "Function not found.")
+            return
+        key, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+
+        chart_key = result_key(f"{key}:{start}-{end}", 'c-function', MAX_LINE_WIDTH, RENDERER_VERSION)
+        if self.etag_matches(chart_key):
+            self.send_not_modified(chart_key, [('Cache-Control', IMMUTABLE)])
+            return
+        cache = self.server.result_cache
+        chart = cache.get(chart_key)
+        if chart is None:
+            chart = self.render_kept_function(key, start, end)
+            if chart is None:
+                self.send_error(404, "Function not found or expired. Please upload the file again.")
+                return
+            cache.put(chart_key, chart)
+
+        self.send_content([chart], 'text/html', tag=chart_key, headers=[('Cache-Control', IMMUTABLE)])
+
+    def render_kept_function(self, key, start, end):
+        """The chart of the function spanning [start, end) of the kept upload `key`, sliced out of the
+        parse kept with it; None when either has expired or no indexed function has that span."""
+        sources = self.server.source_cache
+        index = sources.get(index_key(key))
+        if index is None:
+            return None
+        # The upload is mapped from the disk tier rather than read into memory
+        with sources.open(key) as source:
+            if source is None:
+                return None
+            flowchart = unpack_flowchart(index, 'c', source)
+            for function in flowchart.functions:
+                if function.start == start and function.end == end:
+                    return render_html(function_flowchart(flowchart, function), css=True).encode('utf-8')
+        return None
+
+    # ---------- Responses ----------
+    def response_encoding(self, size):
+        """The Content-Encoding for a `size`-byte body, or None to send it as it is."""
+        if size < COMPRESS_MIN_BYTES:
+            return None
+        return choose_encoding(self.headers.get('Accept-Encoding'))
+
+    def send_content(self, parts, content_type, status=200, tag=None, headers=(), cache_key=None):
+        """Sends a body made of `parts` (bytes), compressed when it is large enough and the client accepts it.
+
+        tag is the ETag, suffixed per encoding. With cache_key a compressed
+        body is kept in the result cache, so a large result is compressed
+        once rather than on every request.
+        """
+        size = sum(map(len, parts))
+        encoding = self.response_encoding(size)
+        if encoding is not None:
+            parts = [self.compressed(parts, encoding, cache_key)]
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(sum(map(len, parts))))
+        if size >= COMPRESS_MIN_BYTES:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        if tag is not None:
+            self.send_header('ETag', entity_tag(tag, encoding))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        for part in parts:
+            self.wfile.write(part)
+
+    def compressed(self, parts, encoding, cache_key):
+        cache = self.server.result_cache
+        if cache_key is None or cache is None:
+            return compress(parts, encoding)
+        key = encoded_key(cache_key, encoding)
+        body = cache.get(key)
+        if body is None:
+            body = compress(parts, encoding)
+            cache.put(key, body)
+        return body
+
+    def send_landing_page(self):
+        if self.etag_matches(LANDING_PAGE_TAG):
+            self.send_not_modified(LANDING_PAGE_TAG, [('Cache-Control', LANDING_PAGE_CACHE_CONTROL)])
+            return
+        encoding = self.response_encoding(len(LANDING_PAGE_BYTES))
+        body = LANDING_PAGE_ENCODED[encoding]
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', entity_tag(LANDING_PAGE_TAG, encoding))
+        self.send_header('Cache-Control', LANDING_PAGE_CACHE_CONTROL)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def etag_matches(self, tag):
+        """True when If-None-Match names any encoding of `tag`; they all carry the same content."""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+        return '*' in tags or any(entity_tag(tag, encoding) in tags for encoding in (None,) + ENCODINGS)
+
+    def send_not_modified(self, tag, headers=()):
+        self.send_response(304)
+        self.send_header('ETag', entity_tag(tag, self.response_encoding(COMPRESS_MIN_BYTES)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+    # ---------- Result cache responses ----------
+    def send_result_page(self, key, flowchart_html):
+        self.send_content([RESULT_PAGE_HEAD_BYTES, flowchart_html, RESULT_PAGE_TAIL_BYTES], 'text/html',
+                          tag=key, headers=result_headers(key), cache_key=f"{key}:{RESULT_PAGE_DIGEST}")
+
+    def send_cached_result(self, key):
+        if not is_result_key(key):
+            self.send_error(404, 'Page Not Found')
+            return
+        if self.etag_matches(key):
+            self.send_not_modified(key, result_headers(key))
+            return
+        cache = self.server.result_cache
+        flowchart_html = cache.get(key) if cache is not None else None
+        if flowchart_html is None:
+            self.send_error(404, "Result not found or expired. Please upload the file again.")
+            return
+        self.send_result_page(key, flowchart_html)
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTP server that handles connections on a bounded thread pool.
+
+    Up to max_workers requests run at once and up to max_queued more wait for
+    a worker; beyond that a request is answered 503 immediately, so a few
+    large uploads cannot stall the accept loop or queue work without bound.
+    """
+
+    # Optional ProcessPoolExecutor that runs generations; None renders on the handler thread
+    generation_pool = None
+    generation_timeout = GENERATION_TIMEOUT
+    # Optional ResultCache of rendered charts; None disables caching
+    result_cache = None
+    # Optional ResultCache of uploads listed by function, kept to render each function later
+    source_cache = None
+    # Optional JobStore for asynchronous uploads; None answers them synchronously
+    jobs = None
+    job_timeout = JOB_TIMEOUT
+    max_upload_bytes = MAX_UPLOAD_BYTES
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED_REQUESTS):
+        # Created before binding: a failed bind calls server_close(), which shuts the pool down
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flowchart-worker")
+        self.slots = threading.BoundedSemaphore(max_workers + max_queued)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.reject_request(request)
+            return
+        self.pool.submit(self.process_request_in_pool, request, client_address)
+
+    def process_request_in_pool(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def reject_request(self, request):
+        try:
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the flowchart generator over HTTP.")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"requests handled concurrently (default {MAX_WORKERS})")
+    parser.add_argument("--queue", type=int, default=MAX_QUEUED_REQUESTS,
+                        help=f"requests waiting for a worker before new ones get 503 (default {MAX_QUEUED_REQUESTS})")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for generation; 0 renders on the request thread (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=GENERATION_TIMEOUT,
+                        help=f"seconds before a generation is cancelled (default {GENERATION_TIMEOUT})")
+    parser.add_argument("--job-timeout", type=float, default=JOB_TIMEOUT,
+                        help=f"seconds before an asynchronous job is cancelled (default {JOB_TIMEOUT})")
+    parser.add_argument("--cache-mb", type=float, default=CACHE_MAX_BYTES / (1024 * 1024),
+                        help="memory budget of the result cache in MB; 0 disables it")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory for an on-disk result cache that survives restarts")
+    parser.add_argument("--max-upload-mb", type=float, default=MAX_UPLOAD_BYTES / (1024 * 1024),
+                        help="largest accepted upload in MB; bigger requests get 413 before they are read")
+    args = parser.parse_args()
+
+    result_cache = source_cache = None
+    if args.cache_mb > 0 or args.cache_dir:
+        result_cache = ResultCache(max_bytes=int(args.cache_mb * 1024 * 1024), directory=args.cache_dir)
+        source_cache = ResultCache(max_bytes=int(args.cache_mb * 1024 * 1024), directory=args.cache_dir, suffix=".src")
+
+    # Start the process pool before any server thread exists so workers fork from a clean parent;
+    # they inherit the jobs' shared progress array
+    jobs = JobStore()
+    generation_pool = start_generation_pool(args.processes, jobs.progress) if args.processes > 0 else None
+    try:
+        with PooledHTTPServer(("", args.port), FlowchartHandler, args.workers, args.queue) as httpd:
+            httpd.generation_pool = generation_pool
+            httpd.generation_timeout = args.timeout
+            httpd.result_cache = result_cache
+            httpd.source_cache = source_cache
+            httpd.jobs = jobs
+            httpd.job_timeout = args.job_timeout
+            httpd.max_upload_bytes = int(args.max_upload_mb * 1024 * 1024)
+            print(f"Serving on port {args.port} with {args.workers} workers")
+            httpd.serve_forever()
+    finally:
+        jobs.shutdown()
+        if generation_pool is not None:
+            generation_pool.shutdown(cancel_futures=True)
+
+if __name__ == "__main__":
+    main()
 
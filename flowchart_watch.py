@@ -0,0 +1,69 @@
+"""Change detection for watch mode: stat polling with debouncing.
+
+inotify is Linux-only and not in the standard library, so files are
+polled with os.stat instead. A stat costs microseconds, which keeps a
+check every WATCH_INTERVAL cheap. It also works on every platform and
+filesystem, network mounts included. Editors often save in several steps
+(truncate then write, or write a temporary file then rename it). A change
+is therefore reported only once the file has stayed the same for
+WATCH_DEBOUNCE seconds.
+"""
+import os
+import time
+
+# How often files are checked, and how long a change must settle before it is reported
+WATCH_INTERVAL = 0.05
+WATCH_DEBOUNCE = 0.05
+
+def file_signature(path):
+    """What a change to `path` alters: modification time, size and inode; None while it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+class FileWatcher:
+    """Polls a set of paths (files, or directories for files added and removed) for changes.
+
+    poll() never blocks, so a GUI can call it from its event loop;
+    wait() sleeps between polls until something changes.
+    """
+
+    def __init__(self, paths, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE):
+        self.interval = interval
+        self.debounce = debounce
+        self.signatures = {}
+        self.pending = {}   # path -> (new signature, when it was first seen)
+        self.watch(paths)
+
+    def watch(self, paths):
+        """Replaces the watched paths, taking their current state as unchanged."""
+        self.signatures = {path: file_signature(path) for path in paths}
+        self.pending = {}
+
+    def poll(self):
+        """Returns the paths whose change has settled since the last call, in watch order."""
+        now = time.monotonic()
+        changed = []
+        for path, known in self.signatures.items():
+            signature = file_signature(path)
+            if signature == known:
+                self.pending.pop(path, None)  # changed and changed back
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != signature:
+                self.pending[path] = (signature, now)  # still being written: restart the debounce
+            elif now - seen[1] >= self.debounce:
+                del self.pending[path]
+                self.signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def wait(self):
+        """Blocks until a change has settled and returns the changed paths."""
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                return changed
@@ -0,0 +1,62 @@
+"""Tests for flowchart_cache: result keys and the two-tier ResultCache."""
+import os
+
+from flowchart_cache import ResultCache, is_result_key, result_key
+
+def key(n):
+    return result_key(f"{n:064x}", 'c', 100, 1)
+
+def test_result_key_covers_every_setting():
+    base = result_key("ab" * 32, 'c', 100, 1)
+    assert is_result_key(base)
+    assert len({base, result_key("ab" * 32, 'python', 100, 1), result_key("ab" * 32, 'c', 80, 1),
+                result_key("ab" * 32, 'c', 100, 2), result_key("cd" * 32, 'c', 100, 1)}) == 5
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=30)
+    for n in range(3):
+        cache.put(key(n), b"x" * 10)
+    assert cache.get(key(0)) == b"x" * 10  # now the most recently used
+    cache.put(key(3), b"y" * 10)
+    assert cache.get(key(1)) is None
+    assert cache.get(key(0)) is not None and cache.get(key(3)) is not None
+    assert cache.stats()["bytes"] == 30
+
+def test_oversized_entries_are_not_kept_in_memory():
+    cache = ResultCache(max_bytes=100, max_entry_bytes=10)
+    assert not cache.can_keep(11)
+    cache.put(key(0), b"x" * 11)
+    assert cache.get(key(0)) is None
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    ResultCache(max_bytes=100, directory=str(tmp_path)).put(key(0), b"chart")
+    restarted = ResultCache(max_bytes=100, directory=str(tmp_path))
+    assert restarted.can_keep(10 ** 9)
+    assert restarted.get(key(0)) == b"chart"
+    assert restarted.stats()["entries"] == 1  # promoted into memory
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
+
+def test_keys_that_are_not_result_keys_never_reach_the_disk(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    assert not is_result_key("../" + "0" * 61)
+    assert cache.get("../" + "0" * 61) is None
+    assert cache.stats()["misses"] == 0
+
+def test_put_file_copies_into_the_disk_tier_only(tmp_path):
+    upload = tmp_path / "upload.c"
+    upload.write_bytes(b"int main(void) { return 0; }\n")
+    cache = ResultCache(directory=str(tmp_path / "cache"), suffix=".src")
+    cache.put_file(key(0), str(upload))
+    assert cache.stats()["entries"] == 0
+    with cache.open(key(0)) as source:
+        assert source[:] == upload.read_bytes()
+    with cache.open(key(1)) as source:
+        assert source is None
+
+def test_put_file_without_a_disk_tier_keeps_it_in_memory(tmp_path):
+    upload = tmp_path / "upload.c"
+    upload.write_bytes(b"int x;\n")
+    cache = ResultCache()
+    cache.put_file(key(0), str(upload))
+    with cache.open(key(0)) as source:
+        assert source == b"int x;\n"
@@ -0,0 +1,42 @@
+"""Tests for flowchart_compression: Accept-Encoding negotiation and streaming compression."""
+import gzip
+
+import pytest
+
+import flowchart_compression as compression
+
+@pytest.mark.parametrize("header, encoding", [
+    (None, None),
+    ("", None),
+    ("gzip", 'gzip'),
+    ("GZip ; q=0.5", 'gzip'),
+    ("gzip;q=0", None),
+    ("gzip;q=nonsense", None),
+    ("identity", None),
+    ("*", 'br'),
+    ("*;q=0.1, br;q=0", 'gzip'),
+    ("gzip, br", 'br'),           # equal weights go by ENCODINGS order
+    ("gzip;q=1, br;q=0.8", 'gzip'),
+])
+def test_choose_encoding(monkeypatch, header, encoding):
+    monkeypatch.setattr(compression, 'ENCODINGS', ('br', 'gzip'))
+    assert compression.choose_encoding(header) == encoding
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'ENCODINGS', ('gzip',))
+    assert compression.choose_encoding("br, gzip;q=0.5") == 'gzip'
+    assert compression.choose_encoding("br") is None
+
+@pytest.mark.parametrize("static", [False, True])
+def test_gzip_stream_round_trips(static):
+    parts = [b"<span class='box'>%d</span>\n" % n for n in range(500)]
+    body = compression.compress(parts, 'gzip', static)
+    assert gzip.decompress(body) == b"".join(parts)
+    assert len(body) < len(b"".join(parts)) // 5
+
+def test_brotli_stream_round_trips():
+    brotli = pytest.importorskip("brotli")
+    parts = [b"<span class='box'>%d</span>\n" % n for n in range(500)]
+    compressor = compression.Compressor('br')
+    body = b"".join(compressor.compress(part) for part in parts) + compressor.flush()
+    assert brotli.decompress(body) == b"".join(parts)
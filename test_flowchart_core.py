@@ -0,0 +1,307 @@
+"""Tests for flowchart_core: incremental reparsing and the packed IR."""
+import os
+import random
+
+import pytest
+
+import flowchart_core as core
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Everything a parse produces; reparse() has to rebuild all of it
+FIELDS = ('kinds', 'depths', 'starts', 'lengths', 'lines', 'resync_offsets', 'resync_lines', 'functions')
+
+C_SAMPLE = r'''/*
+ * Sample program
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#define TWICE(x) ((x) * 2)
+
+int add(int a, int b);
+// single comment
+
+static int add(int a, int b)
+{
+    return a + b;
+}
+
+int main(void)
+{
+    int x = 5;
+    char *s = "a;b{";
+    if (x > 3)
+    {
+        printf("big\n");
+        x--;
+    }
+    else
+        printf("small\n");
+    for (int i = 0; i < 3; i++)
+    {
+        switch (i)
+        {
+            case 0:
+                puts("zero");
+                break;
+            default:
+                puts("other");
+        }
+    }
+    do { x++; } while (x < 10);
+    while (x) x--;
+    return TWICE(x) + '}';
+}
+'''
+
+PYTHON_SAMPLE = '''#!/usr/bin/env python3
+"""Module docstring
+spanning lines."""
+import os
+
+CONSTANT = [
+    1, 2,
+    3,
+]
+
+@decorator
+class Shape:
+    """A shape."""
+
+    def __init__(self, sides):
+        self.sides = sides  # trailing comment
+
+    def area(self):
+        if self.sides > 3 and \\
+                self.sides < 10:
+            return 1
+        elif self.sides:
+            # own-line comment
+            return 2
+        else:
+            return 3
+
+def main():
+    for shape in (Shape(3), Shape(4)):
+        try:
+            print(shape.area(), \'\'\'a
+multi-line string\'\'\')
+        except ValueError:
+            pass
+        finally:
+            continue
+    while True:
+        break
+
+if __name__ == "__main__":
+    main()
+'''
+
+SNIPPETS = {
+    'c': ["{", "}", "/*", "*/", "//", '"', "'", ";", "if (x)\n", "else ", "\n", "#define Q 1\n",
+          "int g(void) {\n  return 0;\n}\n", "switch (a) {\ncase 1: b(); break;\n}\n", "    x++;\n", "do {", "} while (y);"],
+    'python': ["\n", "    ", "\t", "(", ")", "[", "'''", '"""', "'", "#", "\\\n", "x = 1\n", "\n\n", "  ",
+               "def f(x):\n    return x\n", "if a:\n", "else:\n", "class K:\n    pass\n", "    # c\n"],
+}
+
+def read_repo_file(name):
+    with open(os.path.join(HERE, name), encoding='utf-8') as file:
+        return file.read()
+
+def assert_same_parse(incremental, full):
+    for field in FIELDS:
+        assert getattr(incremental, field) == getattr(full, field), field
+
+def random_edit(rng, source, language):
+    """A random insertion or deletion in `source`, as (new source, (start, old_end, new_end))."""
+    newline = "\n" if isinstance(source, str) else b"\n"
+    position = rng.randrange(len(source) + 1)
+    if rng.random() < 0.5:
+        position = source.rfind(newline, 0, position) + 1  # edits often start a line
+    if rng.random() < 0.4:
+        inserted = rng.choice(SNIPPETS[language])
+        if not isinstance(source, str):
+            inserted = inserted.encode('utf-8')
+        return source[:position] + inserted + source[position:], (position, position, position + len(inserted))
+    end = min(len(source), position + rng.randint(1, 40 if rng.random() < 0.7 else 300))
+    return source[:position] + source[end:], (position, end, position)
+
+@pytest.mark.parametrize("language, text", [
+    ('c', C_SAMPLE),
+    ('c', read_repo_file('flowchart_generator.c')),
+    ('python', PYTHON_SAMPLE),
+    ('python', read_repo_file('flowchart_multipart.py')),
+])
+@pytest.mark.parametrize("as_bytes", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_reparse_matches_full_parse(language, text, as_bytes, seed):
+    rng = random.Random(seed)
+    source = text.encode('utf-8') if as_bytes else text
+    previous = core.parse(language, source)
+    for _ in range(150):
+        source, edit = random_edit(rng, source, language)
+        full = core.parse(language, source)
+        # Editors report the edit; without one reparse() diffs the two sources itself
+        incremental = core.parse(language, source, previous=previous, edit=edit if rng.random() < 0.5 else None)
+        assert_same_parse(incremental, full)
+        # Chain reparses on reparsed charts too, as an editor would
+        previous = incremental if rng.random() < 0.7 else full
+
+def test_reparse_of_unchanged_source():
+    previous = core.parse('c', C_SAMPLE)
+    assert_same_parse(core.parse('c', C_SAMPLE, previous=previous), previous)
+
+@pytest.mark.parametrize("language, block", [
+    ('c', "if (x) {\n"),
+    ('python', "if x:\n"),
+])
+def test_depth_is_clamped(language, block):
+    levels = core.MAX_DEPTH + 20
+    if language == 'c':
+        source = block * levels + "y();\n" + "}\n" * levels
+    else:
+        source = "".join("    " * level + block for level in range(levels)) + "    " * levels + "y()\n"
+    assert max(core.parse(language, source).depths) == core.MAX_DEPTH
+
+def test_packed_flowchart_round_trips():
+    source = read_repo_file('flowchart_generator.c').encode('utf-8')
+    flowchart = core.parse('c', source)
+    unpacked = core.unpack_flowchart(core.pack_flowchart(flowchart), 'c', source)
+    for field in core.NODE_COLUMNS + ('functions',):
+        assert getattr(unpacked, field) == getattr(flowchart, field), field
+    assert unpacked.functions and all(isinstance(function, core.Function) for function in unpacked.functions)
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_python_lines_past_the_pattern_fall_back_to_the_scanner(as_bytes):
+    # Brackets nested past what the logical-line pattern spells out, and a string left open
+    source = "x = ((((f(\n  1))))) # c\nif y:\n    z = 'open\n    w = 2\n"
+    flowchart = core.parse('python', source.encode() if as_bytes else source)
+    assert list(flowchart.kinds) == [core.STATEMENT, core.CONTROL, core.STATEMENT, core.STATEMENT]
+    assert list(flowchart.depths) == [0, 0, 1, 1]
+    assert list(flowchart.lines) == [1, 3, 4, 5]
+    assert flowchart.lengths[0] == len("x = ((((f(\n  1))))) # c")
+
+C_UNITS_SAMPLE = '''int main(void) {
+    char *s = "a;b{";  /* x; */
+    if (x) y(); else z();
+    int a[] = {1, 2};
+    do { x++; } while (x < 3);
+    return
+}
+'''
+
+def c_unit_texts(source, **options):
+    return [(kind, line, text) for kind, _, _, line, text in core.iter_c_units(source, **options)]
+
+def test_c_units_split_and_join_lines_at_statement_boundaries():
+    assert c_unit_texts(C_UNITS_SAMPLE) == [
+        (core.C_DECLARATION, 1, "int main(void)"), (core.C_OPEN_BRACE, 1, "{"),
+        (core.C_DECLARATION, 2, 'char *s = "a;b{";'), (core.C_COMMENT, 2, "/* x; */"),
+        (core.C_CONTROL, 3, "if (x)"), (core.C_STATEMENT, 3, "y();"),
+        (core.C_CONTROL, 3, "else"), (core.C_STATEMENT, 3, "z();"),
+        (core.C_DECLARATION, 4, "int a[] = {1, 2};"),
+        (core.C_CONTROL, 5, "do"), (core.C_OPEN_BRACE, 5, "{"), (core.C_STATEMENT, 5, "x++;"),
+        (core.C_CLOSE_BRACE, 5, "}"), (core.C_CONTROL, 5, "while (x < 3);"),
+        (core.C_STATEMENT, 6, "return"), (core.C_CLOSE_BRACE, 7, "}"),
+    ]
+
+def test_c_units_agree_for_bytes_and_from_an_offset():
+    units = list(core.iter_c_units(C_UNITS_SAMPLE))
+    assert list(core.iter_c_units(C_UNITS_SAMPLE.encode())) == units
+    offset = C_UNITS_SAMPLE.index("    if")
+    assert list(core.iter_c_units(C_UNITS_SAMPLE, offset=offset, line=3)) == units[4:]
+
+def test_c_unit_spanning_lines_has_its_whitespace_collapsed():
+    assert c_unit_texts("x = f(1,\n      2);\n") == [(core.C_STATEMENT, 1, "x = f(1, 2);")]
+
+@pytest.mark.parametrize("line, kind", [
+    ("#include <stdio.h>", core.C_INCLUDE),
+    ("int f(int a);", core.C_PROTOTYPE),
+    ("int *p = malloc(4);", core.C_DECLARATION),
+    ("switch (x)", core.C_SWITCH),
+    ("else if (x)", core.C_CONTROL),
+    ("{", core.C_OPEN_BRACE),
+    ("}", core.C_CLOSE_BRACE),
+    ("x = 1;", core.C_STATEMENT),
+    ("*p = 1;", core.C_STATEMENT),
+])
+def test_classify_c_line(line, kind):
+    assert core.classify_c_line(line) == kind
+
+MACROS = {'A': "1", 'B': "A+1", 'F': ("(x)", "x")}
+
+@pytest.mark.parametrize("expression, value", [
+    ("A && B == 2", 1),
+    ("defined(A) && !defined C", 1),
+    ("F(3)", 0),            # function-like macros count as 0
+    ("UNDEFINED + 1", 1),
+    ("1 ? 2 : 3", 2),
+    ("-7 / 2", -3),         # C truncates toward zero
+    ("-7 % 2", -1),
+    ("'\\n' + (0x10 << 1)", 42),
+])
+def test_evaluate_c_condition(expression, value):
+    assert core.evaluate_c_condition(expression, MACROS) == value
+
+@pytest.mark.parametrize("expression", ["1 / 0", "(1", "1 +", "2 3", "1 $ 2"])
+def test_evaluate_c_condition_rejects_what_it_cannot_evaluate(expression):
+    with pytest.raises(ValueError):
+        core.evaluate_c_condition(expression, MACROS)
+
+C_CONDITIONAL_SAMPLE = '''#define DEBUG 1
+#if DEBUG
+a();
+#elif X
+b();
+#else
+c();
+#endif
+#ifdef NOPE
+d();
+#if 1
+nested();
+#endif
+#endif
+#undef DEBUG
+#if DEBUG || 1 +
+e();
+#endif
+'''
+
+@pytest.mark.parametrize("defines, file_macros, texts", [
+    ({}, True, ["#define DEBUG 1", "a();", "#undef DEBUG"]),
+    ({'X': "1"}, False, ["#define DEBUG 1", "b();", "#undef DEBUG"]),
+    ({'NOPE': ""}, False, ["#define DEBUG 1", "c();", "d();", "nested();", "#undef DEBUG"]),
+])
+def test_preprocessor_draws_only_the_live_branches(defines, file_macros, texts):
+    units = core.iter_c_units(C_CONDITIONAL_SAMPLE, core.CPreprocessor(defines, file_macros))
+    assert [unit[4] for unit in units] == texts
+
+def test_preprocessor_ignores_an_unbalanced_endif():
+    preprocessor = core.CPreprocessor()
+    assert preprocessor.directive("#endif")
+    assert preprocessor.active and not preprocessor.conditions
+
+def test_functions_are_indexed_with_their_nodes():
+    flowchart = core.parse('c', C_SAMPLE)
+    assert [(function.name, function.line) for function in flowchart.functions] == [('add', 11), ('main', 16)]
+    main = flowchart.functions[1]
+    assert C_SAMPLE[main.start:main.end].startswith("int main(void)\n{")
+    assert C_SAMPLE[main.start:main.end].endswith("}")
+
+def test_function_flowchart_slices_one_function():
+    flowchart = core.parse('c', C_SAMPLE)
+    [main] = core.find_functions(flowchart, ['main'])
+    depths = flowchart.depths[:]
+    part = core.function_flowchart(flowchart, main)
+    assert part.source is flowchart.source
+    assert part.kinds == flowchart.kinds[main.first:main.last]
+    assert part.depths[0] == 0 and part.kinds[0] == core.DECLARATION
+    assert part.lines[0] == 16 and part.lines[-1] == 40
+    assert flowchart.depths == depths  # the whole chart is left alone
+
+def test_find_functions_keeps_source_order_and_names_the_missing():
+    flowchart = core.parse('c', C_SAMPLE)
+    assert [function.name for function in core.find_functions(flowchart, ['main', 'add'])] == ['add', 'main']
+    with pytest.raises(KeyError, match="nope"):
+        core.find_functions(flowchart, ['main', 'nope'])
@@ -0,0 +1,20 @@
+"""Tests for flowchart_generator's HTML renderers."""
+import html
+import re
+
+import flowchart_generator as fg
+
+def box_lines(box):
+    """The on-screen text of each line of a rendered CSS box."""
+    return html.unescape(re.sub(r"<[^>]*>", "", box)).split("\n")
+
+def test_css_box_width_ignores_escaping():
+    box, box_width = fg.render_css_box('if (a < b && c > "d")', 1, fg.HTML_NESTING_COLORS[0])
+    assert box_width == len('if (a < b && c > "d")') + 6
+    assert len({len(line) for line in box_lines(box)}) == 1
+
+def test_css_chart_has_no_block_elements_inside_pre():
+    chart = fg.generate_flowchart_from_c_code("int main(void)\n{\n    return a < b;\n}\n", css=True)
+    assert chart.startswith(fg.CSS_FLOWCHART_OPEN)
+    assert "<div" not in chart
+    assert "&lt;" in chart
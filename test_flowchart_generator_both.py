@@ -0,0 +1,63 @@
+"""Tests for flowchart_generator_both's batch mode: which inputs a rerun skips."""
+import json
+import os
+import re
+
+import pytest
+
+import flowchart_generator_both as both
+
+@pytest.fixture
+def tree(tmp_path):
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    (source_dir / "a.c").write_text("int main(void)\n{\n    return 0;\n}\n")
+    (source_dir / "b.py").write_text("def f():\n    return 1\n")
+    return source_dir, tmp_path / "out"
+
+def batch(capsys, source_dir, output_dir, **options):
+    """Runs a batch with one worker; returns (rendered, skipped) from its summary line."""
+    assert both.run_batch([str(source_dir)], str(output_dir), jobs=1, **options) == 0
+    summary = re.search(r"Rendered (\d+) and skipped (\d+)", capsys.readouterr().out)
+    return int(summary.group(1)), int(summary.group(2))
+
+def test_rerun_skips_unchanged_inputs(tree, capsys):
+    source_dir, output_dir = tree
+    assert batch(capsys, source_dir, output_dir) == (2, 0)
+    entries = json.loads((output_dir / both.MANIFEST_NAME).read_text())["files"]
+    assert sorted(entries) == [os.path.join("src", "a.c.txt"), os.path.join("src", "b.py.txt")]
+    assert batch(capsys, source_dir, output_dir) == (0, 2)
+
+def test_touched_but_unmodified_input_is_hashed_not_rendered(tree, capsys):
+    source_dir, output_dir = tree
+    batch(capsys, source_dir, output_dir)
+    output = output_dir / "src" / "a.c.txt"
+    output.write_text("kept")
+    stat = os.stat(source_dir / "a.c")
+    os.utime(source_dir / "a.c", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert batch(capsys, source_dir, output_dir) == (0, 2)
+    assert output.read_text() == "kept"
+
+def test_modified_input_is_rendered_again(tree, capsys):
+    source_dir, output_dir = tree
+    batch(capsys, source_dir, output_dir)
+    (source_dir / "a.c").write_text("int main(void)\n{\n    return 1;\n}\n")
+    assert batch(capsys, source_dir, output_dir) == (1, 1)
+
+def test_missing_output_is_rendered_again(tree, capsys):
+    source_dir, output_dir = tree
+    batch(capsys, source_dir, output_dir)
+    (output_dir / "src" / "b.py.txt").unlink()
+    assert batch(capsys, source_dir, output_dir) == (1, 1)
+
+@pytest.mark.parametrize("options", [{'force': True}, {'defines': {'DEBUG': "1"}}, {'output_format': 'plain'}])
+def test_force_and_setting_changes_render_everything(tree, capsys, options):
+    source_dir, output_dir = tree
+    batch(capsys, source_dir, output_dir)
+    assert batch(capsys, source_dir, output_dir, **options) == (2, 0)
+
+def test_unreadable_manifest_renders_everything(tree, capsys):
+    source_dir, output_dir = tree
+    batch(capsys, source_dir, output_dir)
+    (output_dir / both.MANIFEST_NAME).write_text("{not json")
+    assert batch(capsys, source_dir, output_dir) == (2, 0)
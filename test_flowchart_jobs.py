@@ -0,0 +1,74 @@
+"""Tests for flowchart_jobs: job slots, statuses, the result budget and expiry."""
+from concurrent.futures import Future
+
+import flowchart_jobs as jobs
+
+class ImmediateExecutor:
+    """Runs each submitted function at once, so jobs finish inside submit()."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+class PendingExecutor:
+    """Never runs anything, so jobs keep their slots."""
+
+    def submit(self, function, *args):
+        return Future()
+
+class Upload:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_finished_job_keeps_its_result_and_frees_its_slot():
+    store = jobs.JobStore(max_running=1)
+    upload = Upload()
+    job = store.submit("key", ImmediateExecutor(), lambda text, slot: (text, slot), "chart",
+                       upload=upload, finish=lambda result: f"{result[0]} in slot {result[1]}".encode())
+    assert store.status(job) == {"id": job.id, "status": "done", "result": f"/jobs/{job.id}/result"}
+    assert job.result == b"chart in slot 0"
+    assert upload.closed
+    assert store.free_slots == [0] and store.get(job.id) is job
+
+def test_failed_job_reports_its_error():
+    def fail(slot):
+        raise ValueError("bad source")
+    store = jobs.JobStore()
+    job = store.submit("key", ImmediateExecutor(), fail, finish=bytes)
+    assert store.status(job) == {"id": job.id, "status": "failed", "error": "bad source"}
+    assert job.result is None and store.result_bytes == 0
+
+def test_running_jobs_show_progress_until_the_slots_run_out():
+    store = jobs.JobStore(max_running=2)
+    jobs.attach_progress(store.progress)
+    first = store.submit("a", PendingExecutor(), print)
+    second = store.submit("b", PendingExecutor(), print)
+    assert store.submit("c", PendingExecutor(), print) is None
+    jobs.report(second.slot, jobs.PHASE, jobs.PARSING)
+    jobs.report(second.slot, jobs.LINES, 120)
+    assert store.status(first)["status"] == "queued"
+    assert store.status(second) == {"id": second.id, "status": "parsing", "lines": 120, "total_lines": 0, "pages": 0}
+
+def test_results_past_the_budget_drop_the_oldest():
+    store = jobs.JobStore(max_result_bytes=10)
+    oldest = store.complete("a", b"x" * 4)
+    middle = store.complete("b", b"x" * 4)
+    newest = store.complete("c", b"x" * 4)
+    assert oldest.result is None and middle.result is not None and newest.result is not None
+    assert store.result_bytes == 8
+    huge = store.complete("d", b"x" * 50)
+    assert huge.result is not None  # the newest result is kept however large
+    assert store.result_bytes == 50
+
+def test_finished_jobs_expire_after_retention():
+    store = jobs.JobStore(retention=-1)  # everything finished is already past it
+    old = store.complete("a", b"chart")
+    new = store.complete("b", b"chart!")
+    assert store.get(old.id) is None and store.get(new.id) is new
+    assert store.result_bytes == len(b"chart!")
@@ -0,0 +1,111 @@
+"""Tests for flowchart_multipart: uploads must survive any split of the body into reads."""
+import hashlib
+import http.client
+import io
+import os
+import random
+
+import pytest
+
+import flowchart_multipart
+from flowchart_multipart import UploadError, parse_multipart_upload
+
+class TrickleReader:
+    """A request body that returns at most a few random bytes per read, like a slow socket."""
+
+    def __init__(self, body, rng, max_read):
+        self.body = io.BytesIO(body)
+        self.rng = rng
+        self.max_read = max_read
+        self.read_bytes = 0
+
+    def read(self, size):
+        data = self.body.read(min(size, self.rng.randint(1, self.max_read)))
+        self.read_bytes += len(data)
+        return data
+
+def request_headers(boundary, length):
+    return http.client.parse_headers(io.BytesIO(
+        f"Content-Type: multipart/form-data; boundary={boundary}\r\nContent-Length: {length}\r\n\r\n".encode('latin-1')))
+
+def multipart_body(boundary, parts, preamble=b"", epilogue=b""):
+    """Encodes (name, filename or None, content) parts as a multipart/form-data body."""
+    delimiter = b"--" + boundary.encode('latin-1')
+    body = [preamble]
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else "")
+        body += [delimiter, b"\r\nContent-Disposition: ", disposition.encode('latin-1'), b"\r\n\r\n", content, b"\r\n"]
+    body += [delimiter, b"--\r\n", epilogue]
+    return b"".join(body)
+
+def random_content(rng, boundary):
+    """Bytes that are likely to contain near-misses of the delimiter, but never the delimiter itself."""
+    delimiter = b"\r\n--" + boundary.encode('latin-1')
+    pieces = [rng.randbytes(rng.randint(0, 64)), b"\r\n", b"--", b"\r\n\r\n",
+              delimiter[:rng.randint(1, len(delimiter) - 1)], b"int main(void)\n{\n}\n"]
+    while True:
+        content = b"".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        # Not even across the end, where the delimiter that follows could complete an earlier one
+        if (content + delimiter[2:]).find(delimiter[2:]) == len(content):
+            return content
+
+def parse(body, boundary, rng, max_read=7, **options):
+    reader = TrickleReader(body, rng, max_read)
+    return parse_multipart_upload(reader, request_headers(boundary, len(body)), **options), reader
+
+def read_upload(upload):
+    with open(upload.path, 'rb') as file:
+        return file.read()
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Blocks shorter than the delimiter make every part boundary straddle reads
+    monkeypatch.setattr(flowchart_multipart, 'READ_BLOCK_SIZE', 5)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_uploads(seed, small_blocks):
+    rng = random.Random(seed)
+    boundary = "".join(rng.choice("abcXYZ019'()+_,-./:=?") for _ in range(rng.randint(1, 70)))
+    content = random_content(rng, boundary)
+    fields = [(rng.choice(["name", "file2", "x"]), None, random_content(rng, boundary)) for _ in range(rng.randint(0, 3))]
+    position = rng.randint(0, len(fields))
+    parts = fields[:position] + [("file", "dir/sample.c", content)] + fields[position:]
+    body = multipart_body(boundary, parts, preamble=random_content(rng, boundary) if rng.random() < 0.3 else b"")
+
+    upload, _ = parse(body, boundary, rng)
+    with upload:
+        assert upload.filename == "sample.c"
+        assert upload.size == len(content)
+        assert upload.sha256 == hashlib.sha256(content).hexdigest()
+        assert read_upload(upload) == content
+    assert not os.path.exists(upload.path)
+
+def test_only_the_first_file_field_is_kept(small_blocks):
+    rng = random.Random(0)
+    body = multipart_body("b", [("file", "a.py", b"first"), ("file", "b.py", b"second")])
+    upload, _ = parse(body, "b", rng)
+    with upload:
+        assert (upload.filename, read_upload(upload)) == ("a.py", b"first")
+
+def test_oversized_upload_is_refused_unread():
+    body = multipart_body("b", [("file", "a.c", b"x" * 100)])
+    with pytest.raises(UploadError) as error:
+        parse(body, "b", random.Random(0), max_bytes=len(body) - 1)
+    assert error.value.status == 413
+
+@pytest.mark.parametrize("body", [
+    multipart_body("b", [("name", None, b"value")]),           # no file field
+    multipart_body("b", [("file", "a.c", b"int x;")])[:-12],   # body cut short
+    b"no delimiter at all",
+])
+def test_bad_bodies_are_refused(body, small_blocks):
+    with pytest.raises(UploadError) as error:
+        parse(body, "b", random.Random(0))
+    assert error.value.status == 400
+
+def test_oversized_field_is_refused(monkeypatch):
+    monkeypatch.setattr(flowchart_multipart, 'MAX_FIELD_BYTES', 10)
+    body = multipart_body("b", [("name", None, b"v" * 11), ("file", "a.c", b"int x;")])
+    with pytest.raises(UploadError) as error:
+        parse(body, "b", random.Random(0), max_read=4096)
+    assert error.value.status == 400
@@ -1,18 +1,20 @@
+import os
+import queue
+import sys
+import threading
+import time
 import tkinter as tk
+from bisect import bisect_left, bisect_right
 from tkinter import filedialog, messagebox, scrolledtext
-import re
+from tkinter import font as tkfont
 
-# ---------- Config ----------
-MAX_LINE_WIDTH = 100
-RESET = '\033[0m'
-
-NESTING_COLORS = {
-    0: '\033[94m', 1: '\033[92m', 2: '\033[93m', 3: '\033[91m',
-    4: '\033[95m', 5: '\033[96m', 6: '\033[33m', 7: '\033[36m',
-    8: '\033[37m', 9: '\033[41m', 10: '\033[42m', 11: '\033[43m',
-    12: '\033[44m', 'default': '\033[97m'
-}
+# The shared parsers live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flowchart_core import detect_language, iter_render_spans, parse
+from flowchart_watch import WATCH_INTERVAL, FileWatcher
 
+# ---------- Config ----------
+# Tag for each color the renderer assigns to a box
 ANSI_COLORS = {
     '\033[94m': 'blue',
     '\033[92m': 'green',
@@ -30,171 +32,16 @@ ANSI_COLORS = {
     '\033[97m': 'white',
     '\033[0m': 'reset',
 }
-
-# ---------- Flowchart Rendering ----------
-def get_arrow_color_for_depth(depth):
-    return NESTING_COLORS.get(depth % len(NESTING_COLORS), RESET)
-
-def print_box(flowchart, stmt, depth, current_width, color):
-    indent = " " * (depth * 4)
-    lines = stmt.split("\n")
-    max_line = max(len(line) for line in lines)
-    box_width = max_line + 6
-
-    if current_width + box_width > MAX_LINE_WIDTH:
-        flowchart.append("")
-        current_width = 0
-
-    flowchart.append(f"{indent}{color}+{'-' * box_width}+{RESET}")
-    for line in lines:
-        flowchart.append(f"{indent}{color}|  {line.ljust(box_width - 4)}  |{RESET}")
-    flowchart.append(f"{indent}{color}+{'-' * box_width}+{RESET}")
-
-    return current_width + box_width
-
-# ---------- Python Parser ----------
-def get_indent_level(line):
-    return len(line) - len(line.lstrip(' '))
-
-def is_control_statement(line):
-    return re.match(r'^\s*(if|elif|else|for|while|try|except|finally)\b', line)
-
-def generate_flowchart_from_python(code):
-    lines = code.strip().splitlines()
-    flowchart = []
-    indent_stack = [0]
-    depth = 0
-    current_width = 0
-    inside_multiline_comment = False
-    last_was_control = False
-
-    for raw_line in lines:
-        line = raw_line.rstrip()
-        if not line.strip():
-            continue
-
-        stripped = line.strip()
-        indent = get_indent_level(line)
-
-        if inside_multiline_comment:
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            if '"""' in stripped or "'''" in stripped:
-                inside_multiline_comment = False
-            continue
-
-        if stripped.startswith(("'''", '\"\"\"')):
-            inside_multiline_comment = not inside_multiline_comment
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            continue
-
-        if stripped.startswith("#"):
-            current_width = print_box(flowchart, stripped, depth, current_width, NESTING_COLORS[8])
-            continue
-
-        while indent < indent_stack[-1]:
-            indent_stack.pop()
-            depth -= 1
-
-        if indent > indent_stack[-1]:
-            indent_stack.append(indent)
-            depth += 1
-
-        color = get_arrow_color_for_depth(depth)
-        current_width = print_box(flowchart, stripped, depth, current_width, color)
-        last_was_control = is_control_statement(stripped)
-
-    return "\n".join(flowchart)
-
-# ---------- C Parser ----------
-def process_code_line(flowchart, stmt, nesting_depth, current_width, color):
-    shift = " " * (nesting_depth * 4)
-    lines = stmt.split("\n")
-    max_line = max(len(line) for line in lines)
-    box_width = max_line + 6
-
-    if current_width + box_width > MAX_LINE_WIDTH:
-        flowchart.append("")
-        current_width = 0
-
-    flowchart.append(f"{shift}{color}+{'-' * box_width}+{RESET}")
-    for line in lines:
-        flowchart.append(f"{shift}{color}|  {line.ljust(box_width - 4)}  |{RESET}")
-    flowchart.append(f"{shift}{color}+{'-' * box_width}+{RESET}")
-
-    return current_width + box_width
-
-def generate_flowchart_from_c_code(code):
-    lines = code.strip().splitlines()
-    flowchart = []
-    nesting_depth = 0
-    brace_stack = []
-    current_width = 0
-    increment_next = False
-
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-
-        # Grouped headed comment block
-        if line.startswith("/*") and not line.endswith("*/"):
-            comment_block = [line]
-            i += 1
-            while i < len(lines):
-                line = lines[i].strip()
-                comment_block.append(line)
-                if line.endswith("*/"):
-                    break
-                i += 1
-            grouped_comment = "\n".join(comment_block)
-            current_width = process_code_line(flowchart, grouped_comment, nesting_depth, current_width, NESTING_COLORS[8])
-            i += 1
-            continue
-
-        # One-line comment block
-        elif line.startswith("/*") and line.endswith("*/"):
-            current_width = process_code_line(flowchart, line, nesting_depth, current_width, NESTING_COLORS[8])
-            i += 1
-            continue
-
-        if not line:
-            i += 1
-            continue
-
-        if re.match(r"^(if|for|while|else if|else)\b", line):
-            current_width = process_code_line(flowchart, line, nesting_depth, current_width, get_arrow_color_for_depth(nesting_depth))
-            next_line = lines[i + 1].strip() if i + 1 < len(lines) else ""
-            if next_line == "{":
-                brace_stack.append("{")
-                nesting_depth += 1
-                i += 1
-                continue
-            elif not next_line.startswith("{"):
-                increment_next = True
-            i += 1
-            continue
-
-        if increment_next:
-            current_width = process_code_line(flowchart, line, nesting_depth + 1, current_width, get_arrow_color_for_depth(nesting_depth + 1))
-            increment_next = False
-            i += 1
-            continue
-
-        if line == "{":
-            brace_stack.append("{")
-            nesting_depth += 1
-            i += 1
-            continue
-        elif line == "}":
-            if brace_stack:
-                brace_stack.pop()
-                nesting_depth -= 1
-            i += 1
-            continue
-
-        current_width = process_code_line(flowchart, line, nesting_depth, current_width, get_arrow_color_for_depth(nesting_depth))
-        i += 1
-
-    return "\n".join(flowchart)
+# Tags that color the background too; whitespace only looks the same under the others
+BACKGROUND_TAGS = {tag for tag in ANSI_COLORS.values() if tag.startswith('white_on_')}
+# Spans the worker hands over at a time, and how long one UI tick may spend
+# taking them in before Tk gets to handle events again
+INSERT_BATCH_SPANS = 2000
+INSERT_TIME_BUDGET = 0.03  # seconds
+POLL_INTERVAL_MS = 20
+# Chart lines kept in the text widget above and below the visible ones
+WINDOW_MARGIN_LINES = 500
+WATCH_INTERVAL_MS = int(WATCH_INTERVAL * 1000)
 
 # ---------- ANSI Rendering in Tkinter ----------
 def setup_tags(widget):
@@ -214,60 +61,256 @@ def setup_tags(widget):
     widget.tag_config('white', foreground='white')
     widget.tag_config('reset', foreground='white')
 
-def insert_ansi_text(widget, ansi_text):
-    ansi_regex = re.compile(r'(\033\[\d+m)')
-    parts = ansi_regex.split(ansi_text)
+def build_batch(spans, line):
+    """Joins (text, tag) spans into one text and the ranges each tag covers, for text starting on widget line `line`.
+
+    Spans are whole lines, so a range is "line.0" to "line.0". Neighbouring
+    boxes of one color share a range; blank lines between them join it too,
+    as they look the same under any tag without a background. Tags with a
+    background get one range per line, from the indentation to the line end.
+    """
+    pieces = []
+    ranges = {}
+    run_tag, run_start = None, line
+
+    def close_run():
+        if run_tag is not None and line > run_start:
+            ranges.setdefault(run_tag, []).extend((f"{run_start}.0", f"{line}.0"))
+
+    for text, tag in spans:
+        lines = text.count("\n")
+        if tag in BACKGROUND_TAGS:
+            close_run()
+            run_tag = None
+            indent = len(text) - len(text.lstrip(" "))
+            ranges.setdefault(tag, []).extend(
+                index for number in range(line, line + lines) for index in (f"{number}.{indent}", f"{number}.0 lineend"))
+        elif tag != run_tag and not (tag is None and text.isspace()):
+            close_run()
+            run_tag, run_start = tag, line
+        pieces.append(text)
+        line += lines
+    close_run()
+    return "".join(pieces), ranges
+
+def insert_batch(widget, text, ranges):
+    """Inserts a batch of plain text, then colors it with one tag_add per tag over all of its ranges."""
+    widget.insert(tk.END, text)
+    for tag, indexes in ranges.items():
+        widget.tag_add(tag, *indexes)
+
+# ---------- Background Generation ----------
+# Batches travel from the worker thread to the UI through this queue as
+# (kind, job, value): ('spans', job, [(text, tag), ...]), ('done', job,
+# flowchart) or ('error', job, message). Only the latest job's messages are shown.
+# A reload collects its spans in reload_spans and swaps them in when done,
+# so the old chart stays on screen, scrolled where it was, until then.
+results = queue.Queue()
+current_job = 0
+reloading = False
+reload_spans = []
+
+def generate_spans(file_path, lang, job, previous=None):
+    """Worker thread: parses and renders the file, queueing the output in batches of (text, tag) spans.
+
+    previous, the file's last parse, is reused around the edit (see flowchart_core.reparse).
+    """
+    try:
+        with open(file_path, 'r') as f:
+            code = f.read()
 
-    current_tag = None
-    for part in parts:
-        if part in ANSI_COLORS:
-            current_tag = ANSI_COLORS[part]
-        else:
-            widget.insert(tk.END, part, current_tag)
+        flowchart = parse(lang, code, previous=previous)
+        batch = []
+        for spans in iter_render_spans(flowchart):
+            if job != current_job:
+                return  # another file was opened meanwhile
+            batch.extend((text, ANSI_COLORS[color] if color is not None else None) for text, color in spans)
+            if len(batch) >= INSERT_BATCH_SPANS:
+                results.put(('spans', job, batch))
+                batch = []
+        results.put(('spans', job, batch))
+        results.put(('done', job, flowchart))
+
+    except Exception as e:
+        results.put(('error', job, str(e)))
+
+def poll_results():
+    """Takes queued batches into the chart, spending at most INSERT_TIME_BUDGET per tick."""
+    global open_flowchart
+    deadline = time.perf_counter() + INSERT_TIME_BUDGET
+    try:
+        while time.perf_counter() < deadline:
+            kind, job, value = results.get_nowait()
+            if job != current_job:
+                continue
+            if kind == 'spans':
+                if reloading:
+                    reload_spans.extend(value)
+                else:
+                    add_spans(value)
+            elif kind == 'done':
+                open_flowchart = value
+                if reloading:
+                    replace_chart(reload_spans)
+                    status_label.config(text=f"{chart_lines:,} lines, updated {time.strftime('%H:%M:%S')}")
+                else:
+                    status_label.config(text=f"{chart_lines:,} lines")
+            elif reloading:
+                status_label.config(text=f"Update failed: {value}")  # the file may be mid-edit; keep watching
+            else:
+                status_label.config(text="")
+                messagebox.showerror("Error", value)
+    except queue.Empty:
+        pass
+    root.after(POLL_INTERVAL_MS, poll_results)
+
+# ---------- Windowed Display ----------
+# The whole chart is kept here as (text, tag) spans, one per box, heading or
+# blank line, along with the chart line each one starts on. The text widget
+# only holds chart_spans[window_first:window_end]: the visible lines and
+# WINDOW_MARGIN_LINES either side. Scrolling near the edge of that window
+# refills it around the view, so opening, scrolling and zooming cost the
+# same for any chart size.
+chart_spans = []
+chart_starts = []
+chart_lines = 0
+window_first = window_end = 0
+
+def reset_chart():
+    global chart_lines, window_first, window_end
+    chart_spans.clear()
+    chart_starts.clear()
+    chart_lines = 0
+    window_first = window_end = 0
+    output_text.delete(1.0, tk.END)
+
+def span_start(index):
+    """The chart line span `index` starts on; the chart's length past the last span."""
+    return chart_starts[index] if index < len(chart_starts) else chart_lines
+
+def window_size():
+    """Chart lines the window should hold: as many as fit in the widget plus a margin above and below."""
+    line_height = tkfont.Font(font=output_text['font']).metrics('linespace')
+    visible = max(int(output_text['height']), output_text.winfo_height() // line_height)
+    return visible + 2 * WINDOW_MARGIN_LINES
+
+def append_window(end):
+    """Adds chart_spans[window_end:end] at the bottom of the widget."""
+    global window_end
+    text, ranges = build_batch(chart_spans[window_end:end], span_start(window_end) - span_start(window_first) + 1)
+    insert_batch(output_text, text, ranges)
+    window_end = end
+
+def show_window(top):
+    """Refills the widget with the spans around chart line `top` and scrolls that line to the top."""
+    global window_first, window_end
+    top = max(0, min(round(top), chart_lines - 1))
+    first = max(0, bisect_right(chart_starts, top - WINDOW_MARGIN_LINES) - 1)
+    output_text.delete(1.0, tk.END)
+    window_first = window_end = first
+    append_window(bisect_left(chart_starts, chart_starts[first] + window_size()))
+    output_text.yview(f"{top - chart_starts[first] + 1}.0")
+
+def view_range(first, last):
+    """Chart lines at the top and bottom of the view, from the widget's view fractions."""
+    start = span_start(window_first)
+    lines = span_start(window_end) - start
+    return start + float(first) * lines, start + float(last) * lines
+
+def add_spans(spans):
+    """Stores a batch of the chart from the worker, showing it while the window still has room."""
+    global chart_lines
+    for text, tag in spans:
+        chart_starts.append(chart_lines)
+        chart_spans.append((text, tag))
+        chart_lines += text.count("\n")
+    if window_end < len(chart_spans) and span_start(window_end) - span_start(window_first) < window_size():
+        append_window(bisect_left(chart_starts, span_start(window_first) + window_size()))
+    on_view_changed(*output_text.yview())
+
+def replace_chart(spans):
+    """Swaps in a regenerated chart, keeping the view on the same chart line."""
+    top, _ = view_range(*output_text.yview())
+    reset_chart()
+    add_spans(spans)
+    if chart_lines:
+        show_window(top)
+
+def on_view_changed(first, last):
+    """yscrollcommand of the text widget: refills the window when the view nears
+    its edge, and shows the view's place in the whole chart on the scrollbar."""
+    if not chart_lines:
+        output_text.vbar.set(first, last)
+        return
+    top, bottom = view_range(first, last)
+    near_top = window_first > 0 and top - span_start(window_first) < WINDOW_MARGIN_LINES / 2
+    near_bottom = window_end < len(chart_spans) and span_start(window_end) - bottom < WINDOW_MARGIN_LINES / 2
+    if near_top or near_bottom:
+        show_window(top)  # the widget reports its new view again
+        return
+    output_text.vbar.set(top / chart_lines, bottom / chart_lines)
+
+def scroll_chart(action, *args):
+    """Scrollbar command: dragging goes to a fraction of the whole chart; steps scroll the widget."""
+    if action == 'moveto' and chart_lines:
+        show_window(float(args[0]) * chart_lines)
+    else:
+        output_text.yview(action, *args)
 
 # ---------- File Handling ----------
-def detect_language(path):
-    if path.endswith('.py'):
-        return 'python'
-    elif path.endswith('.c'):
-        return 'c'
-    return None
+# The open file, its last parse, and the watcher that regenerates it on save while Watch is ticked
+open_path = open_lang = open_flowchart = None
+watcher = FileWatcher([])
+
+def start_generation(reload=False):
+    """Parses the open file on a worker thread; poll_results() shows the chart as it arrives."""
+    global current_job, reloading
+    current_job += 1
+    reloading = reload
+    reload_spans.clear()
+    if not reload:
+        reset_chart()
+        status_label.config(text=f"Loading {os.path.basename(open_path)}...")
+    previous = open_flowchart if reload else None
+    threading.Thread(target=generate_spans, args=(open_path, open_lang, current_job, previous), daemon=True).start()
 
 def open_file():
+    global open_path, open_lang, open_flowchart
     file_path = filedialog.askopenfilename(filetypes=[("Code Files", "*.py *.c")])
     if not file_path:
         return
 
-    try:
-        with open(file_path, 'r') as f:
-            code = f.read()
-
-        lang = detect_language(file_path)
-        if lang == 'python':
-            result = generate_flowchart_from_python(code)
-        elif lang == 'c':
-            result = generate_flowchart_from_c_code(code)
-        else:
-            messagebox.showerror("Unsupported file", "Only .py and .c files are supported.")
-            return
+    lang = detect_language(file_path)
+    if lang is None:
+        messagebox.showerror("Unsupported file", "Only .py and .c files are supported.")
+        return
 
-        output_text.delete(1.0, tk.END)
-        insert_ansi_text(output_text, result)
+    open_path, open_lang, open_flowchart = file_path, lang, None
+    watcher.watch([file_path])
+    start_generation()
 
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+def poll_watch():
+    """Regenerates the open file once a save to it has settled, while Watch is ticked."""
+    if watch_enabled.get() and watcher.poll():
+        start_generation(reload=True)
+    root.after(WATCH_INTERVAL_MS, poll_watch)
 
 # ---------- Zoom Functionality ----------
 zoom_level = 10  # Default zoom level for the font size
-def zoom_in():
+def set_zoom(size):
+    """Changes the font size, keeping the top line in view; only the window has to reflow."""
     global zoom_level
-    zoom_level += 2
+    top, _ = view_range(*output_text.yview())
+    zoom_level = size
     output_text.config(font=("Courier New", zoom_level))
+    if chart_lines:
+        show_window(top)
+
+def zoom_in():
+    set_zoom(zoom_level + 2)
 
 def zoom_out():
-    global zoom_level
-    zoom_level = max(6, zoom_level - 2)  # Prevent too small font size
-    output_text.config(font=("Courier New", zoom_level))
+    set_zoom(max(6, zoom_level - 2))  # Prevent too small font size
 
 # ---------- GUI ----------
 root = tk.Tk()
@@ -280,9 +323,11 @@ frame.pack(fill=tk.BOTH, expand=True)
 btn = tk.Button(frame, text="Open .py or .c File", command=open_file, bg="#333", fg="white")
 btn.pack(pady=(0, 10))
 
+# No wrapping: each chart line must be one display line for the windowing above
+# to map the scrollbar to chart lines, and wrapped boxes lose their shape anyway
 output_text = scrolledtext.ScrolledText(
     frame,
-    wrap=tk.WORD,
+    wrap=tk.NONE,
     width=100,
     height=40,
     font=("Courier New", zoom_level),
@@ -290,6 +335,11 @@ output_text = scrolledtext.ScrolledText(
     fg="white",
     insertbackground="white"
 )
+output_text.config(yscrollcommand=on_view_changed)
+output_text.vbar.config(command=scroll_chart)
+output_xbar = tk.Scrollbar(frame, orient=tk.HORIZONTAL, command=output_text.xview)
+output_text.config(xscrollcommand=output_xbar.set)
+output_xbar.pack(side=tk.BOTTOM, fill=tk.X)
 output_text.pack(fill=tk.BOTH, expand=True)
 
 # Zoom buttons
@@ -302,6 +352,16 @@ zoom_in_btn.pack(side=tk.LEFT, padx=5)
 zoom_out_btn = tk.Button(zoom_frame, text="Zoom Out", command=zoom_out, bg="#333", fg="white")
 zoom_out_btn.pack(side=tk.LEFT, padx=5)
 
+watch_enabled = tk.BooleanVar(value=False)
+watch_check = tk.Checkbutton(zoom_frame, text="Watch", variable=watch_enabled, bg="#1e1e1e", fg="white",
+                             selectcolor="#333", activebackground="#1e1e1e", activeforeground="white")
+watch_check.pack(side=tk.LEFT, padx=5)
+
+status_label = tk.Label(zoom_frame, text="", bg="#1e1e1e", fg="#bbb")
+status_label.pack(side=tk.LEFT, padx=15)
+
 setup_tags(output_text)
+root.after(POLL_INTERVAL_MS, poll_results)
+root.after(WATCH_INTERVAL_MS, poll_watch)
 root.mainloop()
 